@@ -0,0 +1,259 @@
+"""Session-scale benchmarks of the FIP data pipeline.
+
+Each stage runs over every epoch of a session, either a real one or a synthetic one written by
+`aind_physiology_fip.synthetic.generate_session`, and is measured for wall time, CPU time, peak
+resident memory and bytes read. Reports are tagged with the package version, so reports from
+consecutive releases can be compared with `compare_reports` to catch regressions before deploying.
+
+Example:
+    >>> report = run_benchmark(Path("session"), repeat=3)
+    >>> regressions = compare_reports(report, BenchmarkReport.model_validate_json(baseline_json))
+"""
+
+import concurrent.futures
+import contextlib
+import datetime
+import io
+import logging
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+import typing as t
+from pathlib import Path
+
+import pydantic
+
+from aind_physiology_fip import __semver__
+from aind_physiology_fip.data_contract import FipRawFrame, dataset
+from aind_physiology_fip.data_mappers import ProtoAcquisitionMapper
+from aind_physiology_fip.data_qc import _run_tests
+from aind_physiology_fip.profiling import peak_rss_bytes, read_bytes
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+logger = logging.getLogger(__name__)
+
+
+def _epochs(root: Path) -> t.List[Path]:
+    epochs = sorted(epoch for epoch in (root / "fib").glob("fip_*") if epoch.is_dir())
+    # A single epoch directory can be benchmarked on its own
+    return epochs or [root]
+
+
+def _stage_frame_reader(root: Path) -> None:
+    for epoch in _epochs(root):
+        fip_dataset = dataset(epoch)
+        for channel in ("green", "iso", "red"):
+            stream = t.cast(FipRawFrame, fip_dataset[f"raw_{channel}"])
+            for _ in stream.iter_chunks():
+                pass
+
+
+def _stage_dataset_load(root: Path) -> None:
+    for epoch in _epochs(root):
+        dataset(epoch).load_all()
+
+
+def _stage_data_qc(root: Path) -> None:
+    for epoch in _epochs(root):
+        # The console report is part of the stage, but not of the benchmark output
+        with contextlib.redirect_stdout(io.StringIO()):
+            _run_tests(dataset(epoch), data_path=epoch)
+
+
+def _stage_data_mappers(root: Path) -> None:
+    ProtoAcquisitionMapper(root).map()
+
+
+STAGES: t.Dict[str, t.Callable[[Path], None]] = {
+    "frame_reader": _stage_frame_reader,
+    "dataset_load": _stage_dataset_load,
+    "data_qc": _stage_data_qc,
+    "data_mappers": _stage_data_mappers,
+}
+
+
+class StageMeasurement(pydantic.BaseModel):
+    """Resources used by a single run of a stage."""
+
+    wall_time_s: float
+    cpu_time_s: float
+    peak_rss_bytes: t.Optional[int] = None
+    read_bytes: t.Optional[int] = None
+
+
+def measure_stage(stage: str, root: Path) -> StageMeasurement:
+    """Runs a stage once in the current process and measures it.
+
+    The modules used by the stages are imported with this module, so imports are not measured.
+    Peak memory is the peak of the whole process, so it includes everything that ran before the stage.
+    """
+    read_before = read_bytes()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    STAGES[stage](root)
+    wall_time_s = time.perf_counter() - wall_before
+    cpu_time_s = time.process_time() - cpu_before
+    read_after = read_bytes()
+    return StageMeasurement(
+        wall_time_s=wall_time_s,
+        cpu_time_s=cpu_time_s,
+        peak_rss_bytes=peak_rss_bytes(),
+        read_bytes=None if read_before is None or read_after is None else read_after - read_before,
+    )
+
+
+class StageResult(pydantic.BaseModel):
+    """Measurements of every repetition of a stage."""
+
+    name: str
+    runs: t.List[StageMeasurement]
+
+    @pydantic.computed_field  # type: ignore[prop-decorator]
+    @property
+    def wall_time_s(self) -> float:
+        """Fastest wall time, the least noisy estimate of the cost of the stage."""
+        return min(run.wall_time_s for run in self.runs)
+
+    @pydantic.computed_field  # type: ignore[prop-decorator]
+    @property
+    def peak_rss_bytes(self) -> t.Optional[int]:
+        values = [run.peak_rss_bytes for run in self.runs if run.peak_rss_bytes is not None]
+        return max(values) if values else None
+
+    @pydantic.computed_field  # type: ignore[prop-decorator]
+    @property
+    def read_bytes(self) -> t.Optional[int]:
+        values = [run.read_bytes for run in self.runs if run.read_bytes is not None]
+        return max(values) if values else None
+
+
+class BenchmarkReport(pydantic.BaseModel):
+    """Benchmark of the pipeline stages on a session."""
+
+    version: str = __semver__
+    created: datetime.datetime = pydantic.Field(default_factory=lambda: datetime.datetime.now(datetime.timezone.utc))
+    python_version: str = platform.python_version()
+    platform: str = platform.platform()
+    data_path: str
+    data_bytes: int = pydantic.Field(description="Total size of the files of the session.")
+    session: t.Optional[t.Dict[str, t.Any]] = pydantic.Field(
+        default=None, description="Spec of the synthetic session, if the session was generated."
+    )
+    isolated: bool
+    stages: t.List[StageResult]
+
+    def stage(self, name: str) -> t.Optional[StageResult]:
+        return next((stage for stage in self.stages if stage.name == name), None)
+
+
+class Regression(pydantic.BaseModel):
+    """A metric of a stage that grew beyond the allowed ratio since the baseline report."""
+
+    stage: str
+    metric: t.Literal["wall_time_s", "peak_rss_bytes", "read_bytes"]
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+    def __str__(self) -> str:
+        return f"{self.stage}.{self.metric}: {self.baseline:.4g} -> {self.current:.4g} ({self.ratio:.2f}x)"
+
+
+def compare_reports(
+    current: BenchmarkReport, baseline: BenchmarkReport, *, max_regression: float = 0.2
+) -> t.List[Regression]:
+    """Finds the metrics of `current` that are more than `max_regression` (a fraction) worse than `baseline`.
+
+    Only stages and metrics present in both reports are compared.
+    """
+    if current.session != baseline.session or current.data_bytes != baseline.data_bytes:
+        logger.warning("Benchmark reports were measured on different sessions and may not be comparable.")
+    regressions = []
+    for stage in current.stages:
+        reference = baseline.stage(stage.name)
+        if reference is None:
+            continue
+        for metric in t.get_args(Regression.model_fields["metric"].annotation):
+            now, then = getattr(stage, metric), getattr(reference, metric)
+            if now is not None and then is not None and now > then * (1 + max_regression):
+                regressions.append(Regression(stage=stage.name, metric=metric, baseline=then, current=now))
+    return regressions
+
+
+def _directory_size(root: Path) -> int:
+    return sum(path.stat().st_size for path in root.rglob("*") if path.is_file())
+
+
+def run_benchmark(
+    data_path: os.PathLike,
+    *,
+    stages: t.Optional[t.Sequence[str]] = None,
+    repeat: int = 3,
+    isolate: bool = True,
+    session: t.Optional[t.Dict[str, t.Any]] = None,
+) -> BenchmarkReport:
+    """Benchmarks the pipeline stages on a session.
+
+    Args:
+        data_path: Session root directory (containing `fib/fip_*` epochs) or a single epoch directory.
+        stages: Stages to run, in order. Defaults to all stages.
+        repeat: Number of times each stage is run.
+        isolate: Run each repetition in a fresh process, so that imports and caches of earlier
+            stages do not count towards its time and peak memory.
+        session: Spec of the synthetic session, recorded in the report.
+    """
+    root = Path(data_path)
+    if not root.exists():
+        raise FileNotFoundError(f"Dataset path {root} does not exist.")
+    stages = list(stages or STAGES)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark stages {sorted(unknown)}. Available stages: {list(STAGES)}.")
+    results = []
+    for stage in stages:
+        runs = []
+        for i in range(repeat):
+            if isolate:
+                # A spawned process starts without any of the parent's imports or memory
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    runs.append(executor.submit(measure_stage, stage, root).result())
+            else:
+                runs.append(measure_stage(stage, root))
+            logger.info("Stage %s run %d/%d: %.3f s", stage, i + 1, repeat, runs[-1].wall_time_s)
+        results.append(StageResult(name=stage, runs=runs))
+    return BenchmarkReport(
+        data_path=str(root),
+        data_bytes=_directory_size(root),
+        session=session,
+        isolated=isolate,
+        stages=results,
+    )
+
+
+def run_synthetic_benchmark(
+    spec: t.Optional[SyntheticSessionSpec] = None,
+    *,
+    session_path: t.Optional[os.PathLike] = None,
+    **kwargs: t.Any,
+) -> BenchmarkReport:
+    """Generates a synthetic session and benchmarks the pipeline stages on it.
+
+    Args:
+        spec: `SyntheticSessionSpec` of the session. Defaults to the default spec.
+        session_path: Directory where the session is generated and kept. Defaults to a temporary
+            directory that is removed afterwards.
+        **kwargs: Passed to `run_benchmark`.
+    """
+    spec = spec or SyntheticSessionSpec()
+    with contextlib.ExitStack() as stack:
+        if session_path is None:
+            session_path = stack.enter_context(tempfile.TemporaryDirectory(prefix="fip_benchmark_"))
+        generate_session(session_path, spec)
+        return run_benchmark(session_path, session=spec.metadata(), **kwargs)
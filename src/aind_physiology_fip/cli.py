@@ -1,11 +1,17 @@
+import logging
+import os
 import typing as t
+from pathlib import Path
 
-from pydantic import Field, RootModel
-from pydantic_settings import BaseSettings, CliApp, CliSubCommand
+from pydantic import Field, RootModel, model_validator
+from pydantic_settings import BaseSettings, CliApp, CliPositionalArg, CliSubCommand
 
-from aind_physiology_fip import __semver__, regenerate
-from aind_physiology_fip.data_mappers import DataMapperCli
-from aind_physiology_fip.data_qc import DataQcCli
+from aind_physiology_fip import __semver__
+
+# Subcommands import their implementation (and with it numpy, pandas, contraqctor, cv2 and
+# matplotlib) inside `cli_cmd`, so that only the subcommand that runs pays for its dependencies.
+
+logger = logging.getLogger(__name__)
 
 
 class VersionCli(RootModel):
@@ -19,15 +25,454 @@ class DslRegenerateCli(RootModel):
     root: t.Any
 
     def cli_cmd(self) -> None:
+        from aind_physiology_fip import regenerate
+
         regenerate.main()
 
 
+class DataQcCli(BaseSettings, cli_kebab_case=True):
+    data_path: CliPositionalArg[Path] = Field(description="Path to the session data directory.")
+    asset_path: t.Optional[Path] = Field(
+        default=Path("."),
+        description="Path to the asset root directory. If not provided, the current working directory will be used. Set None to disable saving assets.",
+    )
+    version: str = Field(default=__semver__, description="Version of the dataset.")
+    channel_workers: t.Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Number of worker processes used to run the green, iso and red channel suites in parallel. If not provided, channels run serially.",
+    )
+    jobs: int = Field(default=1, ge=1, description="Number of test suites to run concurrently.")
+    roi_sample_period_s: t.Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Period (s) at which raw frames are sampled to check the temporal stability of the ROIs. If not provided, the check is skipped.",
+    )
+    columnar_cache: bool = Field(
+        default=False, description="Read csv streams from columnar sidecar caches, writing them if missing or stale."
+    )
+    result_cache: t.Optional[Path] = Field(
+        default=None,
+        description="Directory of a persistent cache of suite results. Suites whose input files, parameters and package version are unchanged are replayed from it instead of re-run.",
+    )
+    result_cache_hash: bool = Field(
+        default=False,
+        description="Fingerprint input files by their contents instead of their path and modification time.",
+    )
+    max_cache_mb: t.Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Memory budget (MB) for parsed csv streams shared across suites. If not provided, streams are never evicted.",
+    )
+    render_workers: int = Field(
+        default=1, ge=1, description="Number of worker processes used to render figure assets when they are saved."
+    )
+    profile_path: t.Optional[Path] = Field(
+        default=None,
+        description="Path where a json timing report of every stream load, suite, test and asset write is written. Profiling is disabled unless this or trace-path is set.",
+    )
+    trace_path: t.Optional[Path] = Field(
+        default=None, description="Path where the timings are written in the Chrome trace-event format."
+    )
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_contract import StreamCache, dataset
+        from aind_physiology_fip.data_qc import _run_tests, _save_assets
+        from aind_physiology_fip.data_qc_cache import QcResultCache
+        from aind_physiology_fip.profiling import profile_to
+
+        if not Path(self.data_path).exists():
+            raise FileNotFoundError(f"Dataset path {self.data_path} does not exist.")
+        max_cache_bytes = None if self.max_cache_mb is None else int(self.max_cache_mb * 2**20)
+        with profile_to(self.profile_path, self.trace_path):
+            _dataset = dataset(
+                Path(self.data_path), cache=StreamCache(max_cache_bytes), columnar_cache=self.columnar_cache
+            )
+            results = _run_tests(
+                _dataset,
+                data_path=Path(self.data_path),
+                channel_workers=self.channel_workers,
+                jobs=self.jobs,
+                max_cache_bytes=max_cache_bytes,
+                columnar_cache=self.columnar_cache,
+                result_cache=None
+                if self.result_cache is None
+                else QcResultCache(self.result_cache, validate_hash=self.result_cache_hash),
+                roi_sample_period_s=self.roi_sample_period_s,
+            )
+            _save_assets(results, self.asset_path, render_workers=self.render_workers)
+
+
+class DataMapperCli(BaseSettings, cli_kebab_case=True):
+    """CLI for generating AIND metadata from raw FIP data."""
+
+    data_path: t.Optional[os.PathLike] = Field(
+        default=None,
+        description="Path to the session data directory. In batch mode, the root directory to search for sessions.",
+    )
+    batch: bool = Field(
+        default=False, description="Map every session directory found under data-path instead of a single session."
+    )
+    manifest: t.Optional[Path] = Field(
+        default=None,
+        description="Path to a file listing one session directory per line. Implies batch mode.",
+    )
+    workers: int = Field(default=1, ge=1, description="Number of worker processes used in batch mode.")
+    force: bool = Field(default=False, description="In batch mode, map sessions even if fip.json is up to date.")
+    summary_path: Path = Field(
+        default=Path("fip_data_mappers_summary.json"),
+        description="Path where the json summary of a batch run is written.",
+    )
+    profile_path: t.Optional[Path] = Field(
+        default=None,
+        description="Path where a json timing report of every session, file read and write is written. Profiling is disabled unless this or trace-path is set.",
+    )
+    trace_path: t.Optional[Path] = Field(
+        default=None, description="Path where the timings are written in the Chrome trace-event format."
+    )
+
+    @model_validator(mode="after")
+    def _check_data_path(self) -> "DataMapperCli":
+        if self.data_path is None and self.manifest is None:
+            raise ValueError("data-path is required unless a manifest is provided.")
+        return self
+
+    def cli_cmd(self):
+        from aind_physiology_fip.profiling import profile_to
+
+        with profile_to(self.profile_path, self.trace_path):
+            return self._run()
+
+    def _run(self) -> None:
+        from aind_physiology_fip.data_mappers import write_acquisition
+
+        if self.batch or self.manifest is not None:
+            return self._run_batch()
+        logger.info("Mapping metadata directly from dataset.")
+        output = write_acquisition(t.cast(os.PathLike, self.data_path))
+        logger.info("Wrote %s", output)
+        logger.info("Mapping completed!")
+
+    def _run_batch(self) -> None:
+        from aind_physiology_fip.data_mappers import find_sessions, map_sessions, read_manifest
+
+        if self.manifest is not None:
+            sessions = read_manifest(self.manifest)
+        else:
+            sessions = find_sessions(t.cast(os.PathLike, self.data_path))
+        logger.info("Mapping %d sessions with %d workers.", len(sessions), self.workers)
+        summary = map_sessions(sessions, workers=self.workers, force=self.force)
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            f.write(summary.model_dump_json(indent=2))
+        logger.info(
+            "Mapped %d, skipped %d and failed %d sessions in %.1f s. Summary written to %s",
+            summary.mapped,
+            summary.skipped,
+            summary.failed,
+            summary.duration_s,
+            self.summary_path,
+        )
+
+
+class ReintegrateCli(BaseSettings, cli_kebab_case=True):
+    """Recomputes the channel csv files from the raw frames and a set of ROIs."""
+
+    data_path: CliPositionalArg[Path] = Field(description="Path to the session data directory.")
+    regions: t.Optional[Path] = Field(
+        default=None, description="Path to a RoiSettings json file. Defaults to the regions.json of the session."
+    )
+    output_path: t.Optional[Path] = Field(
+        default=None, description="Directory where the csv files are written. Defaults to <data-path>/reintegrated."
+    )
+    channels: t.List[t.Literal["green", "iso", "red"]] = Field(
+        default=["green", "iso", "red"], description="Color channels to integrate."
+    )
+    chunk_size: int = Field(default=2048, ge=1, description="Number of frames integrated per block.")
+    workers: t.Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Number of worker processes used to integrate channels in parallel. If not provided, channels run serially.",
+    )
+
+    def cli_cmd(self):
+        import concurrent.futures
+
+        from aind_physiology_fip.data_integration import _reintegrate_to_csv
+        from aind_physiology_fip.rig import RoiSettings
+
+        if not Path(self.data_path).exists():
+            raise FileNotFoundError(f"Dataset path {self.data_path} does not exist.")
+        roi_settings = None
+        if self.regions is not None:
+            roi_settings = RoiSettings.model_validate_json(Path(self.regions).read_text(encoding="utf-8"))
+        output_path = self.output_path or Path(self.data_path) / "reintegrated"
+        os.makedirs(output_path, exist_ok=True)
+        args = [
+            (Path(self.data_path), channel, roi_settings, output_path, self.chunk_size) for channel in self.channels
+        ]
+        if self.workers is None:
+            for arg in args:
+                _reintegrate_to_csv(*arg)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for future in [executor.submit(_reintegrate_to_csv, *arg) for arg in args]:
+                    future.result()
+        logger.info("Integration written to %s", output_path)
+
+
+class ProcessCli(BaseSettings, cli_kebab_case=True):
+    """Computes background-subtracted, isosbestic-corrected dF/F for the color channels of a session."""
+
+    data_path: CliPositionalArg[Path] = Field(description="Path to the session data directory.")
+    output_path: t.Optional[Path] = Field(
+        default=None, description="Directory where the dF/F files are written. Defaults to <data-path>/processed."
+    )
+    channels: t.List[t.Literal["green", "red"]] = Field(
+        default=["green", "red"], description="Color channels to process."
+    )
+    baseline: t.Optional[t.Literal["isosbestic", "rolling"]] = Field(
+        default=None,
+        description="Baseline used as F0. Defaults to the isosbestic fit for green and a rolling mean for red.",
+    )
+    baseline_window_s: float = Field(default=60.0, gt=0, description="Width (s) of the rolling baseline window.")
+    chunk_size: int = Field(default=65536, ge=1, description="Number of samples fitted and written per block.")
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_contract import dataset
+        from aind_physiology_fip.data_processing import process_channel
+
+        if not Path(self.data_path).exists():
+            raise FileNotFoundError(f"Dataset path {self.data_path} does not exist.")
+        output_path = self.output_path or Path(self.data_path) / "processed"
+        os.makedirs(output_path, exist_ok=True)
+        _dataset = dataset(Path(self.data_path))
+        for channel in self.channels:
+            written = process_channel(
+                _dataset,
+                channel,
+                output_path,
+                baseline=self.baseline,
+                baseline_window_s=self.baseline_window_s,
+                chunk_size=self.chunk_size,
+            )
+            logger.info("Wrote %s", written)
+
+
+class BenchmarkCli(BaseSettings, cli_kebab_case=True):
+    """Benchmarks the data pipeline stages on a real or synthetic session."""
+
+    data_path: t.Optional[Path] = Field(
+        default=None, description="Path to a session to benchmark. If not provided, a synthetic session is generated."
+    )
+    session_path: t.Optional[Path] = Field(
+        default=None,
+        description="Directory where the synthetic session is generated and kept. Defaults to a temporary directory.",
+    )
+    duration_s: float = Field(default=600.0, gt=0, description="Duration (s) of the synthetic session.")
+    fibers: int = Field(default=4, ge=1, description="Number of fibers of the synthetic session.")
+    epochs: int = Field(default=1, ge=1, description="Number of epochs of the synthetic session.")
+    seed: int = Field(default=0, description="Seed of the synthetic session.")
+    stages: t.List[t.Literal["frame_reader", "dataset_load", "data_qc", "data_mappers"]] = Field(
+        default=["frame_reader", "dataset_load", "data_qc", "data_mappers"], description="Stages to benchmark."
+    )
+    repeat: int = Field(default=3, ge=1, description="Number of times each stage is run.")
+    isolate: bool = Field(
+        default=True, description="Run each repetition in a fresh process, so peak memory is measured per stage."
+    )
+    output: Path = Field(default=Path("fip_benchmark.json"), description="Path where the json report is written.")
+    baseline: t.Optional[Path] = Field(
+        default=None, description="Path to a report of an earlier release to compare against."
+    )
+    max_regression: float = Field(
+        default=0.2,
+        ge=0,
+        description="Largest allowed increase, as a fraction of the baseline, of the wall time, peak memory and bytes read of each stage.",
+    )
+
+    def cli_cmd(self):
+        from aind_physiology_fip.benchmark import (
+            BenchmarkReport,
+            compare_reports,
+            run_benchmark,
+            run_synthetic_benchmark,
+        )
+        from aind_physiology_fip.synthetic import SyntheticSessionSpec
+
+        kwargs: t.Dict[str, t.Any] = {"stages": self.stages, "repeat": self.repeat, "isolate": self.isolate}
+        if self.data_path is not None:
+            report = run_benchmark(self.data_path, **kwargs)
+        else:
+            spec = SyntheticSessionSpec(
+                duration_s=self.duration_s, n_fibers=self.fibers, n_epochs=self.epochs, seed=self.seed
+            )
+            report = run_synthetic_benchmark(spec, session_path=self.session_path, **kwargs)
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write(report.model_dump_json(indent=2))
+        for stage in report.stages:
+            logger.info(
+                "%s: %.3f s, peak memory %s bytes, read %s bytes",
+                stage.name,
+                stage.wall_time_s,
+                stage.peak_rss_bytes,
+                stage.read_bytes,
+            )
+        logger.info("Benchmark report written to %s", self.output)
+
+        if self.baseline is not None:
+            baseline = BenchmarkReport.model_validate_json(Path(self.baseline).read_text(encoding="utf-8"))
+            regressions = compare_reports(report, baseline, max_regression=self.max_regression)
+            for regression in regressions:
+                logger.error("Regression since %s: %s", baseline.version, regression)
+            if regressions:
+                raise SystemExit(1)
+
+
+class ColumnarCacheCli(BaseSettings, cli_kebab_case=True):
+    """Pre-builds the columnar csv caches for a directory tree."""
+
+    root: CliPositionalArg[Path] = Field(description="Root directory to search.")
+    force: bool = Field(default=False, description="Rebuild caches even if they are up to date.")
+    workers: int = Field(default=1, ge=1, description="Number of worker processes.")
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_cache import build_columnar_caches
+
+        if not Path(self.root).exists():
+            raise FileNotFoundError(f"Path {self.root} does not exist.")
+        written = build_columnar_caches(self.root, force=self.force, workers=self.workers)
+        logger.info("Wrote %d columnar caches under %s", len(written), self.root)
+
+
+class FrameIndexCli(BaseSettings, cli_kebab_case=True):
+    """Builds or verifies the integrity indexes of the raw frame files of a directory tree."""
+
+    root: CliPositionalArg[Path] = Field(description="Root directory to search.")
+    verify: bool = Field(
+        default=False,
+        description="Verify raw frame files against their indexes instead of building them. Exits with an error if any file fails.",
+    )
+    force: bool = Field(default=False, description="Rebuild indexes even if they are up to date.")
+    workers: int = Field(default=1, ge=1, description="Number of worker processes.")
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_integrity import verify_frame_indexes, write_frame_indexes
+
+        if not Path(self.root).exists():
+            raise FileNotFoundError(f"Path {self.root} does not exist.")
+        if not self.verify:
+            written = write_frame_indexes(self.root, force=self.force, workers=self.workers)
+            logger.info("Wrote %d frame indexes under %s", len(written), self.root)
+            return
+        reports = verify_frame_indexes(self.root, workers=self.workers)
+        failed = [report for report in reports if not report.ok]
+        for report in reports:
+            (logger.error if not report.ok else logger.info)(report.summary())
+        logger.info("Verified %d indexed raw frame files, %d failed.", len(reports), len(failed))
+        if failed:
+            raise SystemExit(1)
+
+
+class FrameArchiveCli(BaseSettings, cli_kebab_case=True):
+    """Compresses the raw frame files of a directory tree in place, or restores them."""
+
+    root: CliPositionalArg[Path] = Field(description="Root directory to search.")
+    extract: bool = Field(default=False, description="Restore the raw frame files of archives instead.")
+    codec: t.Literal["zstd", "lz4"] = Field(default="zstd", description="Compression codec.")
+    level: t.Optional[int] = Field(default=1, description="Compression level. Higher levels are smaller and slower.")
+    workers: int = Field(default=1, ge=1, description="Number of files converted at once, each in its own process.")
+    threads: t.Optional[int] = Field(
+        default=None, ge=1, description="Number of compression threads per file. Defaults to the number of CPUs."
+    )
+    delete_source: bool = Field(
+        default=False,
+        description="Delete the raw frame files once their archives were verified, or the archives once they were extracted.",
+    )
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_archive import archive_frame_files, extract_frame_files
+
+        if not Path(self.root).exists():
+            raise FileNotFoundError(f"Path {self.root} does not exist.")
+        if self.extract:
+            written = extract_frame_files(self.root, workers=self.workers, delete_archive=self.delete_source)
+            logger.info("Restored %d raw frame files under %s", len(written), self.root)
+            return
+        written = archive_frame_files(
+            self.root,
+            workers=self.workers,
+            codec=self.codec,
+            level=self.level,
+            threads=self.threads,
+            delete_source=self.delete_source,
+        )
+        logger.info("Archived %d raw frame files under %s", len(written), self.root)
+
+
+class ZarrExportCli(BaseSettings, cli_kebab_case=True):
+    """Exports the raw frames of a session to a chunked zarr store."""
+
+    data_path: CliPositionalArg[Path] = Field(description="Path to the session data directory.")
+    output_path: t.Optional[Path] = Field(
+        default=None, description="Path of the zarr store. Defaults to <data-path>/frames.zarr."
+    )
+    channels: t.Optional[
+        t.List[t.Literal["green", "iso", "red", "background_green", "background_iso", "background_red"]]
+    ] = Field(default=None, description="Channels to export. Defaults to every channel whose raw frames exist.")
+    tile: int = Field(
+        default=32, ge=1, description="Side (pixels) of the square tile of a chunk. About the size of a fiber ROI."
+    )
+    chunk_kb: int = Field(
+        default=128, ge=1, description="Target uncompressed size (KB) of a chunk, which sets the frames per chunk."
+    )
+    level: int = Field(default=1, description="zstd compression level.")
+    workers: int = Field(default=1, ge=1, description="Number of channels exported at once, each in its own process.")
+    overwrite: bool = Field(default=False, description="Replace an existing store.")
+
+    def cli_cmd(self):
+        from aind_physiology_fip.data_export import export_zarr
+
+        if not Path(self.data_path).exists():
+            raise FileNotFoundError(f"Dataset path {self.data_path} does not exist.")
+        written = export_zarr(
+            self.data_path,
+            self.output_path,
+            channels=self.channels,
+            tile=self.tile,
+            chunk_bytes=self.chunk_kb * 2**10,
+            compression_level=self.level,
+            workers=self.workers,
+            overwrite=self.overwrite,
+        )
+        logger.info("Frames exported to %s", written)
+
+
 class FipCli(BaseSettings, cli_prog_name="fip", cli_kebab_case=True):
     data_qc: CliSubCommand[DataQcCli] = Field(description="Run data quality checks.")
     version: CliSubCommand[VersionCli] = Field(
         description="Print the version of the aind-physiology-fip package.",
     )
     data_mappers: CliSubCommand[DataMapperCli] = Field(description="Generate metadata for aind-data-schema.")
+    reintegrate: CliSubCommand[ReintegrateCli] = Field(
+        description="Recompute the channel csv files from the raw frames.",
+    )
+    process: CliSubCommand[ProcessCli] = Field(
+        description="Compute dF/F for the color channels.",
+    )
+    build_cache: CliSubCommand[ColumnarCacheCli] = Field(
+        description="Pre-build columnar caches for the csv files of a directory tree.",
+    )
+    frame_index: CliSubCommand[FrameIndexCli] = Field(
+        description="Build or verify checksum indexes of the raw frame files of a directory tree.",
+    )
+    archive: CliSubCommand[FrameArchiveCli] = Field(
+        description="Compress the raw frame files of a directory tree in place, or restore them.",
+    )
+    export_zarr: CliSubCommand[ZarrExportCli] = Field(
+        description="Export the raw frames of a session to a chunked zarr store.",
+    )
+    benchmark: CliSubCommand[BenchmarkCli] = Field(
+        description="Benchmark the data pipeline on a real or synthetic session.",
+    )
     regenerate: CliSubCommand[DslRegenerateCli] = Field(
         description="Regenerate the aind-physiology-fip dsl dependencies.",
     )
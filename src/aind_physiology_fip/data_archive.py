@@ -0,0 +1,480 @@
+import collections
+import concurrent.futures
+import functools
+import io
+import json
+import logging
+import os
+import struct
+import threading
+import typing as t
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from aind_physiology_fip import __semver__, profiling
+from aind_physiology_fip.data_contract import FipFrameReader, frame_archive_path
+from aind_physiology_fip.data_integrity import FrameIndex, find_frame_readers, load_frame_index
+from aind_physiology_fip.utils import atomic_write_path, import_pyarrow
+
+logger = logging.getLogger(__name__)
+
+_FRAME_ARCHIVE_FORMAT = 1
+_FRAME_ARCHIVE_MAGIC = b"FIPZ\x00\x01\r\n"
+# Offset of the block index and length of the json header, followed by the magic
+_FRAME_ARCHIVE_TRAILER = struct.Struct("<QQ8s")
+
+
+def _shuffle(data: t.Union[bytes, bytearray, memoryview], itemsize: int) -> np.ndarray:
+    """Groups the bytes of equal significance of every item, which makes slowly varying pixels compress much better."""
+    src = np.frombuffer(data, dtype=np.uint8)
+    n = len(src) // itemsize * itemsize
+    plane = n // itemsize
+    out = np.empty_like(src)
+    # A strided copy per byte plane is several times faster than transposing
+    for k in range(itemsize):
+        out[k * plane : (k + 1) * plane] = src[k:n:itemsize]
+    out[n:] = src[n:]
+    return out
+
+
+def _unshuffle(data: t.Any, itemsize: int) -> np.ndarray:
+    src = np.frombuffer(data, dtype=np.uint8)
+    n = len(src) // itemsize * itemsize
+    plane = n // itemsize
+    out = np.empty_like(src)
+    for k in range(itemsize):
+        out[k:n:itemsize] = src[k * plane : (k + 1) * plane]
+    out[n:] = src[n:]
+    return out
+
+
+_decompression_pool: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+_decompression_pool_lock = threading.Lock()
+
+
+def _get_decompression_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _decompression_pool
+    with _decompression_pool_lock:
+        if _decompression_pool is None:
+            _decompression_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="fip-frame-archive"
+            )
+        return _decompression_pool
+
+
+class FrameArchiveWriter:
+    """Streams the bytes of a raw frame file into a compressed frame archive.
+
+    The bytes are cut into blocks of `block_size_bytes`, which should hold a whole number of
+    frames. Each block is byte-shuffled and compressed on its own, on a pool of `threads`
+    threads, so that any block can later be decompressed without the others. At most two blocks
+    per thread are held in memory at once.
+
+    The archive starts with a magic number, followed by the compressed blocks, the block offsets,
+    the CRC-32 of every uncompressed block, a json header and a fixed-size trailer pointing to the
+    offsets.
+
+    Args:
+        path: Path of the archive to write.
+        block_size_bytes: Uncompressed size of every block but the last.
+        itemsize: Size in bytes of a pixel, used to shuffle the bytes.
+        codec: pyarrow compression codec.
+        level: Compression level. Defaults to the fastest level of the codec.
+        threads: Number of compression threads. Defaults to the number of CPUs.
+        metadata: Json-serializable metadata stored in the header, e.g. the camera metadata.
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        *,
+        block_size_bytes: int,
+        itemsize: int,
+        codec: t.Literal["zstd", "lz4"] = "zstd",
+        level: t.Optional[int] = 1,
+        threads: t.Optional[int] = None,
+        metadata: t.Optional[t.Dict[str, t.Any]] = None,
+    ) -> None:
+        pa = import_pyarrow("Compressed frame archives")
+        self.path = Path(path)
+        self.block_size_bytes = block_size_bytes
+        self.itemsize = itemsize
+        self.codec = codec
+        self.metadata = metadata or {}
+        self._codec = pa.Codec(codec, level)
+        self._threads = threads or os.cpu_count() or 1
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._threads, thread_name_prefix="fip-frame-archive-writer"
+        )
+        self._pending: t.Deque[concurrent.futures.Future] = collections.deque()
+        self._buffer = bytearray()
+        self._offsets = [len(_FRAME_ARCHIVE_MAGIC)]
+        self._checksums: t.List[int] = []
+        self.size_bytes = 0
+        self._file = open(self.path, "wb")
+        self._file.write(_FRAME_ARCHIVE_MAGIC)
+
+    def _compress(self, block: bytes) -> t.Tuple[int, bytes]:
+        return zlib.crc32(block), self._codec.compress(_shuffle(block, self.itemsize), asbytes=True)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._executor.submit(self._compress, block))
+        self.size_bytes += len(block)
+        while len(self._pending) >= 2 * self._threads:
+            self._flush_one()
+
+    def _flush_one(self) -> None:
+        checksum, compressed = self._pending.popleft().result()
+        self._file.write(compressed)
+        self._checksums.append(checksum)
+        self._offsets.append(self._offsets[-1] + len(compressed))
+
+    def write(self, data: t.Union[bytes, bytearray, memoryview]) -> None:
+        self._buffer.extend(data)
+        if len(self._buffer) < self.block_size_bytes:
+            return
+        view = memoryview(self._buffer)
+        n_full = len(self._buffer) // self.block_size_bytes * self.block_size_bytes
+        for lo in range(0, n_full, self.block_size_bytes):
+            self._submit(bytes(view[lo : lo + self.block_size_bytes]))
+        view.release()
+        del self._buffer[:n_full]
+
+    def close(self) -> None:
+        """Compresses the last block and writes the index. The archive is not valid before this is called."""
+        if self._file.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._flush_one()
+            header = json.dumps(
+                {
+                    "format": _FRAME_ARCHIVE_FORMAT,
+                    "version": __semver__,
+                    "codec": self.codec,
+                    "itemsize": self.itemsize,
+                    "block_size_bytes": self.block_size_bytes,
+                    "size_bytes": self.size_bytes,
+                    "n_blocks": len(self._checksums),
+                    "metadata": self.metadata,
+                }
+            ).encode("utf-8")
+            index_offset = self._offsets[-1]
+            self._file.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+            self._file.write(np.asarray(self._checksums, dtype="<u4").tobytes())
+            self._file.write(header)
+            self._file.write(_FRAME_ARCHIVE_TRAILER.pack(index_offset, len(header), _FRAME_ARCHIVE_MAGIC))
+        finally:
+            self._abort()
+
+    def _abort(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._file.close()
+
+    def __enter__(self) -> t.Self:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._abort()
+
+
+class FrameArchive:
+    """Random-access reader of a compressed frame archive written by `FrameArchiveWriter`.
+
+    Reads only decompress the blocks they overlap. Reads that span several blocks decompress them
+    in parallel on a shared thread pool. Every decompressed block is checked against its CRC-32.
+    The archive holds no open file, so it can be pickled to worker processes.
+    """
+
+    def __init__(self, path: os.PathLike) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(_FRAME_ARCHIVE_MAGIC)) != _FRAME_ARCHIVE_MAGIC:
+                raise ValueError(f"{self.path} is not a frame archive.")
+            f.seek(-_FRAME_ARCHIVE_TRAILER.size, os.SEEK_END)
+            index_offset, header_length, magic = _FRAME_ARCHIVE_TRAILER.unpack(f.read(_FRAME_ARCHIVE_TRAILER.size))
+            if magic != _FRAME_ARCHIVE_MAGIC:
+                raise ValueError(f"Frame archive {self.path} is incomplete.")
+            f.seek(index_offset)
+            index = f.read()[: -_FRAME_ARCHIVE_TRAILER.size]
+        header = json.loads(index[len(index) - header_length :].decode("utf-8"))
+        if header.get("format") != _FRAME_ARCHIVE_FORMAT:
+            raise ValueError(f"Unsupported frame archive format {header.get('format')} in {self.path}.")
+        n_blocks = header["n_blocks"]
+        self.codec: str = header["codec"]
+        self.itemsize: int = header["itemsize"]
+        self.block_size_bytes: int = header["block_size_bytes"]
+        self.size_bytes: int = header["size_bytes"]
+        self.version: str = header["version"]
+        self.metadata: t.Dict[str, t.Any] = header["metadata"]
+        self.offsets = np.frombuffer(index, dtype="<u8", count=n_blocks + 1).astype(np.int64)
+        self.checksums = np.frombuffer(index, dtype="<u4", count=n_blocks, offset=8 * (n_blocks + 1))
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.checksums)
+
+    @property
+    def compressed_size_bytes(self) -> int:
+        return self.path.stat().st_size
+
+    def _block_size(self, block: int) -> int:
+        return min(self.block_size_bytes, self.size_bytes - block * self.block_size_bytes)
+
+    def _decode(self, block: int, payload: t.Union[bytes, memoryview]) -> np.ndarray:
+        codec = import_pyarrow("Compressed frame archives").Codec(self.codec)
+        data = _unshuffle(codec.decompress(payload, decompressed_size=self._block_size(block)), self.itemsize)
+        if zlib.crc32(data) != int(self.checksums[block]):
+            raise IOError(f"Block {block} of frame archive {self.path} is corrupted.")
+        return data
+
+    def _read_blocks(self, first: int, stop: int) -> t.List[np.ndarray]:
+        with open(self.path, "rb", buffering=0) as f:
+            f.seek(int(self.offsets[first]))
+            compressed = memoryview(f.read(int(self.offsets[stop] - self.offsets[first])))
+        payloads = [
+            compressed[int(self.offsets[b] - self.offsets[first]) : int(self.offsets[b + 1] - self.offsets[first])]
+            for b in range(first, stop)
+        ]
+        if stop - first == 1:
+            return [self._decode(first, payloads[0])]
+        return list(_get_decompression_pool().map(self._decode, range(first, stop), payloads))
+
+    def readinto(self, offset: int, out: t.Union[bytearray, memoryview]) -> int:
+        """Reads the uncompressed bytes starting at `offset` into `out`. Returns the number of bytes read."""
+        out = memoryview(out).cast("B")
+        length = max(0, min(len(out), self.size_bytes - offset))
+        if length == 0:
+            return 0
+        first = offset // self.block_size_bytes
+        stop = (offset + length - 1) // self.block_size_bytes + 1
+        position = 0
+        for block, data in zip(range(first, stop), self._read_blocks(first, stop)):
+            lo = max(offset - block * self.block_size_bytes, 0)
+            hi = min(offset + length - block * self.block_size_bytes, len(data))
+            out[position : position + hi - lo] = data[lo:hi].data
+            position += hi - lo
+        return length
+
+    def open(self) -> "_FrameArchiveFile":
+        """Opens the uncompressed bytes as a read-only binary file."""
+        return _FrameArchiveFile(self)
+
+    def verify(self) -> t.List[int]:
+        """Decompresses every block and returns the blocks that fail their checksum."""
+        bad = []
+        for block in range(self.n_blocks):
+            try:
+                self._read_blocks(block, block + 1)
+            except (IOError, OSError, ValueError):
+                bad.append(block)
+        return bad
+
+
+class _FrameArchiveFile(io.RawIOBase):
+    def __init__(self, archive: FrameArchive) -> None:
+        self._archive = archive
+        self._position = 0
+        self.name = str(archive.path)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self._archive.size_bytes}[whence]
+        self._position = base + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, buffer: t.Any) -> int:
+        n = self._archive.readinto(self._position, buffer)
+        self._position += n
+        return n
+
+
+def _check_frame_index(archive: FrameArchive, index: FrameIndex) -> t.List[int]:
+    """Decompresses an archive in the blocks of a frame index and returns the blocks whose checksum does not match.
+
+    Bytes of the archive past the indexed size are not checked.
+
+    Raises:
+        IOError: If a block of the archive fails its own checksum.
+    """
+    bad = []
+    buffer = bytearray(index.block_size_bytes)
+    with archive.open() as f:
+        for block in range(index.n_blocks):
+            length = min(index.block_size_bytes, index.file_size - block * index.block_size_bytes)
+            n = f.readinto(memoryview(buffer)[:length])
+            if zlib.crc32(memoryview(buffer)[:n]) != int(index.block_checksums[block]):
+                bad.append(block)
+    return bad
+
+
+# Small blocks keep random access cheap: reading a single frame decompresses at most this much
+_TARGET_BLOCK_BYTES = 2**20
+# Number of blocks read from the source file at once
+_READ_BLOCKS = 16
+
+
+def archive_frame_file(
+    reader: FipFrameReader,
+    *,
+    codec: t.Literal["zstd", "lz4"] = "zstd",
+    level: t.Optional[int] = 1,
+    threads: t.Optional[int] = None,
+    frames_per_block: t.Optional[int] = None,
+    delete_source: bool = False,
+) -> Path:
+    """Compresses a raw frame file into a frame archive next to it, in a single streaming pass.
+
+    The archive is decompressed and checked against the checksums of the source blocks before the
+    source can be deleted, so an interrupted or failed conversion never loses data. If the source
+    has a frame index, the archive is also checked against it, so that a source corrupted since it
+    was indexed is not archived in its place. Once the source is deleted, `FipFrameReader` reads
+    the archive transparently.
+
+    Args:
+        reader: Reader of the raw frame file.
+        codec: Compression codec.
+        level: Compression level.
+        threads: Number of compression threads. Defaults to the number of CPUs.
+        frames_per_block: Frames per independently compressed block. Defaults to about 1 MB blocks.
+        delete_source: Delete the raw frame file once its archive was verified. Otherwise readers
+            keep reading the raw frame file.
+
+    Returns:
+        Path: Path of the archive.
+
+    Raises:
+        IOError: If the archive does not match the source, e.g. because the source changed while it
+            was read, or does not match the frame index of the source.
+    """
+    source = Path(reader.params.path)
+    path = frame_archive_path(source)
+    frames_per_block = frames_per_block or max(1, _TARGET_BLOCK_BYTES // reader.frame_size_bytes)
+    block_size_bytes = frames_per_block * reader.frame_size_bytes
+    metadata = {
+        "width": reader.params.width,
+        "height": reader.params.height,
+        "dtype": np.dtype(reader.params.bit_depth).str,
+        "layout": reader.params.layout,
+        "source": source.name,
+    }
+    index = load_frame_index(source)
+    if index is not None and not index.is_compatible(reader):
+        logger.warning("Not checking the archive of %s against a frame index built for other frames.", source)
+        index = None
+    with atomic_write_path(path) as tmp_path:
+        with profiling.span(source.name, "archive", action="compress"):
+            buffer = bytearray(block_size_bytes * _READ_BLOCKS)
+            with (
+                open(source, "rb", buffering=0) as f,
+                FrameArchiveWriter(
+                    tmp_path,
+                    block_size_bytes=block_size_bytes,
+                    itemsize=np.dtype(reader.params.bit_depth).itemsize,
+                    codec=codec,
+                    level=level,
+                    threads=threads,
+                    metadata=metadata,
+                ) as writer,
+            ):
+                while n := f.readinto(buffer):
+                    writer.write(memoryview(buffer)[:n])
+            archive = FrameArchive(tmp_path)
+            if archive.size_bytes != source.stat().st_size:
+                raise IOError(f"{source} changed while it was archived.")
+            # Decompress every block before the source can be removed
+            if index is None:
+                if bad := archive.verify():
+                    raise IOError(f"Blocks {bad} of the archive of {source} do not match the source.")
+            else:
+                if index.file_size > archive.size_bytes:
+                    raise IOError(f"{source} is shorter than its frame index.")
+                # Reading the archive also checks every block against its own checksum
+                if bad := _check_frame_index(archive, index):
+                    raise IOError(f"Blocks {bad} of the frame index of {source} do not match its archive.")
+            logger.info(
+                "Archived %s: %d to %d bytes (%.1f%%)",
+                source,
+                archive.size_bytes,
+                archive.compressed_size_bytes,
+                100 * archive.compressed_size_bytes / max(archive.size_bytes, 1),
+            )
+    if delete_source:
+        # The memory map of the reader would keep the file open
+        reader.close()
+        source.unlink()
+    return path
+
+
+def extract_frame_file(reader: FipFrameReader, *, delete_archive: bool = False) -> Path:
+    """Restores the raw frame file of a frame archive, in a single streaming pass.
+
+    Args:
+        reader: Reader of the archived raw frame file.
+        delete_archive: Delete the archive once the raw frame file was restored.
+
+    Returns:
+        Path: Path of the raw frame file.
+    """
+    archive = reader.archive
+    path = Path(reader.params.path)
+    if archive is None:
+        raise FileNotFoundError(f"No frame archive found for {path}.")
+    with atomic_write_path(path) as tmp_path, profiling.span(path.name, "archive", action="extract"):
+        buffer = bytearray(archive.block_size_bytes * _READ_BLOCKS)
+        with archive.open() as source, open(tmp_path, "wb") as f:
+            while n := source.readinto(buffer):
+                f.write(memoryview(buffer)[:n])
+    if delete_archive:
+        archive.path.unlink()
+    return path
+
+
+def _map(fn: t.Callable[[FipFrameReader], Path], readers: t.List[FipFrameReader], workers: int) -> t.List[Path]:
+    if workers <= 1:
+        return [fn(reader) for reader in readers]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fn, readers))
+
+
+def archive_frame_files(root: os.PathLike, *, workers: int = 1, **kwargs: t.Any) -> t.List[Path]:
+    """Compresses every raw frame file under a directory tree in place. Files that already have an archive are skipped.
+
+    Args:
+        root: Root directory to search.
+        workers: Number of files compressed at once, each in its own process.
+        **kwargs: Passed to `archive_frame_file`.
+
+    Returns:
+        List[Path]: Archives that were written.
+    """
+    readers = [reader for reader in find_frame_readers(root) if not frame_archive_path(reader.params.path).exists()]
+    return _map(functools.partial(archive_frame_file, **kwargs), readers, workers)
+
+
+def extract_frame_files(root: os.PathLike, *, workers: int = 1, delete_archive: bool = False) -> t.List[Path]:
+    """Restores every archived raw frame file under a directory tree.
+
+    Returns:
+        List[Path]: Raw frame files that were restored.
+    """
+    readers = [reader for reader in find_frame_readers(root) if reader.archive is not None]
+    return _map(functools.partial(extract_frame_file, delete_archive=delete_archive), readers, workers)
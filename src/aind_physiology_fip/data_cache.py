@@ -0,0 +1,54 @@
+import concurrent.futures
+import logging
+import os
+import typing as t
+from pathlib import Path
+
+from aind_physiology_fip.data_contract import (
+    CachedCsv,
+    CachedCsvParams,
+    build_columnar_cache,
+    dataset,
+    is_columnar_cache_fresh,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def find_csv_streams(root: os.PathLike) -> t.List[CachedCsvParams]:
+    """Finds every csv file of the data contract under a directory tree.
+
+    Any directory holding at least one csv file is treated as a session (or epoch) root.
+    """
+    params = []
+    for directory in sorted({path.parent for path in Path(root).rglob("*.csv")}):
+        for stream in dataset(directory).iter_all():
+            if isinstance(stream, CachedCsv) and Path(stream.reader_params.path).exists():
+                params.append(t.cast(CachedCsvParams, stream.reader_params))
+    return params
+
+
+def _build_if_stale(params: CachedCsvParams, force: bool) -> t.Optional[Path]:
+    if not force and is_columnar_cache_fresh(params):
+        return None
+    return build_columnar_cache(params)
+
+
+def build_columnar_caches(root: os.PathLike, *, force: bool = False, workers: int = 1) -> t.List[Path]:
+    """Builds the columnar sidecar cache of every csv stream under a directory tree.
+
+    Args:
+        root: Root directory to search.
+        force: Rebuild caches even if they are fresh.
+        workers: Number of worker processes.
+
+    Returns:
+        List[Path]: Caches that were written.
+    """
+    streams = find_csv_streams(root)
+    if workers <= 1:
+        written = [_build_if_stale(params, force) for params in streams]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            written = list(executor.map(_build_if_stale, streams, [force] * len(streams)))
+    return [path for path in written if path is not None]
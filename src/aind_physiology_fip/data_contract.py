@@ -1,20 +1,33 @@
+import collections
 import dataclasses
+import hashlib
 import json
 import logging
 import os
+import queue
+import threading
 import typing as t
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
 from aind_behavior_services.session import Session
+from contraqctor._typing import UnsetData
 from contraqctor.contract import Dataset, DataStream, FilePathBaseParam, csv
 from contraqctor.contract.json import PydanticModel
 
-from aind_physiology_fip import __semver__
+from aind_physiology_fip import __semver__, profiling
 from aind_physiology_fip.rig import AindPhysioFipRig, RoiSettings
+from aind_physiology_fip.utils import atomic_write_path, import_pyarrow
+
+if t.TYPE_CHECKING:
+    from aind_physiology_fip.data_archive import FrameArchive
 
 logger = logging.getLogger(__name__)
 
+FrameSelection = t.Union[slice, range, t.Sequence[int], np.ndarray]
+FrameChunk = t.Tuple[int, np.ndarray]
+
 
 @dataclasses.dataclass
 class _FipFrameReaderParams(FilePathBaseParam):
@@ -30,32 +43,258 @@ class FipFrameReader:
 
     def __post_init__(self):
         self.frame_size_bytes = self.params.width * self.params.height * np.dtype(self.params.bit_depth).itemsize
+        self._memmap: t.Optional[np.ndarray] = None
+        self._archive: t.Optional["FrameArchive"] = None
 
-    def get_frames(self, frame_indices: t.List[int]) -> t.List[np.ndarray]:
+    @property
+    def archive(self) -> t.Optional["FrameArchive"]:
+        """Compressed archive the frames are read from, if the raw file was replaced by one."""
+        if Path(self.params.path).exists():
+            return None
+        if self._archive is None and (archive_path := frame_archive_path(self.params.path)).exists():
+            # The archive format is only imported once an archive is found
+            from aind_physiology_fip.data_archive import FrameArchive
+
+            self._archive = FrameArchive(archive_path)
+        return self._archive
+
+    @property
+    def size_bytes(self) -> int:
+        """Size of the raw frame data, uncompressed."""
+        archive = self.archive
+        if archive is not None:
+            return archive.size_bytes
         file_path = Path(self.params.path)
         if not file_path.exists():
             raise FileNotFoundError(f"File {file_path} does not exist.")
-        frames = []
-        with open(file_path, "rb") as f:
-            for idx in frame_indices:
-                f.seek(idx * self.frame_size_bytes)
+        return file_path.stat().st_size
+
+    def open(self) -> t.BinaryIO:
+        """Opens the raw frame data as an unbuffered binary file, decompressing it if it was archived."""
+        archive = self.archive
+        if archive is not None:
+            return t.cast(t.BinaryIO, archive.open())
+        return open(Path(self.params.path), "rb", buffering=0)
+
+    def get_frames(self, frame_indices: t.List[int]) -> t.List[np.ndarray]:
+        """Independent, writable copies of the requested frames. Use `frames` for zero-copy access.
+
+        The frames are read with `read_frames`, which closes the file before returning, so unlike
+        `frames` this never keeps the file open.
+        """
+        return list(self.read_frames(frame_indices))
+
+    @property
+    def frames(self) -> np.ndarray:
+        """Lazy, read-only view of the whole file with shape (n_frames, height, width).
+
+        The file is memory-mapped on first access and the column-major layout is resolved
+        as a stride view, so indexing and slicing only touch the pages that are read.
+        The map is recreated if the file has grown since it was last opened. The map, and any view
+        obtained from it, keeps the file open, which on Windows prevents it from being moved, replaced
+        or deleted; call `close` and drop the views first.
+
+        Raises:
+            ValueError: If the frames were archived, since compressed frames cannot be mapped.
+                Use `read_frames` or `iter_chunks` instead.
+        """
+        if self.archive is not None:
+            raise ValueError(f"Frames of {self.params.path} are archived and cannot be memory-mapped.")
+        n_frames = self.number_of_frames
+        if self._memmap is None or self._memmap.shape[0] != n_frames:
+            self._memmap = self._open_memmap(n_frames)
+        if self.params.layout == "row_major":
+            return self._memmap
+        return self._memmap.transpose(0, 2, 1)
+
+    def _open_memmap(self, n_frames: int) -> np.ndarray:
+        if self.params.layout == "row_major":
+            shape = (n_frames, self.params.height, self.params.width)
+        else:
+            shape = (n_frames, self.params.width, self.params.height)
+        if n_frames == 0:
+            # np.memmap refuses to map empty files
+            return np.empty(shape, dtype=self.params.bit_depth)
+        return np.memmap(Path(self.params.path), dtype=self.params.bit_depth, mode="r", shape=shape)
+
+    def read_frames(self, selection: FrameSelection, *, max_gap: int = 0) -> np.ndarray:
+        """Read a selection of frames into a single (n, height, width) array.
+
+        The selection can be a slice or range (e.g. `slice(None, None, 100)` for every 100th frame)
+        or an arbitrary sequence of frame indices, in any order and with repetitions. Negative
+        indices count from the end of the file. Runs of consecutive indices are coalesced into a
+        single read; indices that are at most `max_gap` frames apart are also merged, reading
+        (and discarding) the frames in between instead of issuing another seek.
+
+        Args:
+            selection: Frames to read.
+            max_gap: Largest number of unrequested frames read through to merge two runs.
+
+        Returns:
+            np.ndarray: Frames in the requested order.
+        """
+        indices = self._resolve_indices(selection)
+        if self.params.layout == "row_major":
+            frame_shape = (self.params.height, self.params.width)
+        else:
+            frame_shape = (self.params.width, self.params.height)
+
+        archive = self.archive
+        if archive is not None:
+            # Frames of an archive are decompressed a block at a time, so frames within a block are read together
+            max_gap = max(max_gap, archive.block_size_bytes // self.frame_size_bytes)
+        unique, inverse = np.unique(indices, return_inverse=True)
+        buffer = np.empty((len(unique),) + frame_shape, dtype=self.params.bit_depth)
+        with profiling.span("read_frames", "io", path=str(self.params.path), frames=len(unique)):
+            if len(unique) > 0:
+                breaks = np.flatnonzero(np.diff(unique) > max_gap + 1) + 1
+                run_bounds = np.concatenate(([0], breaks, [len(unique)]))
+                with self.open() as f:
+                    for lo, hi in zip(run_bounds[:-1], run_bounds[1:]):
+                        members = unique[lo:hi]
+                        first, span = int(members[0]), int(members[-1] - members[0]) + 1
+                        f.seek(first * self.frame_size_bytes)
+                        if span == len(members):
+                            _readinto_exact(f, buffer[lo:hi])
+                        else:
+                            scratch = np.empty((span,) + frame_shape, dtype=self.params.bit_depth)
+                            _readinto_exact(f, scratch)
+                            buffer[lo:hi] = scratch[members - first]
+
+        out = buffer if np.array_equal(unique, indices) else buffer[inverse.reshape(-1)]
+        if self.params.layout == "row_major":
+            return out
+        return out.transpose(0, 2, 1)
+
+    def _resolve_indices(self, selection: FrameSelection) -> np.ndarray:
+        n_frames = self.number_of_frames
+        if isinstance(selection, slice):
+            return np.arange(*selection.indices(n_frames), dtype=np.int64)
+        if isinstance(selection, range):
+            indices = np.arange(selection.start, selection.stop, selection.step, dtype=np.int64)
+        else:
+            indices = np.asarray(selection, dtype=np.int64).reshape(-1)
+        indices = np.where(indices < 0, indices + n_frames, indices)
+        if indices.size > 0 and (indices.min() < 0 or indices.max() >= n_frames):
+            raise IndexError(f"Frame indices out of range for file with {n_frames} frames.")
+        return indices
+
+    def iter_chunks(
+        self,
+        chunk_size: int = 2048,
+        *,
+        start: int = 0,
+        stop: t.Optional[int] = None,
+        max_memory_bytes: t.Optional[int] = None,
+        prefetch: int = 0,
+    ) -> t.Iterator[FrameChunk]:
+        """Stream the file as consecutive chunks of frames.
 
-                frame_data = np.fromfile(f, dtype=self.params.bit_depth, count=self.params.width * self.params.height)
+        Yields `(first_frame_index, frames)` tuples, where `frames` has shape (n, height, width)
+        with n <= chunk_size. If `max_memory_bytes` is given, the chunk size is reduced so that all
+        chunks alive at once (the one being consumed plus any read ahead) fit within the ceiling.
 
-                if self.params.layout == "row_major":
-                    frame = frame_data.reshape((self.params.height, self.params.width))
-                else:
-                    frame = frame_data.reshape((self.params.width, self.params.height)).T
-                frames.append(frame)
-        return frames
+        Args:
+            chunk_size: Maximum number of frames per chunk.
+            start: First frame to read.
+            stop: One past the last frame to read. Defaults to the end of the file.
+            max_memory_bytes: Optional ceiling on the memory held by in-flight chunks.
+            prefetch: Number of chunks to read ahead on a background thread. 0 reads synchronously.
+
+        Raises:
+            ValueError: If `chunk_size` is not positive, `prefetch` is negative, or the memory
+                ceiling cannot hold a single frame per in-flight chunk. Raised by the call itself,
+                not on the first iteration.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer.")
+        if prefetch < 0:
+            raise ValueError("prefetch must be a non-negative integer.")
+        if max_memory_bytes is not None:
+            # With read-ahead, the producer may hold one chunk while the queue is full
+            in_flight = 1 if prefetch == 0 else prefetch + 2
+            chunk_size = min(chunk_size, max_memory_bytes // (in_flight * self.frame_size_bytes))
+            if chunk_size < 1:
+                raise ValueError(
+                    f"max_memory_bytes={max_memory_bytes} cannot hold {in_flight} in-flight chunk(s) "
+                    f"of {self.frame_size_bytes} byte frames."
+                )
+        start, stop, _ = slice(start, stop).indices(self.number_of_frames)
+        chunks = (
+            (lo, self.read_frames(slice(lo, min(lo + chunk_size, stop)))) for lo in range(start, stop, chunk_size)
+        )
+        # Both are lazy, so no frame is read and no thread is started until the first iteration
+        return chunks if prefetch == 0 else _read_ahead(chunks, prefetch)
+
+    def close(self) -> None:
+        """Release the underlying memory map. Views obtained from `frames` keep it alive until dropped.
+
+        Must be called before the file is moved, replaced or deleted, e.g. by archiving it.
+        """
+        self._memmap = None
 
     @property
     def number_of_frames(self) -> int:
-        file_path = Path(self.params.path)
-        if not file_path.exists():
-            raise FileNotFoundError(f"File {file_path} does not exist.")
-        file_size = file_path.stat().st_size
-        return file_size // self.frame_size_bytes
+        return self.size_bytes // self.frame_size_bytes
+
+
+def _readinto_exact(f: t.BinaryIO, buffer: np.ndarray) -> None:
+    view = memoryview(buffer.reshape(-1).view(np.uint8))
+    while len(view) > 0:
+        n_read = f.readinto(view)
+        if not n_read:
+            raise EOFError(f"Unexpected end of file while reading {f.name}.")
+        view = view[n_read:]
+
+
+T = t.TypeVar("T")
+
+
+def _read_ahead(items: t.Iterator[T], depth: int) -> t.Iterator[T]:
+    """Drain `items` on a background thread, keeping at most `depth` of them queued."""
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(entry: t.Tuple[str, t.Any]) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in items:
+                if not _put(("item", item)):
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            _put(("error", e))
+            return
+        _put(("done", None))
+
+    worker = threading.Thread(target=_produce, name="fip-frame-read-ahead", daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, payload = buffer.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+        worker.join()
+
+
+FRAME_ARCHIVE_SUFFIX = ".fipz"
+
+
+def frame_archive_path(bin_path: os.PathLike) -> Path:
+    """Path of the compressed archive that replaces a raw frame file."""
+    return Path(str(bin_path) + FRAME_ARCHIVE_SUFFIX)
 
 
 @dataclasses.dataclass
@@ -66,12 +305,24 @@ class FipRawFrameParams(FilePathBaseParam):
 class FipRawFrame(DataStream[FipFrameReader, FipRawFrameParams]):
     make_params = FipRawFrameParams
 
+    def load(self) -> t.Self:
+        with profiling.span(self.resolved_name, "load"):
+            return super().load()
+
+    def iter_chunks(self, chunk_size: int = 2048, **kwargs: t.Any) -> t.Iterator[FrameChunk]:
+        """Stream the raw frames in chunks. See `FipFrameReader.iter_chunks`."""
+        return self.data.iter_chunks(chunk_size, **kwargs)
+
     @staticmethod
-    def _reader(params: FipRawFrameParams) -> FipFrameReader:
+    def metadata_path(params: FipRawFrameParams) -> Path:
+        """Path of the camera metadata json that describes the frames."""
         if params.metadata_file is None:
-            metadata_file = Path(str(params.path).replace(".bin", "_metadata.json"))
-        else:
-            metadata_file = params.metadata_file
+            return Path(str(params.path).replace(".bin", "_metadata.json"))
+        return Path(params.metadata_file)
+
+    @staticmethod
+    def _reader(params: FipRawFrameParams) -> FipFrameReader:
+        metadata_file = FipRawFrame.metadata_path(params)
         if not metadata_file.exists():
             raise FileNotFoundError(f"Metadata file {metadata_file} does not exist.")
         with open(metadata_file, "r", encoding="utf-8") as f:
@@ -100,7 +351,275 @@ class FipRawFrame(DataStream[FipFrameReader, FipRawFrameParams]):
         )
 
 
-def dataset(root: os.PathLike) -> Dataset:
+class _PydanticModel(PydanticModel):
+    def load(self) -> t.Self:
+        with profiling.span(self.resolved_name, "load"):
+            return super().load()
+
+
+COLUMNAR_CACHE_SUFFIX = ".feather"
+_COLUMNAR_CACHE_METADATA_KEY = b"aind_physiology_fip.source"
+
+
+@dataclasses.dataclass
+class CachedCsvParams(csv.CsvParams):
+    columns: t.Optional[t.List[str]] = None
+    columnar_cache: bool = False
+    validate_hash: bool = False
+
+
+def columnar_cache_path(csv_path: os.PathLike) -> Path:
+    """Path of the columnar sidecar cache of a csv file."""
+    return Path(str(csv_path) + COLUMNAR_CACHE_SUFFIX)
+
+
+def _source_fingerprint(path: os.PathLike, with_hash: bool) -> t.Dict[str, t.Any]:
+    stat = Path(path).stat()
+    fingerprint: t.Dict[str, t.Any] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+        fingerprint["sha256"] = digest.hexdigest()
+    return fingerprint
+
+
+def _fresh_columnar_cache_schema(params: CachedCsvParams) -> t.Optional[t.Any]:
+    cache_path = columnar_cache_path(params.path)
+    if not cache_path.exists():
+        return None
+    pa = import_pyarrow("Columnar csv caching")
+    try:
+        with pa.memory_map(str(cache_path)) as source:
+            schema = pa.ipc.open_file(source).schema
+        stored = json.loads((schema.metadata or {})[_COLUMNAR_CACHE_METADATA_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid) as e:
+        logger.warning("Ignoring unreadable columnar cache %s: %s", cache_path, e)
+        return None
+    current = _source_fingerprint(params.path, with_hash=params.validate_hash)
+    if stored.get("size") != current["size"]:
+        return None
+    if params.validate_hash:
+        if stored.get("sha256") != current["sha256"]:
+            return None
+    elif stored.get("mtime_ns") != current["mtime_ns"]:
+        return None
+    return schema
+
+
+def is_columnar_cache_fresh(params: CachedCsvParams) -> bool:
+    """Whether the sidecar cache of a csv file exists and matches the file's size and mtime (or hash)."""
+    return _fresh_columnar_cache_schema(params) is not None
+
+
+def _read_columnar_cache(params: CachedCsvParams) -> t.Optional[pd.DataFrame]:
+    """Reads the sidecar cache of a csv file, or returns None if it is missing or stale."""
+    schema = _fresh_columnar_cache_schema(params)
+    if schema is None:
+        return None
+    columns = None
+    if params.columns is not None:
+        wanted = set(params.columns) | ({params.index} if params.index is not None else set())
+        columns = [name for name in schema.names if name in wanted]
+    pa = import_pyarrow("Columnar csv caching")
+    return pa.feather.read_table(columnar_cache_path(params.path), columns=columns, memory_map=True).to_pandas()
+
+
+def build_columnar_cache(params: CachedCsvParams, data: t.Optional[pd.DataFrame] = None) -> Path:
+    """Writes the sidecar cache of a csv file.
+
+    Args:
+        params: Parameters of the csv stream. Column selection and indexing are ignored; the cache
+            always holds every column of the file.
+        data: Already parsed contents of the whole file, without an index set. Parsed from the csv if not provided.
+
+    Returns:
+        Path: Path of the written cache.
+    """
+    pa = import_pyarrow("Columnar csv caching")
+    # Fingerprint before parsing so that a concurrent write to the csv invalidates the cache
+    fingerprint = _source_fingerprint(params.path, with_hash=True)
+    if data is None:
+        data = pd.read_csv(params.path, delimiter=params.delimiter, header=0 if params.strict_header else None)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), _COLUMNAR_CACHE_METADATA_KEY: json.dumps(fingerprint).encode()}
+    table = table.replace_schema_metadata(metadata)
+    cache_path = columnar_cache_path(params.path)
+    with atomic_write_path(cache_path) as tmp_path:
+        pa.feather.write_feather(table, str(tmp_path))
+    return cache_path
+
+
+class CachedCsv(csv.Csv):
+    """Csv stream that materializes only the columns its consumers declared.
+
+    Consumers call `require_columns` before the data is first accessed. The union of all
+    declared columns (plus the index) is parsed once and shared. Declaring `None` requests every
+    column. When attached to a `StreamCache`, the parsed table may be evicted to stay within a
+    memory budget and is transparently parsed again on the next access.
+    """
+
+    make_params = CachedCsvParams
+
+    # `has_data`, `_solve_data_load` and `_evict` override internals of the contraqctor 0.5 `DataStream`
+    # (the `_data` attribute and the `_solve_data_load` hook behind `data`), as released in 0.5.3 to 0.5.8.
+    # The `data` extra pins `contraqctor<0.6`; check these overrides before raising that bound.
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._cache: t.Optional["StreamCache"] = None
+        self._evicted = False
+        self._columns_declared = getattr(self.reader_params, "columns", None) is not None
+        self._loaded_columns: t.Optional[t.List[str]] = None
+        self._load_lock = threading.RLock()
+
+    @staticmethod
+    def _reader(params: CachedCsvParams) -> pd.DataFrame:
+        wanted: t.Optional[t.Set[str]] = None
+        if params.columns is not None:
+            wanted = set(params.columns) | ({params.index} if params.index is not None else set())
+
+        data = _read_columnar_cache(params) if params.columnar_cache else None
+        if data is None:
+            data = pd.read_csv(
+                params.path,
+                delimiter=params.delimiter,
+                header=0 if params.strict_header else None,
+                # The columnar cache always holds every column, so parse them all when building it
+                usecols=None if wanted is None or params.columnar_cache else (lambda column: column in wanted),
+            )
+            if params.columnar_cache:
+                try:
+                    build_columnar_cache(params, data)
+                except OSError as e:
+                    logger.warning("Could not write columnar cache for %s: %s", params.path, e)
+                if wanted is not None:
+                    data = data[[column for column in data.columns if column in wanted]]
+        if params.index is not None:
+            data.set_index(params.index, inplace=True)
+        return data
+
+    def require_columns(self, columns: t.Optional[t.Iterable[str]]) -> t.Self:
+        """Declares the columns a consumer reads. `None` requests all columns.
+
+        If the table is already loaded without some of the requested columns, it is invalidated
+        and parsed again, with the union of all declarations, on the next access.
+        """
+        params = t.cast(CachedCsvParams, self.reader_params)
+        declared = params.columns if self._columns_declared else []
+        if columns is None or declared is None:
+            params.columns = None
+        else:
+            params.columns = sorted(set(declared) | set(columns))
+        self._columns_declared = True
+        loaded = self._loaded_columns
+        if (super().has_data or self._evicted) and loaded is not None:
+            if params.columns is None or not set(params.columns) <= set(loaded):
+                self.clear()
+        return self
+
+    @property
+    def has_data(self) -> bool:
+        return super().has_data or self._evicted
+
+    def _solve_data_load(self) -> pd.DataFrame:
+        with self._load_lock:
+            if self._evicted:
+                self.load()
+            elif self._cache is not None and super().has_data:
+                self._cache._touch(self)
+            return super()._solve_data_load()
+
+    def load(self) -> t.Self:
+        self._evicted = False
+        columns = t.cast(CachedCsvParams, self.reader_params).columns
+        self._loaded_columns = None if columns is None else list(columns)
+        with profiling.span(self.resolved_name, "load"):
+            super().load()
+        if self._cache is not None and super().has_data:
+            self._cache._admit(self)
+        return self
+
+    def clear(self) -> t.Self:
+        self._evicted = False
+        if self._cache is not None:
+            self._cache._forget(self)
+        return super().clear()
+
+    def _evict(self) -> None:
+        self._data = UnsetData
+        self._evicted = True
+
+
+class StreamCache:
+    """Per-dataset cache of parsed `CachedCsv` tables with an optional memory budget.
+
+    Tables are kept in least-recently-used order. When a newly loaded table pushes the total
+    above `max_bytes`, the least recently used tables are evicted; they are parsed again if
+    accessed later. The table that was just loaded is never evicted.
+    """
+
+    def __init__(self, max_bytes: t.Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self._entries: collections.OrderedDict[int, t.Tuple[CachedCsv, int]] = collections.OrderedDict()
+        self._streams: t.Dict[str, CachedCsv] = {}
+        self._lock = threading.RLock()
+
+    def attach(self, fip_dataset: Dataset) -> t.Self:
+        """Routes every `CachedCsv` stream of a dataset through this cache."""
+        for stream in fip_dataset.iter_all():
+            if isinstance(stream, CachedCsv):
+                stream._cache = self
+                self._streams[stream.name] = stream
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._entries.values())
+
+    def invalidate(self, stream_name: t.Optional[str] = None) -> None:
+        """Drops the parsed table of one stream, or of every stream if no name is given.
+
+        Streams that are not cached, e.g. because they were never loaded or were already evicted, are ignored.
+        """
+        names = list(self._streams) if stream_name is None else [stream_name]
+        for name in names:
+            if (stream := self._streams.get(name)) is not None:
+                stream.clear()
+
+    def _touch(self, stream: CachedCsv) -> None:
+        with self._lock:
+            if id(stream) in self._entries:
+                self._entries.move_to_end(id(stream))
+
+    def _forget(self, stream: CachedCsv) -> None:
+        with self._lock:
+            self._entries.pop(id(stream), None)
+
+    def _admit(self, stream: CachedCsv) -> None:
+        size = int(t.cast(pd.DataFrame, stream._data).memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._entries[id(stream)] = (stream, size)
+            self._entries.move_to_end(id(stream))
+            if self.max_bytes is None:
+                return
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                evicted, _ = self._entries.popitem(last=False)[1]
+                logger.debug("Evicting %s from the stream cache.", evicted.name)
+                evicted._evict()
+
+
+def dataset(root: os.PathLike, *, cache: t.Optional[StreamCache] = None, columnar_cache: bool = False) -> Dataset:
+    """Builds the FIP data contract for a session directory.
+
+    Args:
+        root: Session data directory.
+        cache: Optional cache that shares parsed csv streams within a memory budget.
+        columnar_cache: If True, csv streams are read from a fresh columnar sidecar cache when one
+            exists, and the cache is written on first read otherwise. Requires pyarrow.
+    """
     root = Path(root)
     dataset = Dataset(
         version=__semver__,
@@ -142,57 +661,59 @@ def dataset(root: os.PathLike) -> Dataset:
                 ),
                 description="Iso camera channel raw background frames. This file is optional.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "green",
-                reader_params=csv.CsvParams(path=Path(root) / "green.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "green.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for green camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "red",
-                reader_params=csv.CsvParams(path=Path(root) / "red.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "red.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for red camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "iso",
-                reader_params=csv.CsvParams(path=Path(root) / "iso.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "iso.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for iso camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "background_green",
-                reader_params=csv.CsvParams(path=Path(root) / "background_green.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "background_green.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for background green camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "background_red",
-                reader_params=csv.CsvParams(path=Path(root) / "background_red.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "background_red.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for background red camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "background_iso",
-                reader_params=csv.CsvParams(path=Path(root) / "background_iso.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "background_iso.csv", index="ReferenceTime"),
                 description="Timeseries of integrated fluorescence for background iso camera channel.",
             ),
-            csv.Csv(
+            CachedCsv(
                 "camera_green_iso_metadata",
-                reader_params=csv.CsvParams(path=Path(root) / "camera_green_iso_metadata.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(
+                    path=Path(root) / "camera_green_iso_metadata.csv", index="ReferenceTime"
+                ),
                 description="Metadata for the camera that acquires the iso and green channels",
             ),
-            csv.Csv(
+            CachedCsv(
                 "camera_red_metadata",
-                reader_params=csv.CsvParams(path=Path(root) / "camera_red_metadata.csv", index="ReferenceTime"),
+                reader_params=CachedCsv.make_params(path=Path(root) / "camera_red_metadata.csv", index="ReferenceTime"),
                 description="Metadata for the camera that acquires the red channel",
             ),
-            PydanticModel(
+            _PydanticModel(
                 "regions",
                 reader_params=PydanticModel.make_params(path=Path(root) / "regions.json", model=RoiSettings),
                 description="Regions of interest used to integrate fluorescence in the raw frames.",
             ),
-            PydanticModel(
+            _PydanticModel(
                 "session_input",
                 reader_params=PydanticModel.make_params(path=Path(root) / "Logs/session_input.json", model=Session),
                 description="Session input parameters for the FIP experiment.",
             ),
-            PydanticModel(
+            _PydanticModel(
                 "rig_input",
                 reader_params=PydanticModel.make_params(
                     path=Path(root) / "Logs/rig_input.json", model=AindPhysioFipRig
@@ -201,6 +722,12 @@ def dataset(root: os.PathLike) -> Dataset:
             ),
         ],
     )
+    if columnar_cache:
+        for stream in dataset.iter_all():
+            if isinstance(stream, CachedCsv):
+                t.cast(CachedCsvParams, stream.reader_params).columnar_cache = True
+    if cache is not None:
+        cache.attach(dataset)
     return dataset
 
 
@@ -0,0 +1,245 @@
+"""Export of the raw frames of a session to a chunked zarr store.
+
+Every channel is a group holding a `frames` array with dimensions (time, y, x) and, when the
+channel csv matches the frames, one-dimensional `reference_time`, `camera_frame_number` and
+`camera_frame_time` arrays. The `RoiSettings` of the session are stored in the attributes of the
+root group, and the camera metadata and ROIs of every channel in the attributes of its group.
+
+Frames are stored as small chunks of a few dozen frames of a square tile of pixels, grouped into
+shards that each hold whole frames. A single frame then decompresses a few dozen frames worth of
+data, and the time series of an ROI-sized patch of pixels only the tiles it overlaps, instead of
+every frame. Shards keep the number of files small, and each shard can be read without the
+others, so downstream workers can read disjoint parts of the store in parallel.
+
+Example:
+    >>> export_zarr(Path("session/fib/fip_2025-01-01T120000"), workers=3)
+    >>> frames = zarr.open_group("session/fib/fip_2025-01-01T120000/frames.zarr", mode="r")["green/frames"]
+    >>> roi_timeseries = frames[:, 80:112, 80:112]
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import shutil
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+from aind_physiology_fip import __semver__, profiling
+from aind_physiology_fip.data_contract import FipRawFrame, dataset, frame_archive_path
+from aind_physiology_fip.data_integration import _CHANNEL_CAMERA, get_channel_rois
+from aind_physiology_fip.rig import AindPhysioFipRig, RoiSettings
+from aind_physiology_fip.utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+ExportChannel = t.Literal["green", "iso", "red", "background_green", "background_iso", "background_red"]
+
+EXPORT_CHANNELS: t.Tuple[ExportChannel, ...] = t.get_args(ExportChannel)
+
+_TIME_COLUMNS = {
+    "ReferenceTime": "reference_time",
+    "CameraFrameNumber": "camera_frame_number",
+    "CameraFrameTime": "camera_frame_time",
+}
+
+
+def _import_zarr():
+    try:
+        import zarr
+        import zarr.codecs
+    except ImportError as e:
+        raise ImportError("Zarr export requires zarr. Install it with 'aind-physiology-fip[zarr]'.") from e
+    return zarr
+
+
+def frame_chunks(
+    frame_shape: t.Tuple[int, int],
+    itemsize: int,
+    *,
+    tile: int = 32,
+    chunk_bytes: int = 2**17,
+    shard_bytes: int = 2**26,
+) -> t.Tuple[t.Tuple[int, int, int], t.Tuple[int, int, int]]:
+    """Chunk and shard shapes of a (time, y, x) frame array.
+
+    Args:
+        frame_shape: (height, width) of a frame.
+        itemsize: Size in bytes of a pixel.
+        tile: Side of the square tile of pixels of a chunk. The default is about the size of a fiber ROI.
+        chunk_bytes: Target uncompressed size of a chunk, which sets the number of frames per chunk.
+        shard_bytes: Target uncompressed size of a shard, which holds whole frames.
+
+    Returns:
+        The (time, y, x) shapes of a chunk and of a shard.
+    """
+    height, width = frame_shape
+    tile_y, tile_x = min(tile, height), min(tile, width)
+    chunk_frames = max(1, chunk_bytes // (tile_y * tile_x * itemsize))
+    # Shards must hold a whole number of chunks, so they may extend past the edges of a frame
+    shard_y, shard_x = -(-height // tile_y) * tile_y, -(-width // tile_x) * tile_x
+    shard_frames = max(1, shard_bytes // (shard_y * shard_x * itemsize * chunk_frames)) * chunk_frames
+    return (chunk_frames, tile_y, tile_x), (shard_frames, shard_y, shard_x)
+
+
+def _model_attributes(model: t.Any) -> t.Any:
+    return json.loads(model.model_dump_json()) if model is not None else None
+
+
+def _load_optional(fip_dataset: t.Any, name: str) -> t.Any:
+    try:
+        return fip_dataset[name].data
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Exporting without %s: %s", name, e)
+        return None
+
+
+def _channel_attributes(fip_dataset: t.Any, channel: ExportChannel, stream: FipRawFrame) -> t.Dict[str, t.Any]:
+    color = t.cast(t.Literal["green", "iso", "red"], channel.removeprefix("background_"))
+    with open(FipRawFrame.metadata_path(t.cast(t.Any, stream.reader_params)), "r", encoding="utf-8") as f:
+        attributes: t.Dict[str, t.Any] = {"channel": channel, "camera_metadata": json.load(f)}
+    roi_settings = t.cast(t.Optional[RoiSettings], _load_optional(fip_dataset, "regions"))
+    if roi_settings is not None:
+        background, rois = get_channel_rois(roi_settings, color)
+        attributes["background_roi"] = _model_attributes(background)
+        attributes["roi"] = [_model_attributes(roi) for roi in rois]
+    rig = t.cast(t.Optional[AindPhysioFipRig], _load_optional(fip_dataset, "rig_input"))
+    if rig is not None:
+        attributes["camera"] = _model_attributes(getattr(rig, f"camera_{_CHANNEL_CAMERA[color]}"))
+    return attributes
+
+
+def _raw_stream(fip_dataset: t.Any, channel: ExportChannel) -> FipRawFrame:
+    name = (
+        f"background_raw_{channel.removeprefix('background_')}"
+        if channel.startswith("background_")
+        else f"raw_{channel}"
+    )
+    return t.cast(FipRawFrame, fip_dataset[name])
+
+
+def _has_frames(stream: FipRawFrame) -> bool:
+    path = Path(stream.reader_params.path)
+    return path.exists() or frame_archive_path(path).exists()
+
+
+def _export_channel(
+    data_path: Path,
+    store_path: Path,
+    channel: ExportChannel,
+    *,
+    tile: int,
+    chunk_bytes: int,
+    compression_level: int,
+) -> None:
+    zarr = _import_zarr()
+    fip_dataset = dataset(data_path)
+    stream = _raw_stream(fip_dataset, channel)
+    reader = stream.data
+    height, width = reader.params.height, reader.params.width
+    dtype = np.dtype(reader.params.bit_depth)
+    chunks, shards = frame_chunks((height, width), dtype.itemsize, tile=tile, chunk_bytes=chunk_bytes)
+    n_frames = reader.number_of_frames
+
+    group = zarr.open_group(store_path, mode="r+").create_group(
+        channel, attributes=_channel_attributes(fip_dataset, channel, stream)
+    )
+    frames = group.create_array(
+        "frames",
+        shape=(n_frames, height, width),
+        dtype=dtype,
+        chunks=chunks,
+        shards=shards,
+        compressors=[
+            zarr.codecs.BloscCodec(cname="zstd", clevel=compression_level, shuffle=zarr.codecs.BloscShuffle.shuffle)
+        ],
+        dimension_names=("time", "y", "x"),
+    )
+    with profiling.span(channel, "export", frames=n_frames):
+        # Writing whole shards at a time never reads back a partially written shard
+        for first, block in reader.iter_chunks(shards[0], prefetch=1):
+            frames[first : first + len(block)] = block
+
+    table = _load_optional(fip_dataset, channel)
+    if table is None:
+        return
+    if len(table) != n_frames:
+        logger.warning("Not exporting the timestamps of %s: %d rows for %d frames.", channel, len(table), n_frames)
+        return
+    columns = {"ReferenceTime": table.index.to_numpy()} | {
+        column: table[column].to_numpy() for column in _TIME_COLUMNS if column in table.columns
+    }
+    for column, values in columns.items():
+        array = group.create_array(
+            _TIME_COLUMNS[column], shape=values.shape, dtype=values.dtype, chunks=(max(1, min(len(values), 2**20)),)
+        )
+        array[:] = values
+
+
+def export_zarr(
+    data_path: os.PathLike,
+    output_path: t.Optional[os.PathLike] = None,
+    *,
+    channels: t.Optional[t.Sequence[ExportChannel]] = None,
+    tile: int = 32,
+    chunk_bytes: int = 2**17,
+    compression_level: int = 1,
+    workers: int = 1,
+    overwrite: bool = False,
+) -> Path:
+    """Exports the raw frames of a session to a zarr store, streaming them a shard at a time.
+
+    The store is written next to its final location and moved there once complete, so readers
+    never see a partial export.
+
+    Args:
+        data_path: Session (or epoch) directory.
+        output_path: Path of the store. Defaults to `<data_path>/frames.zarr`.
+        channels: Channels to export. Defaults to every channel whose raw frames exist.
+        tile: Side of the square tile of pixels of a chunk. See `frame_chunks`.
+        chunk_bytes: Target uncompressed size of a chunk. See `frame_chunks`.
+        compression_level: zstd compression level.
+        workers: Number of channels exported at once, each in its own process.
+        overwrite: Replace an existing store.
+
+    Returns:
+        Path: Path of the store.
+    """
+    zarr = _import_zarr()
+    data_path = Path(data_path)
+    output_path = Path(output_path) if output_path is not None else data_path / "frames.zarr"
+    if output_path.exists() and not overwrite:
+        raise FileExistsError(f"{output_path} already exists.")
+    fip_dataset = dataset(data_path)
+    if channels is None:
+        channels = [channel for channel in EXPORT_CHANNELS if _has_frames(_raw_stream(fip_dataset, channel))]
+    roi_settings = t.cast(t.Optional[RoiSettings], _load_optional(fip_dataset, "regions"))
+
+    with atomic_write_path(output_path) as tmp_path:
+        zarr.open_group(
+            tmp_path,
+            mode="w",
+            attributes={
+                "aind_physiology_fip": {"version": __semver__, "source": str(data_path)},
+                "roi_settings": _model_attributes(roi_settings),
+                "channels": list(channels),
+            },
+        )
+        kwargs = {"tile": tile, "chunk_bytes": chunk_bytes, "compression_level": compression_level}
+        if workers <= 1:
+            for channel in channels:
+                _export_channel(data_path, tmp_path, channel, **kwargs)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    profiling.submit(executor, _export_channel, data_path, tmp_path, channel, **kwargs)
+                    for channel in channels
+                ]
+                for future in futures:
+                    future.result()
+        # A directory cannot be replaced, so the previous store is removed last
+        if output_path.exists():
+            shutil.rmtree(output_path)
+    return output_path
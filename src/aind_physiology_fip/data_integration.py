@@ -0,0 +1,305 @@
+import dataclasses
+import functools
+import logging
+import typing as t
+from pathlib import Path
+
+import contraqctor.contract as contract
+import numpy as np
+import pandas as pd
+
+from aind_physiology_fip import profiling
+from aind_physiology_fip.data_contract import FipFrameReader, FipRawFrame, dataset
+from aind_physiology_fip.rig import Circle, RoiSettings
+
+logger = logging.getLogger(__name__)
+
+ChannelName = t.Literal["green", "iso", "red"]
+
+_CHANNEL_CAMERA: t.Dict[str, str] = {"green": "green_iso", "iso": "green_iso", "red": "red"}
+
+
+def get_channel_rois(settings: RoiSettings, channel: ChannelName) -> t.Tuple[Circle, t.List[Circle]]:
+    """Returns the background circle and the fiber circles used to integrate a color channel."""
+    camera = _CHANNEL_CAMERA[channel]
+    return getattr(settings, f"camera_{camera}_background"), getattr(settings, f"camera_{camera}_roi")
+
+
+_CircleGeometry = t.Tuple[float, float, float]
+RoiIndexKey = t.Tuple[t.Tuple[int, int], t.Tuple[_CircleGeometry, ...]]
+
+
+def _circle_geometry(circle: Circle) -> _CircleGeometry:
+    return (float(circle.center.x), float(circle.center.y), float(circle.radius))
+
+
+def _circle_pixels(
+    geometry: _CircleGeometry, frame_shape: t.Tuple[int, int]
+) -> t.Tuple[np.ndarray, np.ndarray, t.Tuple[int, int, int, int]]:
+    """Row and column coordinates of the pixels inside a circle, in row-major order, and their bounding box.
+
+    Only the circle's bounding box is evaluated, but the mask is the same as testing every
+    pixel of the frame against `(x - cx)**2 + (y - cy)**2 <= r**2`. The bounding box is the
+    smallest `(row_start, row_stop, col_start, col_stop)` window holding those pixels.
+    """
+    h, w = frame_shape
+    cx, cy, r = geometry
+    y0, y1 = max(int(np.floor(cy - r)), 0), min(int(np.ceil(cy + r)) + 1, h)
+    x0, x1 = max(int(np.floor(cx - r)), 0), min(int(np.ceil(cx + r)) + 1, w)
+    if y0 >= y1 or x0 >= x1:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), (0, 0, 0, 0)
+    y, x = np.ogrid[y0:y1, x0:x1]
+    rows, cols = np.nonzero((x - cx) ** 2 + (y - cy) ** 2 <= r**2)
+    if rows.size == 0:
+        return rows, cols, (0, 0, 0, 0)
+    rows, cols = rows + y0, cols + x0
+    return rows, cols, (int(rows.min()), int(rows.max()) + 1, int(cols.min()), int(cols.max()) + 1)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class RoiPixelIndex:
+    """Precomputed pixel coordinates for a set of circular ROIs.
+
+    The pixels of every circle are concatenated into `rows`/`cols`, with `offsets[i]` marking
+    where circle `i` starts. Integrating a block of frames is then a single gather followed by
+    `np.add.reduceat`, instead of building a full-frame mask per circle and per frame.
+
+    Indexes are hashable and compare equal by `key`, the ROI geometry and frame shape they were
+    built from. `from_circles` and `from_settings` return a shared, cached instance per key, so
+    QC, integration and plotting reuse the same read-only arrays.
+    """
+
+    key: RoiIndexKey
+    frame_shape: t.Tuple[int, int]
+    rows: np.ndarray
+    cols: np.ndarray
+    offsets: np.ndarray
+    counts: np.ndarray
+    # Smallest (row_start, row_stop, col_start, col_stop) window holding the pixels of each ROI
+    bounding_boxes: np.ndarray
+    # Flat index of every pixel in a row-major frame, and in a frame stored column-major
+    row_major_index: np.ndarray
+    column_major_index: np.ndarray
+
+    @classmethod
+    def from_circles(cls, circles: t.Sequence[Circle], frame_shape: t.Tuple[int, int]) -> "RoiPixelIndex":
+        frame_shape = (int(frame_shape[0]), int(frame_shape[1]))
+        return _cached_index((frame_shape, tuple(_circle_geometry(circle) for circle in circles)))
+
+    @classmethod
+    def from_settings(
+        cls, settings: RoiSettings, channel: ChannelName, frame_shape: t.Tuple[int, int]
+    ) -> "RoiPixelIndex":
+        """Index of the background (first) and fiber ROIs used to integrate a color channel."""
+        background, regions = get_channel_rois(settings, channel)
+        return cls.from_circles([background, *regions], frame_shape)
+
+    @classmethod
+    def _build(cls, key: RoiIndexKey) -> "RoiPixelIndex":
+        frame_shape, geometries = key
+        pixels = [_circle_pixels(geometry, frame_shape) for geometry in geometries]
+        counts = np.array([len(rows) for rows, _, _ in pixels], dtype=np.intp)
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        rows = np.concatenate([rows for rows, _, _ in pixels]) if pixels else np.empty(0, dtype=np.intp)
+        cols = np.concatenate([cols for _, cols, _ in pixels]) if pixels else np.empty(0, dtype=np.intp)
+        bounding_boxes = np.array([box for _, _, box in pixels], dtype=np.intp).reshape(-1, 4)
+        return cls(
+            key=key,
+            frame_shape=frame_shape,
+            rows=_read_only(rows),
+            cols=_read_only(cols),
+            offsets=_read_only(offsets),
+            counts=_read_only(counts),
+            bounding_boxes=_read_only(bounding_boxes),
+            row_major_index=_read_only(rows * frame_shape[1] + cols),
+            column_major_index=_read_only(cols * frame_shape[0] + rows),
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RoiPixelIndex) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    @property
+    def n_rois(self) -> int:
+        return len(self.counts)
+
+    def pixels(self, image: np.ndarray, roi: int) -> np.ndarray:
+        """Values of the pixels inside ROI `roi` for a single (height, width) image."""
+        lo = self.offsets[roi]
+        hi = lo + self.counts[roi]
+        return image[self.rows[lo:hi], self.cols[lo:hi]]
+
+    def _gather(self, frames: np.ndarray) -> np.ndarray:
+        """Pixels of every ROI for a block of frames, as a (n, total_pixels) float array."""
+        n = frames.shape[0]
+        storage = frames.transpose(0, 2, 1)
+        if storage.flags.c_contiguous:
+            flat, flat_index = storage.reshape(n, -1), self.column_major_index
+        else:
+            flat, flat_index = frames.reshape(n, -1), self.row_major_index
+        return flat[:, flat_index].astype(np.float64, copy=False)
+
+    def integrate(self, frames: np.ndarray) -> np.ndarray:
+        """Mean pixel value of each ROI for a block of frames.
+
+        Args:
+            frames: Array of shape (n, height, width). Frames read from column-major files are
+                gathered directly from their storage order, without a transposing copy.
+
+        Returns:
+            np.ndarray: Array of shape (n, n_rois). ROIs that contain no pixels are NaN.
+        """
+        return self.statistics(frames, with_std=False)[0]
+
+    def statistics(self, frames: np.ndarray, *, with_std: bool = True) -> t.Tuple[np.ndarray, np.ndarray]:
+        """Mean and standard deviation of the pixels of each ROI for a block of frames.
+
+        Both are reduced from a single gather of the ROI pixels, so the spatial spread of every ROI
+        costs one extra `np.add.reduceat` over the same block.
+
+        Args:
+            frames: Array of shape (n, height, width).
+            with_std: Compute the standard deviation. If False, it is returned as all NaN.
+
+        Returns:
+            Tuple of two arrays of shape (n, n_rois). ROIs that contain no pixels are NaN.
+        """
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(f"Frame shape {frames.shape[1:]} does not match the ROI index {self.frame_shape}.")
+        mean = np.full((frames.shape[0], self.n_rois), np.nan)
+        std = np.full((frames.shape[0], self.n_rois), np.nan)
+        valid = self.counts > 0
+        if frames.shape[0] == 0 or not valid.any():
+            return mean, std
+        with profiling.span("roi_statistics", "compute", frames=frames.shape[0], rois=self.n_rois):
+            gathered = self._gather(frames)
+            offsets, counts = self.offsets[valid], self.counts[valid]
+            mean[:, valid] = np.add.reduceat(gathered, offsets, axis=1) / counts
+            if with_std:
+                # Subtract the ROI means before squaring to avoid cancellation on bright, flat ROIs
+                centered = gathered - np.repeat(mean[:, valid], counts, axis=1)
+                std[:, valid] = np.sqrt(np.add.reduceat(centered**2, offsets, axis=1) / counts)
+        return mean, std
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_index(key: RoiIndexKey) -> RoiPixelIndex:
+    return RoiPixelIndex._build(key)
+
+
+def integrate_frames(
+    reader: FipFrameReader,
+    background: Circle,
+    regions: t.Sequence[Circle],
+    *,
+    chunk_size: int = 2048,
+    prefetch: int = 1,
+    max_memory_bytes: t.Optional[int] = None,
+) -> np.ndarray:
+    """Streams a raw frame file and integrates the background and fiber ROIs of every frame.
+
+    Args:
+        reader: Reader for the raw frame file.
+        background: Background circle.
+        regions: Fiber circles.
+        chunk_size: Number of frames integrated per block.
+        prefetch: Number of blocks read ahead on a background thread.
+        max_memory_bytes: Optional ceiling on the memory held by in-flight blocks.
+
+    Returns:
+        np.ndarray: Array of shape (n_frames, 1 + len(regions)) with the background first.
+    """
+    index = RoiPixelIndex.from_circles([background, *regions], (reader.params.height, reader.params.width))
+    out = np.empty((reader.number_of_frames, index.n_rois))
+    for first, frames in reader.iter_chunks(chunk_size, prefetch=prefetch, max_memory_bytes=max_memory_bytes):
+        out[first : first + len(frames)] = index.integrate(frames)
+    return out
+
+
+def sample_roi_statistics(
+    reader: FipFrameReader,
+    circles: t.Sequence[Circle],
+    frame_indices: t.Sequence[int],
+    *,
+    chunk_size: int = 256,
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Mean and standard deviation of the pixels of each ROI over a sample of frames.
+
+    Only the sampled frames are read, `chunk_size` at a time, so the cost scales with the sample
+    rather than with the length of the session.
+
+    Args:
+        reader: Reader for the raw frame file.
+        circles: ROIs to measure.
+        frame_indices: Frames to sample.
+        chunk_size: Number of sampled frames read per block.
+
+    Returns:
+        Tuple of two arrays of shape (len(frame_indices), len(circles)).
+    """
+    index = RoiPixelIndex.from_circles(circles, (reader.params.height, reader.params.width))
+    frame_indices = np.asarray(frame_indices, dtype=np.int64)
+    mean = np.empty((len(frame_indices), index.n_rois))
+    std = np.empty((len(frame_indices), index.n_rois))
+    for lo in range(0, len(frame_indices), chunk_size):
+        hi = lo + chunk_size
+        mean[lo:hi], std[lo:hi] = index.statistics(reader.read_frames(frame_indices[lo:hi]))
+    return mean, std
+
+
+def reintegrate_channel(
+    fip_dataset: contract.Dataset,
+    channel: ChannelName,
+    *,
+    roi_settings: t.Optional[RoiSettings] = None,
+    chunk_size: int = 2048,
+    prefetch: int = 1,
+) -> pd.DataFrame:
+    """Recomputes the integrated fluorescence table of a color channel from its raw frames.
+
+    The result has the same layout as the channel CSV written during acquisition
+    (`ReferenceTime` index, camera metadata, `Background` and `Fiber_N` columns). Fibers are
+    integrated as the mean pixel value inside each circle, the same reduction used online.
+
+    Args:
+        fip_dataset: Dataset created by `aind_physiology_fip.data_contract.dataset`.
+        channel: Color channel to integrate.
+        roi_settings: ROIs to integrate. Defaults to the `regions` stream of the dataset.
+        chunk_size: Number of frames integrated per block.
+        prefetch: Number of blocks read ahead on a background thread.
+
+    Raises:
+        ValueError: If the number of raw frames does not match the rows of the channel CSV.
+    """
+    if roi_settings is None:
+        roi_settings = t.cast(RoiSettings, fip_dataset["regions"].data)
+    background, regions = get_channel_rois(roi_settings, channel)
+    reader = t.cast(FipRawFrame, fip_dataset[f"raw_{channel}"]).data
+    metadata = t.cast(pd.DataFrame, fip_dataset[channel].data)[["CameraFrameNumber", "CameraFrameTime"]]
+
+    values = integrate_frames(reader, background, regions, chunk_size=chunk_size, prefetch=prefetch)
+    if len(values) != len(metadata):
+        raise ValueError(
+            f"Frame count mismatch for channel {channel}: {len(values)} raw frames, {len(metadata)} rows in csv."
+        )
+    integrated = pd.DataFrame(
+        values,
+        index=metadata.index,
+        columns=["Background", *[f"Fiber_{i}" for i in range(len(regions))]],
+    )
+    return pd.concat([metadata, integrated], axis=1)
+
+
+def _reintegrate_to_csv(
+    data_path: Path, channel: ChannelName, roi_settings: t.Optional[RoiSettings], output_path: Path, chunk_size: int
+) -> None:
+    logger.info("Integrating %s channel.", channel)
+    table = reintegrate_channel(dataset(data_path), channel, roi_settings=roi_settings, chunk_size=chunk_size)
+    table.to_csv(output_path / f"{channel}.csv")
@@ -0,0 +1,433 @@
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import os
+import typing as t
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from aind_physiology_fip import __semver__, profiling
+from aind_physiology_fip.data_contract import (
+    FRAME_ARCHIVE_SUFFIX,
+    FipFrameReader,
+    FipRawFrame,
+    dataset,
+    frame_archive_path,
+)
+from aind_physiology_fip.utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+FRAME_INDEX_SUFFIX = ".index.npz"
+FRAME_INDEX_FORMAT = 1
+
+# Blocks hold a whole number of frames, so a bad block maps to an exact range of frames
+_TARGET_BLOCK_BYTES = 16 * 2**20
+
+
+def frame_index_path(bin_path: os.PathLike) -> Path:
+    """Path of the integrity index sidecar of a raw frame file."""
+    return Path(str(bin_path) + FRAME_INDEX_SUFFIX)
+
+
+@dataclasses.dataclass(frozen=True)
+class FrameIndex:
+    """Per-block checksums and per-frame summary statistics of a raw frame file.
+
+    The file is split into blocks of `frames_per_block` frames. The last block also holds any
+    trailing bytes of an incomplete frame. Each block has a CRC-32 of its bytes, which detects
+    accidental corruption (e.g. during a transfer) at the speed of reading the file. Each complete
+    frame has its mean, minimum and maximum pixel value, so frames that are read anyway can be
+    checked without hashing.
+    """
+
+    frame_size_bytes: int
+    dtype: str
+    frames_per_block: int
+    file_size: int
+    block_checksums: np.ndarray
+    frame_mean: np.ndarray
+    frame_min: np.ndarray
+    frame_max: np.ndarray
+    version: str = __semver__
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.frame_mean)
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.block_checksums)
+
+    @property
+    def block_size_bytes(self) -> int:
+        return self.frames_per_block * self.frame_size_bytes
+
+    @property
+    def trailing_bytes(self) -> int:
+        """Bytes of an incomplete frame at the end of the indexed file."""
+        return self.file_size - self.n_frames * self.frame_size_bytes
+
+    def block_frames(self, block: int) -> t.Tuple[int, int]:
+        """First and one-past-last frame of a block."""
+        first = block * self.frames_per_block
+        return first, min(first + self.frames_per_block, self.n_frames)
+
+    def block_of_frame(self, frame: np.ndarray) -> np.ndarray:
+        return np.asarray(frame) // self.frames_per_block
+
+    def save(self, path: os.PathLike) -> Path:
+        header = {
+            "format": FRAME_INDEX_FORMAT,
+            "version": self.version,
+            "frame_size_bytes": self.frame_size_bytes,
+            "dtype": self.dtype,
+            "frames_per_block": self.frames_per_block,
+            "file_size": self.file_size,
+        }
+        path = Path(path)
+        with atomic_write_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                header=np.array(json.dumps(header)),
+                block_checksums=self.block_checksums,
+                frame_mean=self.frame_mean,
+                frame_min=self.frame_min,
+                frame_max=self.frame_max,
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> "FrameIndex":
+        with np.load(path, allow_pickle=False) as npz:
+            header = json.loads(str(npz["header"]))
+            if header.get("format") != FRAME_INDEX_FORMAT:
+                raise ValueError(f"Unsupported frame index format {header.get('format')} in {path}.")
+            return cls(
+                frame_size_bytes=header["frame_size_bytes"],
+                dtype=header["dtype"],
+                frames_per_block=header["frames_per_block"],
+                file_size=header["file_size"],
+                block_checksums=npz["block_checksums"],
+                frame_mean=npz["frame_mean"],
+                frame_min=npz["frame_min"],
+                frame_max=npz["frame_max"],
+                version=header["version"],
+            )
+
+    def is_compatible(self, reader: FipFrameReader) -> bool:
+        """Whether the index was built for frames of the size and type read by `reader`."""
+        return self.frame_size_bytes == reader.frame_size_bytes and self.dtype == np.dtype(reader.params.bit_depth).str
+
+
+def load_frame_index(bin_path: os.PathLike) -> t.Optional[FrameIndex]:
+    """Loads the integrity index of a raw frame file, or returns None if it has none or it is unreadable."""
+    path = frame_index_path(bin_path)
+    if not path.exists():
+        return None
+    try:
+        return FrameIndex.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning("Ignoring unreadable frame index %s: %s", path, e)
+        return None
+
+
+def _iter_blocks(
+    reader: FipFrameReader,
+    block_size_bytes: int,
+    size_bytes: int,
+    start_block: int = 0,
+    stop_block: t.Optional[int] = None,
+) -> t.Iterator[t.Tuple[int, memoryview]]:
+    """Streams the bytes of consecutive blocks of the first `size_bytes` of a file through a single reused buffer.
+
+    Bytes past `size_bytes` (e.g. appended while the file is read) are not read.
+    """
+    buffer = bytearray(block_size_bytes)
+    with reader.open() as f:
+        f.seek(start_block * block_size_bytes)
+        block = start_block
+        while stop_block is None or block < stop_block:
+            length = min(block_size_bytes, size_bytes - block * block_size_bytes)
+            if length <= 0:
+                return
+            view = memoryview(buffer)[:length]
+            filled = 0
+            while filled < length:
+                n = f.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            if filled == 0:
+                return
+            yield block, view[:filled]
+            block += 1
+
+
+def _frame_stats(data: memoryview, reader: FipFrameReader) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    n_frames = len(data) // reader.frame_size_bytes
+    frames = np.frombuffer(data[: n_frames * reader.frame_size_bytes], dtype=reader.params.bit_depth)
+    frames = frames.reshape(n_frames, -1)
+    if n_frames == 0:
+        empty = np.empty(0, dtype=reader.params.bit_depth)
+        return np.empty(0), empty, empty
+    # Integer sums are exact and faster than a floating point mean
+    accumulator = np.float64 if np.issubdtype(frames.dtype, np.floating) else np.uint64
+    mean = frames.sum(axis=1, dtype=accumulator) / frames.shape[1]
+    return mean.astype(np.float64), frames.min(axis=1), frames.max(axis=1)
+
+
+def build_frame_index(
+    reader: FipFrameReader, *, frames_per_block: t.Optional[int] = None, previous: t.Optional[FrameIndex] = None
+) -> FrameIndex:
+    """Indexes a raw frame file in a single streaming pass.
+
+    Args:
+        reader: Reader for the raw frame file.
+        frames_per_block: Frames per checksummed block. Defaults to about 16 MB blocks.
+        previous: Index of an earlier, shorter version of the same file (e.g. while it is still
+            being acquired). Its complete blocks are kept and only the rest of the file is read.
+            Use `verify_frame_index` to check that the indexed part did not change.
+    """
+    if frames_per_block is None:
+        frames_per_block = previous.frames_per_block if previous is not None else None
+    frames_per_block = frames_per_block or max(1, _TARGET_BLOCK_BYTES // reader.frame_size_bytes)
+    block_size_bytes = frames_per_block * reader.frame_size_bytes
+    file_size = reader.size_bytes
+
+    start_block = 0
+    checksums: t.List[np.ndarray] = []
+    means: t.List[np.ndarray] = []
+    minima: t.List[np.ndarray] = []
+    maxima: t.List[np.ndarray] = []
+    if (
+        previous is not None
+        and previous.is_compatible(reader)
+        and previous.frames_per_block == frames_per_block
+        and previous.file_size <= file_size
+    ):
+        # The last block of the previous index may have been incomplete, so it is read again
+        start_block = previous.file_size // block_size_bytes
+        kept_frames = start_block * frames_per_block
+        checksums.append(previous.block_checksums[:start_block])
+        means.append(previous.frame_mean[:kept_frames])
+        minima.append(previous.frame_min[:kept_frames])
+        maxima.append(previous.frame_max[:kept_frames])
+
+    with profiling.span(Path(reader.params.path).name, "integrity", action="index"):
+        new_checksums = []
+        for _, data in _iter_blocks(reader, block_size_bytes, file_size, start_block):
+            new_checksums.append(zlib.crc32(data))
+            mean, minimum, maximum = _frame_stats(data, reader)
+            means.append(mean)
+            minima.append(minimum)
+            maxima.append(maximum)
+    checksums.append(np.asarray(new_checksums, dtype=np.uint32))
+    dtype = np.dtype(reader.params.bit_depth)
+    return FrameIndex(
+        frame_size_bytes=reader.frame_size_bytes,
+        dtype=dtype.str,
+        frames_per_block=frames_per_block,
+        file_size=file_size,
+        block_checksums=np.concatenate(checksums).astype(np.uint32),
+        frame_mean=np.concatenate(means) if means else np.empty(0),
+        frame_min=np.concatenate(minima).astype(dtype) if minima else np.empty(0, dtype=dtype),
+        frame_max=np.concatenate(maxima).astype(dtype) if maxima else np.empty(0, dtype=dtype),
+    )
+
+
+def write_frame_index(reader: FipFrameReader, *, force: bool = False) -> t.Optional[Path]:
+    """Builds or extends the integrity index sidecar of a raw frame file.
+
+    An existing index of the same file size is left untouched unless `force` is set. An index of a
+    shorter file is extended with the appended frames.
+
+    Returns:
+        Path of the written index, or None if it was already up to date.
+    """
+    path = frame_index_path(reader.params.path)
+    previous = None if force else load_frame_index(reader.params.path)
+    if previous is not None and previous.file_size == reader.size_bytes:
+        return None
+    return build_frame_index(reader, previous=previous).save(path)
+
+
+@dataclasses.dataclass(frozen=True)
+class FrameIntegrityReport:
+    """Outcome of checking a raw frame file against its integrity index.
+
+    Attributes:
+        path: Raw frame file.
+        index: Index the file was checked against.
+        file_size: Current size of the file.
+        bad_blocks: Blocks whose checksum does not match, including blocks cut short by truncation.
+        checked_blocks: Number of blocks that were read.
+    """
+
+    path: Path
+    index: FrameIndex
+    file_size: int
+    bad_blocks: np.ndarray
+    checked_blocks: int
+
+    @property
+    def missing_bytes(self) -> int:
+        """Bytes lost since the file was indexed."""
+        return max(0, self.index.file_size - self.file_size)
+
+    @property
+    def appended_bytes(self) -> int:
+        """Bytes written after the file was indexed, which the index does not cover."""
+        return max(0, self.file_size - self.index.file_size)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.bad_blocks) == 0 and self.file_size == self.index.file_size
+
+    def bad_frames(self) -> t.List[t.Tuple[int, int]]:
+        """`(first, stop)` frame ranges of the bad blocks."""
+        return [self.index.block_frames(int(block)) for block in self.bad_blocks]
+
+    def summary(self) -> str:
+        if self.ok:
+            return f"{self.path}: {self.checked_blocks} blocks verified."
+        problems = []
+        if len(self.bad_blocks) > 0:
+            problems.append(f"bad blocks {self.bad_blocks.tolist()} (frames {self.bad_frames()})")
+        if self.missing_bytes:
+            problems.append(f"{self.missing_bytes} bytes missing")
+        if self.appended_bytes:
+            problems.append(f"{self.appended_bytes} bytes not indexed")
+        return f"{self.path}: " + ", ".join(problems) + "."
+
+
+def verify_frame_index(
+    reader: FipFrameReader,
+    index: t.Optional[FrameIndex] = None,
+    *,
+    blocks: t.Optional[range] = None,
+) -> FrameIntegrityReport:
+    """Checks a raw frame file against its integrity index in a single streaming pass.
+
+    Args:
+        reader: Reader for the raw frame file.
+        index: Index to check against. Defaults to the sidecar index of the file.
+        blocks: Contiguous range of blocks to check, so that large files can be verified
+            incrementally (e.g. a range per run). Defaults to every block.
+
+    Raises:
+        FileNotFoundError: If no index is given and the file has none.
+        ValueError: If the index was built for frames of a different size or type.
+    """
+    if index is None:
+        index = load_frame_index(reader.params.path)
+        if index is None:
+            raise FileNotFoundError(f"No frame index found for {reader.params.path}.")
+    if not index.is_compatible(reader):
+        raise ValueError(f"Frame index of {reader.params.path} was built for a different frame size or type.")
+    blocks = range(index.n_blocks) if blocks is None else blocks
+    start, stop = max(blocks.start, 0), min(blocks.stop, index.n_blocks)
+    file_size = reader.size_bytes
+    bad = []
+    checked = 0
+    with profiling.span(Path(reader.params.path).name, "integrity", action="verify"):
+        for block, data in _iter_blocks(reader, index.block_size_bytes, index.file_size, start, stop):
+            checked += 1
+            if zlib.crc32(data) != int(index.block_checksums[block]):
+                bad.append(block)
+    # Blocks past the end of a truncated file were never read
+    bad.extend(range(start + checked, stop))
+    return FrameIntegrityReport(
+        path=Path(reader.params.path),
+        index=index,
+        file_size=file_size,
+        bad_blocks=np.asarray(bad, dtype=np.int64),
+        checked_blocks=checked,
+    )
+
+
+def check_frame_stats(index: FrameIndex, frame_indices: np.ndarray, frames: np.ndarray) -> np.ndarray:
+    """Compares frames that were read anyway against their indexed statistics.
+
+    Args:
+        index: Integrity index of the file the frames were read from.
+        frame_indices: Indices of the frames in the file.
+        frames: Frames of shape (n, height, width).
+
+    Returns:
+        np.ndarray: Indices of the frames whose statistics do not match.
+    """
+    frame_indices = np.asarray(frame_indices, dtype=np.int64)
+    flat = frames.reshape(len(frames), -1)
+    accumulator = np.float64 if np.issubdtype(flat.dtype, np.floating) else np.uint64
+    mean = flat.sum(axis=1, dtype=accumulator) / flat.shape[1]
+    mismatch = (
+        (flat.min(axis=1) != index.frame_min[frame_indices])
+        | (flat.max(axis=1) != index.frame_max[frame_indices])
+        | ~np.isclose(mean, index.frame_mean[frame_indices], rtol=0, atol=1e-9)
+    )
+    return frame_indices[mismatch]
+
+
+def _is_present(path: Path) -> bool:
+    return path.exists() or frame_archive_path(path).exists()
+
+
+def find_frame_readers(root: os.PathLike) -> t.List[FipFrameReader]:
+    """Finds every raw frame file of the data contract under a directory tree.
+
+    Any directory holding at least one `.bin` file, or its compressed archive, is treated as a
+    session (or epoch) root.
+    """
+    readers = []
+    directories = {
+        path.parent for pattern in ("*.bin", "*.bin" + FRAME_ARCHIVE_SUFFIX) for path in Path(root).rglob(pattern)
+    }
+    for directory in sorted(directories):
+        for stream in dataset(directory).iter_all():
+            if isinstance(stream, FipRawFrame) and _is_present(Path(stream.reader_params.path)):
+                readers.append(FipRawFrame._reader(stream.reader_params))
+    return readers
+
+
+def write_frame_indexes(root: os.PathLike, *, force: bool = False, workers: int = 1) -> t.List[Path]:
+    """Builds or extends the integrity index of every raw frame file under a directory tree.
+
+    Args:
+        root: Root directory to search.
+        force: Rebuild indexes even if they are up to date.
+        workers: Number of worker processes.
+
+    Returns:
+        List[Path]: Indexes that were written.
+    """
+    readers = find_frame_readers(root)
+    if workers <= 1:
+        written = [write_frame_index(reader, force=force) for reader in readers]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            written = list(executor.map(_write_frame_index, readers, [force] * len(readers)))
+    return [path for path in written if path is not None]
+
+
+def _write_frame_index(reader: FipFrameReader, force: bool) -> t.Optional[Path]:
+    return write_frame_index(reader, force=force)
+
+
+def _verify_if_indexed(reader: FipFrameReader) -> t.Optional[FrameIntegrityReport]:
+    index = load_frame_index(reader.params.path)
+    return None if index is None else verify_frame_index(reader, index)
+
+
+def verify_frame_indexes(root: os.PathLike, *, workers: int = 1) -> t.List[FrameIntegrityReport]:
+    """Verifies every indexed raw frame file under a directory tree. Files without an index are skipped."""
+    readers = find_frame_readers(root)
+    if workers <= 1:
+        reports = [_verify_if_indexed(reader) for reader in readers]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            reports = list(executor.map(_verify_if_indexed, readers))
+    return [report for report in reports if report is not None]
@@ -1,30 +1,27 @@
-import logging
-import os
-from pathlib import Path
-
-import pydantic
-import pydantic_settings
+import typing as t
 
 from ._acquisition import ProtoAcquisitionDataSchema as ProtoAcquisitionDataSchema
-from ._acquisition import ProtoAcquisitionMapper
+from ._acquisition import ProtoAcquisitionMapper as ProtoAcquisitionMapper
+from ._batch import BatchMappingSummary as BatchMappingSummary
+from ._batch import SessionMappingResult as SessionMappingResult
+from ._batch import find_sessions as find_sessions
+from ._batch import map_sessions as map_sessions
+from ._batch import read_manifest as read_manifest
+from ._batch import write_acquisition as write_acquisition
 
-logger = logging.getLogger(__name__)
 
+def __getattr__(name: str) -> t.Any:
+    # The CLI class moved to aind_physiology_fip.cli, but stays importable from here
+    if name == "DataMapperCli":
+        from aind_physiology_fip.cli import DataMapperCli
 
-class DataMapperCli(pydantic_settings.BaseSettings, cli_kebab_case=True):
-    """CLI for generating AIND metadata from raw FIP data."""
+        return DataMapperCli
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    data_path: os.PathLike = pydantic.Field(description="Path to the session data directory.")
 
-    def cli_cmd(self):
-        logger.info("Mapping metadata directly from dataset.")
-        acquisition_mapped = ProtoAcquisitionMapper(self.data_path).map()
-        logger.info("Writing fip.json to %s", self.data_path)
-        # According to @dbirman, the name of this file MUST match the extractor, so we hardcode it here.
-        with open(Path(self.data_path) / "fip.json", "w", encoding="utf-8") as f:
-            f.write(acquisition_mapped.model_dump_json(indent=2))
-        logger.info("Mapping completed!")
+if __name__ == "__main__":
+    from pydantic_settings import CliApp
 
+    from aind_physiology_fip.cli import DataMapperCli
 
-if __name__ == "__main__":
-    pydantic_settings.CliApp().run(DataMapperCli)
+    CliApp().run(DataMapperCli)
@@ -28,16 +28,21 @@ Example:
     >>> print(acquisition.model_dump_json(indent=4))
 """
 
+import concurrent.futures
+import csv
+import dataclasses
 import logging
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, cast
+from typing import Any, Optional, cast
 
 import pydantic
 from aind_behavior_services.session import Session
+from contraqctor.contract import Dataset
 from pandas import DataFrame
 
+from aind_physiology_fip import profiling
 from aind_physiology_fip.data_contract import dataset
 from aind_physiology_fip.rig import AindPhysioFipRig
 
@@ -45,6 +50,9 @@ from ._base import DataMapper
 
 logger = logging.getLogger(__name__)
 
+# Size of the blocks read backwards from the end of a file when looking for its last row
+_TAIL_BLOCK_SIZE = 4096
+
 
 class ProtoAcquisitionDataSchema(pydantic.BaseModel):
     """
@@ -123,7 +131,7 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
         >>> print(acquisition.session.subject_id)
     """
 
-    def __init__(self, data_directory: os.PathLike):
+    def __init__(self, data_directory: os.PathLike, max_workers: Optional[int] = None):
         """
         Initialize the ProtoAcquisitionMapper.
 
@@ -131,11 +139,14 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
             data_directory (os.PathLike): Path to the root directory
                 containing the FIP acquisition data. Should contain a
                 'fib' subdirectory with FIP epoch folders.
+            max_workers (Optional[int]): Maximum number of threads used to
+                read the epochs. Defaults to the ThreadPoolExecutor default.
         """
         # Initialize the cached mapping result to None
         self._mapped = None
         # Store the data directory path for access during mapping
         self._data_directory = data_directory
+        self._max_workers = max_workers
 
     def map(self) -> ProtoAcquisitionDataSchema:
         """
@@ -143,7 +154,9 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
 
         This method orchestrates the extraction of all acquisition metadata
         including data stream timing, session information, and rig
-        configuration from the raw data directory structure.
+        configuration from the raw data directory structure. Each epoch is
+        loaded once, and the files of all epochs are read concurrently on a
+        thread pool. Results are combined in epoch name order.
 
         Returns:
             ProtoAcquisitionDataSchema: Complete prototype acquisition
@@ -153,36 +166,97 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
             ValueError: If no valid session or rig configuration is found
                 in any of the processed epochs.
         """
-        # Discover all FIP epoch directories within the data directory
-        epochs = list((Path(self._data_directory) / "fib").glob("fip_*"))
+        # Discover all FIP epoch directories within the data directory, in a deterministic order
+        epochs = sorted(epoch for epoch in (Path(self._data_directory) / "fib").glob("fip_*") if epoch.is_dir())
 
-        # Extract session and rig metadata from the epochs
-        session, rig = self._extract_session_and_rig(epochs)
+        # Read session, rig and timing information of every epoch in a single pass
+        with profiling.span("load_epochs", "mapper", epochs=len(epochs)):
+            loaded = self._load_epochs(epochs, max_workers=self._max_workers)
 
-        # Extract timing information from all data streams
-        data_streams_metadata = self._extract_start_end_times(epochs)
+        # Select the session and rig metadata from the first epoch that has them
+        session, rig = self._select_session_and_rig(loaded)
 
-        return ProtoAcquisitionDataSchema(
-            data_stream_metadata=data_streams_metadata,
+        self._mapped = ProtoAcquisitionDataSchema(
+            data_stream_metadata=[stream for epoch in loaded for stream in epoch.data_streams],
             session=session,
             rig=rig,
         )
+        return self._mapped
 
     @staticmethod
-    def _extract_start_end_times(
-        epochs: list[Path],
-    ) -> list[_FipDataStreamMetadata]:
+    def _load_epochs(epochs: list[Path], max_workers: Optional[int] = None) -> list["_EpochMetadata"]:
         """
-        Extract timing metadata from all FIP acquisition epochs.
+        Load the metadata of all FIP acquisition epochs concurrently.
 
-        Processes each epoch directory to extract start and end timestamps
-        from candidate data streams. This method attempts to read timing
-        information from camera metadata streams and creates a metadata
-        object for each successfully processed stream.
+        A dataset is built once per epoch. Reading its session, rig and
+        timing information are submitted as separate tasks, so that slow
+        (e.g. network) storage is accessed in parallel.
 
         Args:
             epochs (list[Path]): List of Path objects pointing to FIP
-                epoch directories to process.
+                epoch directories to load.
+            max_workers (Optional[int]): Maximum number of threads.
+
+        Returns:
+            list[_EpochMetadata]: Metadata of each epoch, in the same order
+                as `epochs`.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for epoch in epochs:
+                # Load the dataset for this epoch
+                this_epoch = dataset(root=epoch)
+                futures.append(
+                    (
+                        epoch,
+                        executor.submit(ProtoAcquisitionMapper._read_input, this_epoch, "session_input", epoch),
+                        executor.submit(ProtoAcquisitionMapper._read_input, this_epoch, "rig_input", epoch),
+                        executor.submit(ProtoAcquisitionMapper._extract_start_end_times, this_epoch, epoch),
+                    )
+                )
+            return [
+                _EpochMetadata(
+                    epoch=epoch,
+                    session=session.result(),
+                    rig=rig.result(),
+                    data_streams=data_streams.result(),
+                )
+                for epoch, session, rig, data_streams in futures
+            ]
+
+    @staticmethod
+    def _read_input(this_epoch: Dataset, name: str, epoch: Path) -> Optional[Any]:
+        """
+        Read an input model (e.g. session or rig) from an epoch dataset.
+
+        Args:
+            this_epoch (Dataset): Dataset of the epoch.
+            name (str): Name of the data stream to read.
+            epoch (Path): Path to the epoch directory, used for logging.
+
+        Returns:
+            Optional[Any]: The deserialized model, or None if it could not
+                be read.
+        """
+        try:
+            with profiling.span(f"{epoch.name}/{name}", "load"):
+                return this_epoch[name].read()
+        except Exception as e:
+            logger.debug(f"No {name} found in dataset at {epoch}: {e}")
+            return None
+
+    @staticmethod
+    def _extract_start_end_times(this_epoch: Dataset, epoch: Path) -> list[_FipDataStreamMetadata]:
+        """
+        Extract timing metadata from a FIP acquisition epoch.
+
+        Attempts to read start and end timestamps from the camera metadata
+        streams of the epoch and creates a metadata object for each
+        successfully processed stream.
+
+        Args:
+            this_epoch (Dataset): Dataset of the epoch.
+            epoch (Path): Path to the epoch directory.
 
         Returns:
             list[_FipDataStreamMetadata]: List of metadata objects
@@ -190,8 +264,9 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
                 stream.
 
         Note:
-            Failed epochs are logged as warnings and skipped, allowing
-            partial processing of multi-epoch acquisitions.
+            Failures are logged as warnings and skip the remaining streams
+            of the epoch, allowing partial processing of multi-epoch
+            acquisitions.
         """
         data_streams = []
         # List of camera metadata streams to check for timing information
@@ -199,33 +274,76 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
             "camera_green_iso_metadata",
             "camera_red_metadata",
         ]
-        for epoch in epochs:
-            # Skip non-directory entries
-            if not epoch.is_dir():
-                continue
-            try:
-                # Load the dataset for this epoch
-                this_epoch = dataset(root=epoch)
-                for stream in _candidate_streams:
-                    logger.debug(f"Checking for timing in stream: {stream}")
-                    # Extract start/end times from the stream DataFrame
-                    start_utc, end_utc = ProtoAcquisitionMapper._extract_from_df(
-                        cast(DataFrame, this_epoch[stream].read())
-                    )
-                    # Create metadata object for this data stream
-                    data_streams.append(
-                        _FipDataStreamMetadata(
-                            id=epoch.name,
-                            start_time=start_utc,
-                            end_time=end_utc,
+        try:
+            for stream in _candidate_streams:
+                logger.debug(f"Checking for timing in stream: {stream}")
+                # Read only the first and last rows of the csv, falling back to a full parse
+                params = this_epoch[stream].reader_params
+                with profiling.span(f"{epoch.name}/{stream}", "load"):
+                    try:
+                        start_utc, end_utc = ProtoAcquisitionMapper._extract_from_csv(
+                            params.path, delimiter=params.delimiter or ","
+                        )
+                    except ValueError as e:
+                        logger.debug(f"Falling back to a full parse of {params.path}: {e}")
+                        start_utc, end_utc = ProtoAcquisitionMapper._extract_from_df(
+                            cast(DataFrame, this_epoch[stream].read())
                         )
+                # Create metadata object for this data stream
+                data_streams.append(
+                    _FipDataStreamMetadata(
+                        id=epoch.name,
+                        start_time=start_utc,
+                        end_time=end_utc,
                     )
-            except Exception as e:
-                # Log warning but continue processing other epochs
-                logger.warning(f"Failed to load FIP dataset at {epoch}: {e}")
-                continue
+                )
+        except Exception as e:
+            # Log warning but continue processing other epochs
+            logger.warning(f"Failed to load FIP dataset at {epoch}: {e}")
         return data_streams
 
+    @staticmethod
+    def _extract_from_csv(path: os.PathLike, delimiter: str = ",") -> tuple[datetime, datetime]:
+        """
+        Extract start and end timestamps from a csv file without parsing it.
+
+        Reads the header and the first data row from the start of the file,
+        and the last data row by seeking backwards from the end of the file,
+        so the cost does not depend on the length of the session.
+
+        Args:
+            path (os.PathLike): Path to a csv file with a 'CpuTime' column
+                of ISO format datetime strings.
+            delimiter (str): Field delimiter of the csv file.
+
+        Returns:
+            tuple[datetime, datetime]: A tuple containing the start time
+                (first row) and end time (last row).
+
+        Raises:
+            ValueError: If the file has no 'CpuTime' column, no complete
+                data rows, or a row that cannot be read on its own (e.g.
+                a quoted field spanning several lines).
+        """
+        with open(path, "rb") as f:
+            header = _parse_row(f.readline(), delimiter)
+            if "CpuTime" not in header:
+                raise ValueError(f"No CpuTime column in {path}.")
+            column = header.index("CpuTime")
+            data_start = f.tell()
+            first = _parse_row(f.readline(), delimiter)
+            # The last row may still be incomplete if the file was not closed cleanly, so take the
+            # last one that has every column
+            last: list[str] = []
+            for line in _iter_lines_reversed(f, stop=data_start):
+                row = _parse_row(line, delimiter)
+                if len(row) == len(header):
+                    last = row
+                    break
+        if len(first) != len(header) or len(last) != len(header):
+            raise ValueError(f"Could not find complete first and last rows in {path}.")
+        return datetime.fromisoformat(first[column]), datetime.fromisoformat(last[column])
+
     @staticmethod
     def _extract_from_df(df: DataFrame) -> tuple[datetime, datetime]:
         """
@@ -253,19 +371,17 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
         return start_utc, end_utc
 
     @staticmethod
-    def _extract_session_and_rig(
-        epochs: list[Path],
+    def _select_session_and_rig(
+        epochs: list["_EpochMetadata"],
     ) -> tuple[Session, AindPhysioFipRig]:
         """
-        Extract session and rig configuration from acquisition epochs.
+        Select the session and rig configuration of an acquisition.
 
-        Searches through the provided epochs to find valid session and rig
-        configuration data. Returns the first valid session and rig found
-        across all epochs.
+        Returns the first valid session and rig found across all epochs,
+        in epoch order.
 
         Args:
-            epochs (list[Path]): List of Path objects pointing to FIP
-                epoch directories to search.
+            epochs (list[_EpochMetadata]): Loaded metadata of each epoch.
 
         Returns:
             tuple[Session, AindPhysioFipRig]: A tuple
@@ -275,29 +391,8 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
             ValueError: If no valid session_input or rig_input is found
                 in any of the provided epochs.
         """
-        session: Optional[Session] = None
-        rig: Optional[AindPhysioFipRig] = None
-        for epoch in epochs:
-            # Skip non-directory entries
-            if not epoch.is_dir():
-                continue
-            # Load the dataset for this epoch
-            _dataset = dataset(root=epoch)
-
-            # Try to extract session metadata if not already found
-            if session is None:
-                try:
-                    session = _dataset["session_input"].read()
-                except Exception as e:
-                    logger.debug(f"No session_input found in dataset at {epoch}: {e}")
-
-            # Try to extract rig configuration if not already found
-            if rig is None:
-                try:
-                    rig = _dataset["rig_input"].read()
-                except Exception as e:
-                    logger.debug(f"No rig_input found in dataset at {epoch}: {e}")
-                    continue
+        session = next((epoch.session for epoch in epochs if epoch.session is not None), None)
+        rig = next((epoch.rig for epoch in epochs if epoch.rig is not None), None)
 
         # Validate that required metadata was found
         if session is None:
@@ -305,3 +400,51 @@ class ProtoAcquisitionMapper(DataMapper[ProtoAcquisitionDataSchema]):
         if rig is None:
             raise ValueError("No rig_input found in any of the provided epochs.")
         return session, rig
+
+
+@dataclasses.dataclass
+class _EpochMetadata:
+    """
+    Internal container for the metadata read from a single FIP epoch.
+
+    Attributes:
+        epoch (Path): Path to the epoch directory.
+        session (Optional[Session]): Session input of the epoch, if any.
+        rig (Optional[AindPhysioFipRig]): Rig input of the epoch, if any.
+        data_streams (list[_FipDataStreamMetadata]): Timing metadata of
+            the data streams of the epoch.
+    """
+
+    epoch: Path
+    session: Optional[Session]
+    rig: Optional[AindPhysioFipRig]
+    data_streams: list[_FipDataStreamMetadata]
+
+
+def _parse_row(line: bytes, delimiter: str) -> list[str]:
+    """Parses a single csv line. Returns an empty list for blank lines."""
+    text = line.decode("utf-8-sig").rstrip("\r\n")
+    if not text:
+        return []
+    try:
+        return next(csv.reader([text], delimiter=delimiter, strict=True))
+    except csv.Error as e:
+        raise ValueError(f"Could not parse csv line {text!r}: {e}") from e
+
+
+def _iter_lines_reversed(f, stop: int = 0):
+    """Yields the lines of a binary file from last to first, without the lines before `stop`.
+
+    The file is read backwards in fixed-size blocks, so only the tail of the file is read when
+    the caller stops early.
+    """
+    position = f.seek(0, os.SEEK_END)
+    remainder = b""
+    while position > stop:
+        size = min(_TAIL_BLOCK_SIZE, position - stop)
+        position -= size
+        f.seek(position)
+        lines = (f.read(size) + remainder).split(b"\n")
+        remainder = lines.pop(0)
+        yield from reversed(lines)
+    yield remainder
@@ -0,0 +1,248 @@
+"""
+Batch Data Mapper Module
+
+This module maps many session directories in a single process invocation,
+for metadata backfills over historical data. Sessions are discovered under
+a root directory or listed in a manifest file, mapped across a pool of
+worker processes, and sessions whose output is already up to date are
+skipped.
+
+Example:
+    >>> from pathlib import Path
+    >>> summary = map_sessions(find_sessions(Path("data")), workers=8)
+    >>> print(summary.model_dump_json(indent=2))
+"""
+
+import concurrent.futures
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Literal, Optional
+
+import pydantic
+
+from aind_physiology_fip import profiling
+from aind_physiology_fip.utils import atomic_write_path
+
+from ._acquisition import ProtoAcquisitionMapper
+
+logger = logging.getLogger(__name__)
+
+# According to @dbirman, the name of this file MUST match the extractor, so we hardcode it here.
+ACQUISITION_FILENAME = "fip.json"
+
+# Files of an epoch that the mapped acquisition is derived from
+_EPOCH_INPUTS = [
+    "camera_green_iso_metadata.csv",
+    "camera_red_metadata.csv",
+    "Logs/session_input.json",
+    "Logs/rig_input.json",
+]
+
+
+class SessionMappingResult(pydantic.BaseModel):
+    """
+    Outcome of mapping a single session directory.
+
+    Attributes:
+        session (str): Path to the session directory.
+        status (Literal["mapped", "skipped", "failed"]): Whether the
+            session was mapped, skipped because its output was up to date,
+            or failed.
+        error (Optional[str]): Error message if the session failed.
+        duration_s (float): Wall time spent on the session, in seconds.
+    """
+
+    session: str
+    status: Literal["mapped", "skipped", "failed"]
+    error: Optional[str] = None
+    duration_s: float
+
+
+class BatchMappingSummary(pydantic.BaseModel):
+    """
+    Machine-readable summary of a batch mapping run.
+
+    Attributes:
+        started_at (pydantic.AwareDatetime): Time at which the run started.
+        duration_s (float): Wall time of the whole run, in seconds.
+        mapped (int): Number of sessions that were mapped.
+        skipped (int): Number of sessions that were already up to date.
+        failed (int): Number of sessions that failed.
+        sessions (list[SessionMappingResult]): Result of each session, in
+            the order the sessions were given.
+    """
+
+    started_at: pydantic.AwareDatetime
+    duration_s: float
+    mapped: int
+    skipped: int
+    failed: int
+    sessions: list[SessionMappingResult]
+
+
+def write_acquisition(data_path: os.PathLike) -> Path:
+    """
+    Map a session directory and write its acquisition metadata file.
+
+    The file is written to a temporary path first and then renamed, so an
+    interrupted run never leaves a partial file behind.
+
+    Args:
+        data_path (os.PathLike): Path to the session data directory.
+
+    Returns:
+        Path: Path to the written acquisition metadata file.
+    """
+    with profiling.span(str(data_path), "session"):
+        acquisition_mapped = ProtoAcquisitionMapper(data_path).map()
+        output = Path(data_path) / ACQUISITION_FILENAME
+        with profiling.span(output.name, "write_asset", path=str(output)):
+            with atomic_write_path(output) as tmp_output, open(tmp_output, "w", encoding="utf-8") as f:
+                f.write(acquisition_mapped.model_dump_json(indent=2))
+    return output
+
+
+def find_sessions(root: os.PathLike) -> list[Path]:
+    """
+    Find every session directory under a root directory.
+
+    A session directory is any directory with a 'fib' subdirectory
+    containing at least one 'fip_*' epoch. The root itself is included if
+    it is a session directory.
+
+    Args:
+        root (os.PathLike): Root directory to search.
+
+    Returns:
+        list[Path]: Sorted list of session directories.
+    """
+    return sorted({fib.parent for fib in Path(root).rglob("fib") if fib.is_dir() and any(fib.glob("fip_*"))})
+
+
+def read_manifest(manifest: os.PathLike) -> list[Path]:
+    """
+    Read a list of session directories from a manifest file.
+
+    The manifest lists one session directory per line. Blank lines and
+    lines starting with '#' are ignored, and relative paths are resolved
+    against the directory of the manifest.
+
+    Args:
+        manifest (os.PathLike): Path to the manifest file.
+
+    Returns:
+        list[Path]: Session directories, in manifest order.
+    """
+    manifest = Path(manifest)
+    sessions = []
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            sessions.append(manifest.parent / line)
+    return sessions
+
+
+def is_up_to_date(data_path: os.PathLike) -> bool:
+    """
+    Check whether the acquisition metadata file of a session is up to date.
+
+    The file is up to date if it exists and is newer than every input file
+    of every epoch. A session without a 'fib' directory is never up to
+    date, so mapping it records the error. Changes to the mapper itself are
+    not detected, so use `force` after upgrading the package.
+
+    Args:
+        data_path (os.PathLike): Path to the session data directory.
+
+    Returns:
+        bool: True if the session does not need to be mapped again.
+    """
+    output = Path(data_path) / ACQUISITION_FILENAME
+    if not output.exists():
+        return False
+    mapped_at = output.stat().st_mtime_ns
+    # Adding or removing an epoch changes the modification time of its parent directory
+    fib = Path(data_path) / "fib"
+    if not fib.is_dir() or fib.stat().st_mtime_ns > mapped_at:
+        return False
+    for epoch in fib.glob("fip_*"):
+        if epoch.stat().st_mtime_ns > mapped_at:
+            return False
+        for name in _EPOCH_INPUTS:
+            path = epoch / name
+            if path.exists() and path.stat().st_mtime_ns > mapped_at:
+                return False
+    return True
+
+
+def _map_session(data_path: Path, force: bool) -> SessionMappingResult:
+    """Maps a single session, capturing any error. Entry point for worker processes."""
+    start = time.perf_counter()
+    try:
+        if not force and is_up_to_date(data_path):
+            status = "skipped"
+        else:
+            write_acquisition(data_path)
+            status = "mapped"
+        error = None
+    except Exception as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    return SessionMappingResult(
+        session=str(data_path), status=status, error=error, duration_s=time.perf_counter() - start
+    )
+
+
+def map_sessions(sessions: list[Path], *, workers: int = 1, force: bool = False) -> BatchMappingSummary:
+    """
+    Map many session directories across a pool of worker processes.
+
+    A failure in one session does not stop the others; it is recorded in
+    the summary instead.
+
+    Args:
+        sessions (list[Path]): Session directories to map.
+        workers (int): Number of worker processes. Sessions are mapped in
+            this process if 1.
+        force (bool): Map sessions even if their output is up to date.
+
+    Returns:
+        BatchMappingSummary: Summary of the run, with per-session results
+            in the same order as `sessions`.
+    """
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    if workers <= 1:
+        results = []
+        for session in sessions:
+            results.append(_map_session(session, force))
+            _log_result(results[-1], len(results), len(sessions))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                profiling.submit(executor, _map_session, session, force): i for i, session in enumerate(sessions)
+            }
+            by_index: dict[int, SessionMappingResult] = {}
+            for future in concurrent.futures.as_completed(futures):
+                by_index[futures[future]] = future.result()
+                _log_result(by_index[futures[future]], len(by_index), len(sessions))
+        results = [by_index[i] for i in range(len(sessions))]
+    return BatchMappingSummary(
+        started_at=started_at,
+        duration_s=time.perf_counter() - start,
+        mapped=sum(result.status == "mapped" for result in results),
+        skipped=sum(result.status == "skipped" for result in results),
+        failed=sum(result.status == "failed" for result in results),
+        sessions=results,
+    )
+
+
+def _log_result(result: SessionMappingResult, done: int, total: int) -> None:
+    if result.status == "failed":
+        logger.error("[%d/%d] Failed to map %s: %s", done, total, result.session, result.error)
+    else:
+        logger.info(
+            "[%d/%d] %s %s (%.2f s)", done, total, result.status.capitalize(), result.session, result.duration_s
+        )
@@ -0,0 +1,258 @@
+import dataclasses
+import functools
+import json
+import logging
+import os
+import re
+import typing as t
+from pathlib import Path
+
+import contraqctor.contract as contract
+import numpy as np
+import pandas as pd
+
+from aind_physiology_fip import __semver__
+from aind_physiology_fip.data_timing import AlignDirection, align_times
+from aind_physiology_fip.utils import atomic_write_path, import_pyarrow
+
+logger = logging.getLogger(__name__)
+
+BaselineMethod = t.Literal["isosbestic", "rolling"]
+
+# Red has no isosbestic control, so its baseline is always a rolling window
+_CHANNEL_BASELINE: t.Dict[str, BaselineMethod] = {"green": "isosbestic", "red": "rolling"}
+
+_FIBER_COLUMN = re.compile(r"Fiber_\d+")
+
+DFF_METADATA_KEY = b"aind_physiology_fip.dff"
+
+# dF/F files are Arrow IPC files, which pyarrow and pandas also read as feather v2
+DFF_SUFFIX = ".arrow"
+
+
+def fiber_columns(table: pd.DataFrame) -> t.List[str]:
+    """`Fiber_N` columns of a channel table, in file order."""
+    return [col for col in table.columns if _FIBER_COLUMN.fullmatch(str(col))]
+
+
+def background_subtracted(table: pd.DataFrame, fibers: t.Sequence[str]) -> np.ndarray:
+    """Fiber columns minus the `Background` column, as a (n_samples, n_fibers) float array."""
+    return table[list(fibers)].to_numpy(dtype=np.float64) - table["Background"].to_numpy(dtype=np.float64)[:, None]
+
+
+@dataclasses.dataclass(frozen=True)
+class IsosbesticFit:
+    """Per-fiber least-squares fit of a signal against its isosbestic control.
+
+    Holds the sufficient statistics (count, means, centered second moments) of every fiber, so fits
+    of chunks, epochs or sessions are combined with `merge` (Chan's parallel update) instead of
+    requiring all samples at once. Samples where either value is missing are ignored.
+    """
+
+    n: np.ndarray
+    mean_iso: np.ndarray
+    mean_signal: np.ndarray
+    m2_iso: np.ndarray
+    c_iso_signal: np.ndarray
+
+    @classmethod
+    def from_values(cls, iso: np.ndarray, signal: np.ndarray) -> "IsosbesticFit":
+        """Fits a block of (n_samples, n_fibers) isosbestic and signal values."""
+        valid = np.isfinite(iso) & np.isfinite(signal)
+        n = valid.sum(axis=0)
+        safe_n = np.maximum(n, 1)
+        iso = np.where(valid, iso, 0.0)
+        signal = np.where(valid, signal, 0.0)
+        mean_iso = iso.sum(axis=0) / safe_n
+        mean_signal = signal.sum(axis=0) / safe_n
+        d_iso = np.where(valid, iso - mean_iso, 0.0)
+        d_signal = np.where(valid, signal - mean_signal, 0.0)
+        return cls(
+            n=n,
+            mean_iso=mean_iso,
+            mean_signal=mean_signal,
+            m2_iso=(d_iso**2).sum(axis=0),
+            c_iso_signal=(d_iso * d_signal).sum(axis=0),
+        )
+
+    def merge(self, other: "IsosbesticFit") -> "IsosbesticFit":
+        n = self.n + other.n
+        safe_n = np.maximum(n, 1)
+        d_iso = other.mean_iso - self.mean_iso
+        d_signal = other.mean_signal - self.mean_signal
+        weight = self.n * other.n / safe_n
+        return IsosbesticFit(
+            n=n,
+            mean_iso=self.mean_iso + d_iso * other.n / safe_n,
+            mean_signal=self.mean_signal + d_signal * other.n / safe_n,
+            m2_iso=self.m2_iso + other.m2_iso + d_iso**2 * weight,
+            c_iso_signal=self.c_iso_signal + other.c_iso_signal + d_iso * d_signal * weight,
+        )
+
+    @property
+    def slope(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.m2_iso > 0, self.c_iso_signal / self.m2_iso, np.nan)
+
+    @property
+    def intercept(self) -> np.ndarray:
+        return self.mean_signal - self.slope * self.mean_iso
+
+    def predict(self, iso: np.ndarray) -> np.ndarray:
+        """Signal expected from the isosbestic values alone."""
+        return iso * self.slope + self.intercept
+
+
+def _rolling_baseline(times: np.ndarray, signal: np.ndarray, window_s: float) -> np.ndarray:
+    period = np.nanmedian(np.diff(times)) if len(times) > 1 else 0.0
+    window = max(1, int(round(window_s / period))) if period > 0 else 1
+    # pandas reduces every column in one vectorized pass and skips missing samples
+    return pd.DataFrame(signal).rolling(window, center=True, min_periods=1).mean().to_numpy()
+
+
+@dataclasses.dataclass
+class DffStage:
+    """Background subtraction, isosbestic correction and dF/F for every fiber of a channel at once.
+
+    dF/F is computed as `(F - F0) / F0`, where `F` is the background-subtracted signal and `F0` is
+    either the signal predicted by a per-fiber linear fit against the background-subtracted
+    isosbestic channel ("isosbestic"), or a centered rolling mean of `F` over `baseline_window_s`
+    ("rolling"). Isosbestic samples are paired with signal samples by `ReferenceTime`.
+
+    The channel tables are held in memory as a whole: the fit and the rolling baseline need every
+    sample, so only the dF/F output is computed and written block by block.
+
+    Args:
+        baseline: How `F0` is estimated.
+        baseline_window_s: Width of the rolling baseline window.
+        chunk_size: Number of samples fitted and written per block.
+        tolerance_s: Largest time difference between paired signal and isosbestic samples.
+            Defaults to half the signal sample period.
+        direction: How isosbestic samples are paired with signal samples. See `align_times`.
+    """
+
+    baseline: BaselineMethod = "isosbestic"
+    baseline_window_s: float = 60.0
+    chunk_size: int = 65536
+    tolerance_s: t.Optional[float] = None
+    direction: AlignDirection = "nearest"
+
+    def blocks(
+        self, signal: pd.DataFrame, isosbestic: t.Optional[pd.DataFrame] = None
+    ) -> t.Tuple[t.List[str], t.Optional[IsosbesticFit], t.Iterator[t.Tuple[np.ndarray, np.ndarray]]]:
+        """Runs the stage on a channel table.
+
+        Returns:
+            The fiber columns, the isosbestic fit (None for a rolling baseline) and an iterator of
+            `(reference_times, dff)` blocks of at most `chunk_size` samples.
+        """
+        fibers = fiber_columns(signal)
+        times = signal.index.to_numpy(dtype=np.float64)
+        values = background_subtracted(signal, fibers)
+        fit = None
+        if self.baseline == "isosbestic":
+            if isosbestic is None:
+                raise ValueError("An isosbestic channel is required for an isosbestic baseline.")
+            missing = set(fibers) - set(isosbestic.columns)
+            if missing:
+                raise ValueError(f"Isosbestic channel is missing fibers {sorted(missing)}.")
+            alignment = align_times(
+                {"signal": times, "isosbestic": isosbestic.index.to_numpy(dtype=np.float64)},
+                tolerance_s=self.tolerance_s,
+                direction=self.direction,
+            )
+            iso = alignment.take("isosbestic", background_subtracted(isosbestic, fibers))
+            fit = functools.reduce(
+                IsosbesticFit.merge,
+                (
+                    IsosbesticFit.from_values(iso[lo : lo + self.chunk_size], values[lo : lo + self.chunk_size])
+                    for lo in range(0, max(len(times), 1), self.chunk_size)
+                ),
+            )
+            rolling = None
+        else:
+            iso = None
+            rolling = _rolling_baseline(times, values, self.baseline_window_s)
+
+        def _iter() -> t.Iterator[t.Tuple[np.ndarray, np.ndarray]]:
+            for lo in range(0, len(times), self.chunk_size):
+                hi = lo + self.chunk_size
+                f0 = fit.predict(iso[lo:hi]) if fit is not None else rolling[lo:hi]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    yield times[lo:hi], (values[lo:hi] - f0) / f0
+
+        return fibers, fit, _iter()
+
+    def run(self, signal: pd.DataFrame, isosbestic: t.Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """dF/F of every fiber, indexed by `ReferenceTime`."""
+        fibers, _, blocks = self.blocks(signal, isosbestic)
+        blocks = list(blocks)
+        return pd.DataFrame(
+            np.concatenate([dff for _, dff in blocks]) if blocks else np.empty((0, len(fibers))),
+            index=pd.Index(np.concatenate([times for times, _ in blocks]) if blocks else [], name="ReferenceTime"),
+            columns=fibers,
+        )
+
+    def write(self, signal: pd.DataFrame, isosbestic: t.Optional[pd.DataFrame], path: os.PathLike) -> Path:
+        """Streams dF/F to a columnar (Arrow IPC / feather v2) file, one record batch per block.
+
+        The fit and stage parameters are stored as json in the schema metadata.
+        """
+        pa = import_pyarrow("Writing dF/F")
+        fibers, fit, blocks = self.blocks(signal, isosbestic)
+        provenance = {
+            "version": __semver__,
+            "baseline": self.baseline,
+            "baseline_window_s": self.baseline_window_s if self.baseline == "rolling" else None,
+            "fit": None
+            if fit is None
+            else {
+                fiber: {"slope": float(fit.slope[j]), "intercept": float(fit.intercept[j]), "n": int(fit.n[j])}
+                for j, fiber in enumerate(fibers)
+            },
+        }
+        schema = pa.schema(
+            [("ReferenceTime", pa.float64()), *[(fiber, pa.float64()) for fiber in fibers]],
+            metadata={DFF_METADATA_KEY: json.dumps(provenance).encode()},
+        )
+        path = Path(path)
+        with (
+            atomic_write_path(path) as tmp_path,
+            pa.OSFile(str(tmp_path), "wb") as sink,
+            pa.ipc.new_file(sink, schema) as writer,
+        ):
+            for times, dff in blocks:
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays([pa.array(times), *[pa.array(col) for col in dff.T]], schema=schema)
+                )
+        return path
+
+
+def dff_path(output_path: os.PathLike, channel: str) -> Path:
+    """Path of the dF/F file of a color channel under an output directory."""
+    return Path(output_path) / f"{channel}_dff{DFF_SUFFIX}"
+
+
+def process_channel(
+    fip_dataset: contract.Dataset,
+    channel: t.Literal["green", "red"],
+    output_path: os.PathLike,
+    *,
+    baseline: t.Optional[BaselineMethod] = None,
+    **kwargs: t.Any,
+) -> Path:
+    """Writes the dF/F of a color channel of a dataset to `<output_path>/<channel>_dff.arrow`.
+
+    The channel, and the iso channel for an isosbestic baseline, are fully loaded from the dataset.
+
+    Args:
+        fip_dataset: Dataset created by `aind_physiology_fip.data_contract.dataset`.
+        channel: Color channel to process. Green is corrected against iso by default.
+        output_path: Directory where the file is written.
+        baseline: Overrides the baseline method of the channel.
+        **kwargs: Passed to `DffStage`.
+    """
+    stage = DffStage(baseline=baseline or _CHANNEL_BASELINE[channel], **kwargs)
+    signal = t.cast(pd.DataFrame, fip_dataset[channel].data)
+    isosbestic = t.cast(pd.DataFrame, fip_dataset["iso"].data) if stage.baseline == "isosbestic" else None
+    return stage.write(signal, isosbestic, dff_path(output_path, channel))
@@ -1,3 +1,6 @@
+import concurrent.futures
+import dataclasses
+import logging
 import re
 import secrets
 import typing as t
@@ -5,22 +8,93 @@ from pathlib import Path
 
 import contraqctor.contract as contract
 import contraqctor.qc
-import cv2
 import matplotlib
 import matplotlib.figure
-import matplotlib.pyplot as plt
 import numpy as np
-import pydantic
-import pydantic_settings
+import pandas as pd
+from contraqctor._typing import ErrorOnLoad
 from contraqctor.qc import ContextExportableObj, Runner, Suite
 from contraqctor.qc.contract import ContractTestSuite
 from contraqctor.qc.csv import CsvTestSuite
-
-from aind_physiology_fip import __semver__
-from aind_physiology_fip.data_contract import FipRawFrame, RoiSettings, dataset
-from aind_physiology_fip.data_qc_helpers import plot_sensor_floor
+from contraqctor.qc.reporters import ConsoleReporter
+
+from aind_physiology_fip import profiling
+from aind_physiology_fip.data_contract import CachedCsv, FipRawFrame, RoiSettings, StreamCache, dataset
+from aind_physiology_fip.data_integration import ChannelName, RoiPixelIndex, get_channel_rois, sample_roi_statistics
+from aind_physiology_fip.data_integrity import check_frame_stats, load_frame_index
+from aind_physiology_fip.data_qc_cache import QcResultCache
+from aind_physiology_fip.data_qc_helpers import (
+    PlotSpec,
+    RoiSelectionPlotSpec,
+    RoiTemporalPlotSpec,
+    SensorFloorPlotSpec,
+    SensorFloorSummary,
+    save_plot,
+)
+from aind_physiology_fip.data_timing import FrameTimingReport, analyze_frame_timing
 from aind_physiology_fip.rig import Circle
 
+logger = logging.getLogger(__name__)
+
+# Largest number of rows of a table kept in a result context
+_MAX_CONTEXT_ROWS = 10
+
+
+def _require_columns(stream: contract.csv.Csv, columns: t.Optional[t.Iterable[str]]) -> None:
+    """Declares the columns a suite reads from a csv stream, so that only those are parsed."""
+    if isinstance(stream, CachedCsv):
+        stream.require_columns(columns)
+
+
+class _CsvTestSuite(CsvTestSuite):
+    """Csv suite that only parses the index of its stream.
+
+    Emptiness is checked on the number of rows, and missing headers on the header row of the file,
+    so the suite never requires columns that no other suite reads.
+    """
+
+    def __init__(self, data_stream: contract.csv.Csv) -> None:
+        super().__init__(data_stream)
+        _require_columns(data_stream, [])
+
+    @property
+    def name(self) -> str:
+        return CsvTestSuite.__name__
+
+    @property
+    def description(self) -> t.Optional[str]:
+        return CsvTestSuite.__doc__
+
+    def _header(self) -> t.List[str]:
+        params = self.data_stream.reader_params
+        header = pd.read_csv(params.path, delimiter=params.delimiter, nrows=0).columns
+        return [column for column in header if column != params.index]
+
+    def test_is_not_empty(self):
+        """
+        Check if the DataFrame is not empty.
+        """
+        if len(self.data_stream.data) == 0:
+            return self.fail_test(None, "Data stream is empty")
+        return self.pass_test(None, "Data stream is not empty")
+
+    def test_infer_missing_headers(self):
+        """
+        Infer if the DataFrame was loaded from a CSV without headers.
+        """
+        if not self.data_stream.reader_params.strict_header:
+            return self.skip_test("CSV was loaded with strict_header=False")
+
+        header = self._header()
+        if len(self.data_stream.data) == 0 or len(header) == 0:
+            return self.fail_test(None, "Data stream is empty or has no columns")
+
+        # Check if column names are default integer indexes (0, 1, 2...)
+        if all(isinstance(col, int) or (isinstance(col, str) and col.isdigit()) for col in header):
+            return self.fail_test(None, "Data stream has non-integer column names")
+
+        return self.pass_test(None, "DataFramed was likely loaded from a CSV with headers")
+
 
 class FipChannelMetadataTestSuite(Suite):
     """Tests if each color channel's metadata is valid"""
@@ -36,6 +110,7 @@ class FipChannelMetadataTestSuite(Suite):
         expected_fps: t.Optional[float] = None,
     ) -> None:
         self.channel_data = channel_data
+        _require_columns(channel_data, self._expected_columns - {"ReferenceTime"})
         self.frame_stride = frame_stride
         self.clock_jitter_s = clock_jitter_s
         self.expected_fps = expected_fps
@@ -44,26 +119,37 @@ class FipChannelMetadataTestSuite(Suite):
         """
         Check if there are dropped frames in the metadata DataFrame.
         """
-        metadata = (self.channel_data.data[list(self._expected_columns - {"ReferenceTime"})]).copy()
-        metadata.loc[:, "ReferenceTime"] = metadata.index.values
-        diff_metadata = metadata.diff()
-
-        # Convert CameraFrameTime to seconds
-        diff_metadata["CameraFrameTime"] = diff_metadata["CameraFrameTime"] * 1e-9
-
-        if not all(diff_metadata["CameraFrameNumber"].dropna() == self.frame_stride):
+        data = self.channel_data.data
+        report = analyze_frame_timing(
+            data["CameraFrameNumber"].to_numpy(),
+            data["CameraFrameTime"].to_numpy(),
+            data.index.to_numpy(),
+            frame_stride=self.frame_stride,
+            clock_jitter_s=self.clock_jitter_s,
+        )
+        # The context is printed and cached, so it only holds the first rows; the full report is an asset
+        context: t.Dict[str, t.Any] = {
+            "metrics": report.metrics(),
+            "gaps": report.gaps[:_MAX_CONTEXT_ROWS].copy(),
+            "jitter_violations": report.jitter_violations[:_MAX_CONTEXT_ROWS].copy(),
+        }
+        if len(report.gaps) > _MAX_CONTEXT_ROWS or len(report.jitter_violations) > _MAX_CONTEXT_ROWS:
+            context.update(ContextExportableObj.as_context(report))
+
+        if len(report.gaps) > 0:
             return self.fail_test(
                 None,
-                f"Detected {sum((diff_metadata['CameraFrameNumber'].dropna() - self.frame_stride) > 0)} dropped frames metadata.",
+                f"Detected {len(report.gaps)} gaps in the frame counter ({report.dropped_frames} dropped frames) in metadata.",
+                context=context,
             )
 
-        inter_clock_diff = diff_metadata["CameraFrameTime"] - diff_metadata["ReferenceTime"]
-        if not all(inter_clock_diff.dropna() < self.clock_jitter_s):
+        if len(report.jitter_violations) > 0:
             return self.fail_test(
                 None,
                 f"Detected a difference between CameraFrameTime and ReferenceTime greater than the expected threshold: {self.clock_jitter_s} s.",
+                context=context,
             )
-        return self.pass_test(None, "No dropped frames detected in metadata.")
+        return self.pass_test(None, "No dropped frames detected in metadata.", context=context)
 
     def test_match_expected_fps(self):
         """
@@ -93,16 +179,28 @@ class FipChannelSignalTestSuite(Suite):
         cmos_floor_limit: int = 265,
     ) -> None:
         self.channel_name = channel_name or color_channel.name
-        self.background_ch = color_channel.data["Background"]
-        self.data = color_channel.data
+        self.color_channel = color_channel
+        _require_columns(color_channel, None)
         self.sudden_change_limit = sudden_change_limit
         self.cmos_floor_limit = cmos_floor_limit
 
+    @property
+    def data(self) -> pd.DataFrame:
+        return self.color_channel.data
+
+    @property
+    def background_ch(self) -> pd.Series:
+        return self.data["Background"]
+
     def test_sensor_floor(self):
         """
         Check if the sensor floor value is within the acceptable range."""
-        fig, sensor_floor = plot_sensor_floor(self.background_ch, self.channel_name)
-        fig = ContextExportableObj.as_context(fig)
+        summary = SensorFloorSummary.from_values(self.background_ch)
+        sensor_floor = summary.mean
+        # The summary counts stay out of the context, which is printed and cached; the plot spec only
+        # holds a histogram regrouped into at most 100 bins
+        fig = ContextExportableObj.as_context(SensorFloorPlotSpec.from_summary(summary, self.channel_name))
+        fig["metrics"] = summary.metrics()
 
         if sensor_floor > self.cmos_floor_limit:
             return self.fail_test(
@@ -150,6 +248,8 @@ class FipAcquisitionTestSuite(Suite):
         self.green_ch = t.cast(contract.csv.Csv, dataset["green"])
         self.iso_ch = t.cast(contract.csv.Csv, dataset["iso"])
         self.red_ch = t.cast(contract.csv.Csv, dataset["red"])
+        for channel in (self.green_ch, self.iso_ch, self.red_ch):
+            _require_columns(channel, [])
 
         self.minimum_recording_duration_s = minimum_recording_duration_s
 
@@ -193,13 +293,18 @@ class FipRawImageTestSuite(Suite):
         regions: t.List[Circle],
         *,
         cv_threshold: float = 0.05,
+        sample_period_s: t.Optional[float] = None,
+        max_bleaching: t.Optional[float] = None,
     ) -> None:
         self.raw_data = binary_raw_data
         self.color_name = f"{color_channel.name}"
         self.regions = regions
         self.background_region = background_region
         self.color_channel = color_channel
+        _require_columns(color_channel, [])
         self.cv_threshold = cv_threshold
+        self.sample_period_s = sample_period_s
+        self.max_bleaching = max_bleaching
 
     def test_frame_count(self):
         frame_count = self.raw_data.data.number_of_frames
@@ -214,64 +319,61 @@ class FipRawImageTestSuite(Suite):
                 f"Frame count matches: {frame_count} frames in raw data and color channel.",
             )
 
-    @staticmethod
-    def _get_pixels_in_circle(array: np.ndarray, circle: Circle) -> t.Tuple[np.ndarray, np.ndarray]:
-        h, w = array.shape[:2]
-        y, x = np.ogrid[:h, :w]
-        mask = (x - circle.center.x) ** 2 + (y - circle.center.y) ** 2 <= circle.radius**2
-        pixels_inside = array[mask]
-        return pixels_inside, mask
-
-    @staticmethod
-    def _render_roi(
-        image: np.ndarray, circle: Circle, text: str, color: t.Tuple[int, int, int] = (255, 0, 0), thickness: int = 1
-    ) -> np.ndarray:
-        """Render a circle on the image."""
-        image = cv2.circle(image, (int(circle.center.x), int(circle.center.y)), int(circle.radius), color, thickness)
-        image = cv2.putText(
-            image,
-            text,
-            (int(circle.center.x + circle.radius), int(circle.center.y + circle.radius)),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (255, 255, 255),
-            2,
-        )
-        return image
+    def test_frame_integrity(self):
+        """Checks that the raw data holds whole frames and, if it was indexed, spot-checks it against its index.
+
+        Block checksums are only verified by `fip frame-index --verify`, which reads the whole file.
+        """
+        reader = self.raw_data.data
+        file_size = reader.size_bytes
+        trailing_bytes = file_size % reader.frame_size_bytes
+        if trailing_bytes:
+            return self.fail_test(
+                False, f"Raw data ends with an incomplete frame of {trailing_bytes} of {reader.frame_size_bytes} bytes."
+            )
+        index = load_frame_index(reader.params.path)
+        if index is None:
+            return self.skip_test("Raw data has whole frames but no frame index, skipping index checks.")
+        if not index.is_compatible(reader):
+            return self.fail_test(False, "Frame index was built for a different frame size or type.")
+        if index.file_size != file_size:
+            return self.fail_test(
+                False,
+                f"Raw data has {reader.number_of_frames} frames, but {index.n_frames} frames were indexed.",
+            )
+        sample = np.unique(np.linspace(0, index.n_frames - 1, min(index.n_frames, 64)).astype(np.int64))
+        mismatched = check_frame_stats(index, sample, reader.read_frames(sample))
+        if len(mismatched) > 0:
+            return self.fail_test(
+                False,
+                f"{len(mismatched)} of {len(sample)} sampled frames do not match the frame index.",
+                context={"frames": mismatched.tolist(), "blocks": np.unique(index.block_of_frame(mismatched)).tolist()},
+            )
+        return self.pass_test(True, f"{len(sample)} sampled frames match the frame index.")
 
     def test_roi_selection(self):
         mid_frame = self.raw_data.data.number_of_frames // 2
         reference_image = self.raw_data.data.get_frames([mid_frame])[0]
 
-        render_image = reference_image.copy()
-
-        # Normalize to maximum intensity
-        if render_image.max() > 0:
-            render_image = (render_image / render_image.max() * 255).astype(np.uint8)
-        else:
-            render_image = render_image.astype(np.uint8)
-        render_image = cv2.cvtColor(render_image, cv2.COLOR_GRAY2RGB)
-
         metrics = {}
+        index = RoiPixelIndex.from_circles([self.background_region, *self.regions], reference_image.shape)
         # Background pixels
-        pixels_inside, _ = self._get_pixels_in_circle(reference_image, self.background_region)
+        pixels_inside = index.pixels(reference_image, 0)
         cv = np.std(pixels_inside) / np.mean(pixels_inside)
         metrics["background_cv"] = cv
-        render_image = self._render_roi(render_image, self.background_region, "B")
 
         for i, r in enumerate(self.regions):
-            pixels_inside, _ = self._get_pixels_in_circle(reference_image, r)
+            pixels_inside = index.pixels(reference_image, i + 1)
             cv = np.std(pixels_inside) / np.mean(pixels_inside)
-            render_image = self._render_roi(render_image, r, f"{i}")
-
             metrics[f"roi_{i}_cv"] = cv
 
-        fig, ax = plt.subplots(figsize=(10, 10))
-        ax.imshow(render_image)
-        ax.set_title(f"ROI Selection for {self.color_name} Channel")
-        ax.axis("off")
-
-        context: t.Dict[str, t.Any] = ContextExportableObj.as_context(fig)
+        spec = RoiSelectionPlotSpec(
+            color_name=self.color_name,
+            reference_image=np.array(reference_image),
+            background_region=self.background_region,
+            regions=list(self.regions),
+        )
+        context: t.Dict[str, t.Any] = ContextExportableObj.as_context(spec)
         context["metrics"] = metrics
 
         if any(cv > self.cv_threshold for cv in metrics.values()):
@@ -287,74 +389,418 @@ class FipRawImageTestSuite(Suite):
                 context=context,
             )
 
+    def _sample_frames(self) -> t.Tuple[np.ndarray, np.ndarray]:
+        """Indices and reference times of one frame every `sample_period_s` seconds."""
+        times = self.color_channel.data.index.values[: self.raw_data.data.number_of_frames].astype(float)
+        if len(times) == 0:
+            return np.empty(0, dtype=np.int64), times
+        targets = np.arange(times[0], times[-1] + self.sample_period_s, self.sample_period_s)
+        indices = np.unique(np.minimum(np.searchsorted(times, targets), len(times) - 1))
+        return indices, times[indices]
+
+    def test_roi_temporal_stability(self):
+        """Checks the ROIs over frames sampled across the session.
+
+        The spatial coefficient of variation and mean intensity of every ROI are measured on one frame
+        every `sample_period_s` seconds. Drift is the slope of a linear fit of the mean intensity,
+        relative to its average, per hour. Bleaching is the relative loss of intensity between the
+        first and last tenth of the samples. The background is reported but not held to `cv_threshold`,
+        since it is expected to be dark and its coefficient of variation is dominated by noise.
+        """
+        if self.sample_period_s is None:
+            return self.skip_test("No sample period provided, skipping test.")
+        indices, times = self._sample_frames()
+        if len(indices) < 3:
+            return self.skip_test(f"Only {len(indices)} frames could be sampled, skipping test.")
+
+        circles = [self.background_region, *self.regions]
+        mean, std = sample_roi_statistics(self.raw_data.data, circles, indices)
+        # Pixels are non-negative, so a zero mean is a uniformly dark ROI
+        cv = np.divide(std, mean, out=np.zeros_like(std), where=mean != 0)
+        edge = max(1, len(indices) // 10)
+        slope = np.polyfit((times - times[0]) / 3600, mean, 1)[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bleaching = 1 - np.median(mean[-edge:], axis=0) / np.median(mean[:edge], axis=0)
+            drift = slope / np.mean(mean, axis=0)
+
+        labels = ["background", *[f"roi_{i}" for i in range(len(self.regions))]]
+        metrics: t.Dict[str, t.Any] = {"n_samples": len(indices)}
+        for j, label in enumerate(labels):
+            metrics[f"{label}_cv_median"] = float(np.median(cv[:, j]))
+            metrics[f"{label}_cv_max"] = float(np.max(cv[:, j]))
+            metrics[f"{label}_drift_per_hour"] = float(drift[j])
+            metrics[f"{label}_bleaching"] = float(bleaching[j])
+
+        spec = RoiTemporalPlotSpec(color_name=self.color_name, time=times - times[0], mean=mean, cv=cv, labels=labels)
+        context: t.Dict[str, t.Any] = ContextExportableObj.as_context(spec)
+        context["metrics"] = metrics
 
-def _run_tests(dataset: contract.Dataset) -> t.Dict[str | None, t.List[contraqctor.qc.Result]]:
-    runner = Runner()
+        unstable = [label for j, label in enumerate(labels) if j > 0 and np.median(cv[:, j]) > self.cv_threshold]
+        if unstable:
+            return self.fail_test(
+                False,
+                f"High median coefficient of variation over {len(indices)} sampled frames for {unstable}. (cv threshold: {self.cv_threshold})",
+                context=context,
+            )
+        bleached = []
+        if self.max_bleaching is not None:
+            bleached = [label for j, label in enumerate(labels) if j > 0 and bleaching[j] > self.max_bleaching]
+        if bleached:
+            return self.fail_test(
+                False,
+                f"Bleaching above {self.max_bleaching} detected for {bleached}.",
+                context=context,
+            )
+        return self.pass_test(
+            True,
+            f"ROIs are stable over {len(indices)} sampled frames. (cv threshold: {self.cv_threshold})",
+            context=context,
+        )
 
-    runner.add_suite(ContractTestSuite(dataset.load_all().collect_errors()), "Contract tests")
 
-    for data_stream in dataset.iter_all():
-        if isinstance(data_stream, contract.csv.Csv):
-            runner.add_suite(CsvTestSuite(data_stream), data_stream.name)
+def _run_suite(suite: Suite, group: t.Optional[str] = None) -> t.List[contraqctor.qc.Result]:
+    """Runs a single suite in its own `Runner`, timing the suite and every test when profiling."""
+    if profiling.active() is None:
+        return Runner().add_suite(suite, group).run_all().get(group, [])
+    results = []
+    with profiling.span(suite.name, "suite"):
+        for test in suite.get_tests():
+            with profiling.span(f"{suite.name}.{test.__name__}", "test"):
+                results.extend(suite.run_test(test))
+    return results
 
-    # rig = t.cast(AindPhysioFipRig, dataset["rig_input"])  # todo auto detect fps
 
-    for color, stride, roi in zip(["green", "iso", "red"], [2, 2, 1], ["green_iso", "green_iso", "red"]):
-        color_channel = t.cast(contract.csv.Csv, dataset[color])
-        runner.add_suite(
-            FipChannelMetadataTestSuite(color_channel, frame_stride=stride, expected_fps=20),
-            color_channel.name,
-        )
-        runner.add_suite(FipChannelSignalTestSuite(color_channel), color_channel.name)
-        runner.add_suite(
-            FipRawImageTestSuite(
-                t.cast(FipRawFrame, dataset[f"raw_{color}"]),
-                color_channel,
-                getattr(t.cast(RoiSettings, dataset["regions"].data), f"camera_{roi}_background"),
-                getattr(t.cast(RoiSettings, dataset["regions"].data), f"camera_{roi}_roi"),
-            ),
-            color_channel.name,
-        )
+class _SuiteScheduler:
+    """Runs independent suites concurrently on a thread pool, each one in its own `Runner`.
+
+    Tests within a suite still run in order. Results are merged with the same group and suite
+    ordering as a single `Runner`, so reporting and asset export are unaffected.
+
+    If a result cache is given, suites whose inputs and parameters are unchanged since they were
+    cached are not run; their cached results are replayed instead.
+    """
+
+    def __init__(self, jobs: int, result_cache: t.Optional[QcResultCache] = None) -> None:
+        self.jobs = jobs
+        self.result_cache = result_cache
+        self.suites: t.Dict[t.Optional[str], t.List[Suite]] = {}
+        self._cache_keys: t.Dict[int, t.Optional[str]] = {}
+        self._cached: t.Dict[int, t.List[contraqctor.qc.Result]] = {}
+
+    def add_suite(self, suite: Suite, group: t.Optional[str] = None) -> t.Self:
+        self.suites.setdefault(group, []).append(suite)
+        return self
+
+    def lookup_cached_results(self) -> bool:
+        """Computes the cache key of every suite and looks up their cached results.
+
+        Must be called before the suites' data streams are loaded, so that keys only depend on files
+        on disk. Returns True if every suite has cached results, in which case no data needs loading.
+        """
+        if self.result_cache is None:
+            return False
+        suites = [suite for suites in self.suites.values() for suite in suites]
+        self._cache_keys = dict(zip(map(id, suites), self.result_cache.keys(suites)))
+        self._cached = {}
+        for suite in suites:
+            if (cached := self.result_cache.get(self._cache_keys[id(suite)])) is not None:
+                self._cached[id(suite)] = cached
+        logger.info("Replaying cached results for %d of %d suites.", len(self._cached), len(suites))
+        return len(self._cached) == len(suites)
+
+    def _run_suite_cached(self, suite: Suite, group: t.Optional[str]) -> t.List[contraqctor.qc.Result]:
+        if (cached := self._cached.get(id(suite))) is not None:
+            return cached
+        results = _run_suite(suite, group)
+        if self.result_cache is not None and id(suite) in self._cache_keys:
+            self.result_cache.put(self._cache_keys[id(suite)], [_detach_result(r) for r in results])
+        return results
+
+    def run_all(self) -> t.Dict[t.Optional[str], t.List[contraqctor.qc.Result]]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="fip-qc") as executor:
+            futures = {
+                group: [executor.submit(self._run_suite_cached, suite, group) for suite in suites]
+                for group, suites in self.suites.items()
+            }
+            results = {
+                group: [r for future in group_futures for r in future.result()]
+                for group, group_futures in futures.items()
+            }
+        return {group: group_results for group, group_results in results.items() if group_results}
+
+
+_QcRunner = t.Union[Runner, _SuiteScheduler]
+
+
+def _make_runner(jobs: int, result_cache: t.Optional[QcResultCache] = None) -> _QcRunner:
+    # Profiled runs go through `_run_suite`, which times every suite and test
+    if jobs <= 1 and result_cache is None and profiling.active() is None:
+        return Runner()
+    return _SuiteScheduler(jobs, result_cache=result_cache)
+
+
+_CHANNEL_FRAME_STRIDE: t.Dict[ChannelName, int] = {"green": 2, "iso": 2, "red": 1}
+
+
+class _DetachedSuite(Suite):
+    """Stand-in for a suite that ran in another process.
+
+    Keeps the name and description needed for reporting without carrying the suite's data across processes.
+    """
+
+    def __init__(self, name: str, description: t.Optional[str]) -> None:
+        self._name = name
+        self._description = description
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> t.Optional[str]:
+        return self._description
+
+
+class _DatasetContractTestSuite(ContractTestSuite):
+    """Contract suite that also holds the dataset it validates.
+
+    Loading errors are only known once the dataset is loaded, so cached results are keyed by the
+    files of the dataset instead.
+    """
+
+    def __init__(self, dataset: contract.Dataset, loading_errors: t.List[ErrorOnLoad]) -> None:
+        super().__init__(loading_errors)
+        self.dataset = dataset
+
+    @property
+    def name(self) -> str:
+        return ContractTestSuite.__name__
+
+    @property
+    def description(self) -> t.Optional[str]:
+        return ContractTestSuite.__doc__
+
+
+def _detach_context(context: t.Any) -> t.Any:
+    """Replaces references to data streams in a result context, which would otherwise carry their data along."""
+    if isinstance(context, ErrorOnLoad):
+        return repr(context)
+    if isinstance(context, dict):
+        return {key: _detach_context(value) for key, value in context.items()}
+    if isinstance(context, list):
+        return [_detach_context(value) for value in context]
+    return context
+
+
+def _detach_result(result: contraqctor.qc.Result) -> contraqctor.qc.Result:
+    suite = result.suite_reference
+    detached = _DetachedSuite(result.suite_name, suite.description if suite is not None else None)
+    return dataclasses.replace(
+        result, context=_detach_context(result.context), suite_reference=detached, test_reference=None
+    )
+
+
+def _add_channel_suites(
+    runner: _QcRunner,
+    dataset: contract.Dataset,
+    color: ChannelName,
+    roi_sample_period_s: t.Optional[float] = None,
+) -> None:
+    color_channel = t.cast(contract.csv.Csv, dataset[color])
+    background, regions = get_channel_rois(t.cast(RoiSettings, dataset["regions"].data), color)
+    runner.add_suite(
+        FipChannelMetadataTestSuite(color_channel, frame_stride=_CHANNEL_FRAME_STRIDE[color], expected_fps=20),
+        color_channel.name,
+    )
+    runner.add_suite(FipChannelSignalTestSuite(color_channel), color_channel.name)
     runner.add_suite(
-        FipAcquisitionTestSuite(dataset),
-        "Dataset tests",
+        FipRawImageTestSuite(
+            t.cast(FipRawFrame, dataset[f"raw_{color}"]),
+            color_channel,
+            background,
+            regions,
+            sample_period_s=roi_sample_period_s,
+        ),
+        color_channel.name,
     )
 
-    results = runner.run_all_with_progress()
+
+def _run_channel_tests(
+    data_path: Path,
+    color: ChannelName,
+    jobs: int = 1,
+    max_cache_bytes: t.Optional[int] = None,
+    columnar_cache: bool = False,
+    result_cache: t.Optional[QcResultCache] = None,
+    roi_sample_period_s: t.Optional[float] = None,
+) -> t.Dict[str | None, t.List[contraqctor.qc.Result]]:
+    """Runs the csv and channel suites of a single color channel on its own dataset. Entry point for worker processes.
+
+    Only the streams of the channel are loaded. Loading errors are reported by the contract suite
+    of the main process, which loads every stream.
+    """
+    runner = _make_runner(jobs, result_cache)
+    _dataset = dataset(data_path, cache=StreamCache(max_cache_bytes), columnar_cache=columnar_cache)
+    color_channel = t.cast(contract.csv.Csv, _dataset[color])
+    runner.add_suite(_CsvTestSuite(color_channel), color_channel.name)
+    _add_channel_suites(runner, _dataset, color, roi_sample_period_s)
+    if not (isinstance(runner, _SuiteScheduler) and runner.lookup_cached_results()):
+        with profiling.span(f"load_{color}", "load"):
+            for stream in (color_channel, _dataset[f"raw_{color}"]):
+                stream.load()
+    return {group: [_detach_result(r) for r in results] for group, results in runner.run_all().items()}
+
+
+def _run_tests(
+    dataset: contract.Dataset,
+    *,
+    data_path: t.Optional[Path] = None,
+    channel_workers: t.Optional[int] = None,
+    jobs: int = 1,
+    max_cache_bytes: t.Optional[int] = None,
+    columnar_cache: bool = False,
+    result_cache: t.Optional[QcResultCache] = None,
+    roi_sample_period_s: t.Optional[float] = None,
+) -> t.Dict[str | None, t.List[contraqctor.qc.Result]]:
+    """Runs all QC suites on a dataset.
+
+    Suites are constructed before the dataset is loaded, so that each one can declare the csv
+    columns it reads. Every stream is then parsed once and shared by all suites.
+
+    Args:
+        dataset: Dataset to test.
+        data_path: Root of the dataset. Required when `channel_workers` is set, so that each
+            worker process can build its own dataset.
+        channel_workers: If set, the csv and per-channel suites of green, iso and red are run in a
+            process pool with this many workers, and the main process only parses the `ReferenceTime`
+            of those channels. Results are merged back in the same order as a serial run.
+        jobs: Number of suites run concurrently on a thread pool, within each process.
+        max_cache_bytes: Memory budget for the csv stream cache of each worker process.
+        columnar_cache: Whether worker processes read csv streams from their columnar sidecar caches.
+        result_cache: Optional persistent cache of suite results. Suites whose inputs and parameters
+            are unchanged are replayed from it, and the dataset is not loaded if every suite is cached.
+        roi_sample_period_s: If set, the ROI temporal stability of each channel is checked on one
+            raw frame every this many seconds. Skipped if not set, since it reads frames across the
+            whole session.
+    """
+    if channel_workers is not None and data_path is None:
+        raise ValueError("data_path is required to run channels in parallel.")
+    runner = _make_runner(jobs, result_cache)
+    channels: t.List[ChannelName] = ["green", "iso", "red"]
+
+    channel_futures: t.List[concurrent.futures.Future] = []
+    executor: t.Optional[concurrent.futures.ProcessPoolExecutor] = None
+    if channel_workers is not None:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=channel_workers)
+        channel_futures = [
+            profiling.submit(
+                executor,
+                _run_channel_tests,
+                t.cast(Path, data_path),
+                color,
+                jobs,
+                max_cache_bytes,
+                columnar_cache,
+                result_cache,
+                roi_sample_period_s,
+            )
+            for color in channels
+        ]
+
+    groups: t.List[t.Optional[str]] = ["Contract tests"]
+    try:
+        loading_errors: t.List[ErrorOnLoad] = []
+        runner.add_suite(_DatasetContractTestSuite(dataset, loading_errors), "Contract tests")
+
+        for data_stream in dataset.iter_all():
+            if isinstance(data_stream, contract.csv.Csv):
+                groups.append(data_stream.name)
+                if executor is not None and data_stream.name in channels:
+                    continue
+                runner.add_suite(_CsvTestSuite(data_stream), data_stream.name)
+
+        # rig = t.cast(AindPhysioFipRig, dataset["rig_input"])  # todo auto detect fps
+
+        if executor is None:
+            for color in channels:
+                _add_channel_suites(runner, dataset, color, roi_sample_period_s)
+        runner.add_suite(
+            FipAcquisitionTestSuite(dataset),
+            "Dataset tests",
+        )
+        groups.append("Dataset tests")
+        if not (isinstance(runner, _SuiteScheduler) and runner.lookup_cached_results()):
+            with profiling.span("load_all", "load"):
+                loading_errors.extend(dataset.load_all().collect_errors())
+
+        if isinstance(runner, Runner) and executor is None:
+            return runner.run_all_with_progress()
+
+        partial_results = [runner.run_all(), *(future.result() for future in channel_futures)]
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    results: t.Dict[str | None, t.List[contraqctor.qc.Result]] = {}
+    for group in dict.fromkeys(groups):
+        group_results = [result for partial in partial_results for result in partial.get(group, [])]
+        if group_results:
+            results[group] = group_results
+    ConsoleReporter().report_results(results)
     return results
 
 
-def _save_assets(results: t.Dict[str | None, t.List[contraqctor.qc.Result]], asset_path: t.Optional[Path]) -> None:
+def _save_assets(
+    results: t.Dict[str | None, t.List[contraqctor.qc.Result]],
+    asset_path: t.Optional[Path],
+    render_workers: int = 1,
+) -> None:
+    """Exports the figure assets of the results as png files, and frame timing reports as csv files.
+
+    Plot specs are only rendered here, with the Agg backend, and each figure is released as soon
+    as it is saved. With more than one render worker, specs are rendered in worker processes.
+    """
     if asset_path is None:
         return None
     asset_path.mkdir(parents=True, exist_ok=True)
+    specs: t.List[t.Tuple[PlotSpec, Path]] = []
     for _, group_results in results.items():
         for result in group_results:
             if isinstance(result.context, dict):
                 asset = result.context.get("asset", None)
-                if isinstance(asset, ContextExportableObj) and isinstance(asset.asset, matplotlib.figure.Figure):
-                    asset.asset.savefig(
-                        asset_path / f"{result.suite_name}_{result.test_name}_{secrets.token_hex(4)}.png"
-                    )
-
+                if not isinstance(asset, ContextExportableObj):
+                    continue
+                path = asset_path / f"{result.suite_name}_{result.test_name}_{secrets.token_hex(4)}.png"
+                if isinstance(asset.asset, PlotSpec):
+                    specs.append((asset.asset, path))
+                elif isinstance(asset.asset, FrameTimingReport):
+                    with profiling.span(type(asset.asset).__name__, "write_asset", path=str(path)):
+                        asset.asset.write_csv(path.with_suffix(""))
+                elif isinstance(asset.asset, matplotlib.figure.Figure):
+                    with profiling.span(type(asset.asset).__name__, "write_asset", path=str(path)):
+                        asset.asset.savefig(path)
+
+    if render_workers > 1 and len(specs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(render_workers, len(specs))) as executor:
+            for future in [profiling.submit(executor, save_plot, spec, path) for spec, path in specs]:
+                future.result()
+    else:
+        for spec, path in specs:
+            save_plot(spec, path)
+
+
+def __getattr__(name: str) -> t.Any:
+    # The CLI class moved to aind_physiology_fip.cli, but stays importable from here
+    if name == "DataQcCli":
+        from aind_physiology_fip.cli import DataQcCli
+
+        return DataQcCli
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-class DataQcCli(pydantic_settings.BaseSettings, cli_kebab_case=True):
-    data_path: pydantic_settings.CliPositionalArg[Path] = pydantic.Field(
-        description="Path to the session data directory."
-    )
-    asset_path: t.Optional[Path] = pydantic.Field(
-        default=Path("."),
-        description="Path to the asset root directory. If not provided, the current working directory will be used. Set None to disable saving assets.",
-    )
-    version: str = pydantic.Field(default=__semver__, description="Version of the dataset.")
 
-    def cli_cmd(self):
-        if not Path(self.data_path).exists():
-            raise FileNotFoundError(f"Dataset path {self.data_path} does not exist.")
-        _dataset = dataset(Path(self.data_path))
-        results = _run_tests(_dataset)
-        _save_assets(results, self.asset_path)
+if __name__ == "__main__":
+    from pydantic_settings import CliApp
 
+    from aind_physiology_fip.cli import DataQcCli
 
-if __name__ == "__main__":
-    cli = pydantic_settings.CliApp().run(DataQcCli)
+    cli = CliApp().run(DataQcCli)
@@ -0,0 +1,166 @@
+import dataclasses
+import enum
+import hashlib
+import json
+import logging
+import os
+import pickle
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pydantic
+from contraqctor.contract import DataStream
+from contraqctor.contract.base import DataStreamCollectionBase
+from contraqctor.qc import Result, Suite
+
+from aind_physiology_fip import __semver__
+from aind_physiology_fip.data_contract import FipRawFrame, _source_fingerprint, frame_archive_path
+from aind_physiology_fip.data_integrity import frame_index_path
+from aind_physiology_fip.utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+
+_FileFingerprints = t.Dict[str, t.Dict[str, t.Any]]
+
+
+def stream_fingerprint(
+    stream: DataStream, *, with_hash: bool = False, memo: t.Optional[_FileFingerprints] = None
+) -> t.List[t.Dict[str, t.Any]]:
+    """Fingerprints the files a data stream reads, without loading it.
+
+    Every path-valued reader parameter is fingerprinted by its path, size and modification time,
+    or, if `with_hash` is set, by its size and sha256 only, so that identical copies of a file
+    share a fingerprint. Raw frame streams are also fingerprinted by their camera metadata json and
+    their integrity index sidecar, which may not exist yet. Collections (e.g. a whole dataset) are
+    fingerprinted by all of their streams.
+
+    Args:
+        stream: Data stream or collection to fingerprint.
+        with_hash: Also hash the contents of each file.
+        memo: Optional dictionary of already computed file fingerprints, keyed by path.
+    """
+    memo = {} if memo is None else memo
+    if isinstance(stream, DataStreamCollectionBase):
+        return [
+            entry for child in stream.iter_all() for entry in stream_fingerprint(child, with_hash=with_hash, memo=memo)
+        ]
+    params = stream.reader_params
+    if not dataclasses.is_dataclass(params):
+        return []
+    values = [getattr(params, field.name) for field in dataclasses.fields(params)]
+    paths = [Path(value) for value in values if isinstance(value, os.PathLike)]
+    if isinstance(stream, FipRawFrame):
+        paths += [FipRawFrame.metadata_path(params), frame_index_path(params.path)]
+    fingerprint = []
+    for path in dict.fromkeys(str(path.resolve()) for path in paths):
+        if not Path(path).is_file() and frame_archive_path(path).is_file():
+            # Raw frame files that were replaced by their compressed archive
+            path = str(frame_archive_path(path))
+        if path not in memo:
+            memo[path] = {"exists": Path(path).is_file()}
+            if memo[path]["exists"]:
+                memo[path].update(_source_fingerprint(path, with_hash=with_hash))
+            if with_hash:
+                memo[path].pop("mtime_ns", None)
+            else:
+                memo[path]["path"] = path
+        fingerprint.append({"stream": stream.resolved_name, **memo[path]})
+    return fingerprint
+
+
+def _fingerprint_value(value: t.Any, with_hash: bool, memo: _FileFingerprints) -> t.Any:
+    """Converts a suite attribute into a json-serializable value that changes whenever the attribute does."""
+    if isinstance(value, DataStream):
+        return stream_fingerprint(value, with_hash=with_hash, memo=memo)
+    if isinstance(value, pydantic.BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, os.PathLike):
+        return str(value)
+    if isinstance(value, t.Mapping):
+        return {str(k): _fingerprint_value(v, with_hash, memo) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_fingerprint_value(v, with_hash, memo) for v in value]
+        return sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items
+    raise TypeError(f"Cannot fingerprint a value of type {type(value).__name__}.")
+
+
+def suite_key(suite: Suite, *, with_hash: bool = False, memo: t.Optional[_FileFingerprints] = None) -> t.Optional[str]:
+    """Cache key of a suite's results.
+
+    The key covers the package version, the suite class, every parameter the suite was constructed
+    with and the files of every data stream it holds. Returns None if a parameter cannot be
+    fingerprinted, in which case the suite is never cached.
+    """
+    try:
+        parameters = _fingerprint_value(vars(suite), with_hash, {} if memo is None else memo)
+    except TypeError as e:
+        logger.debug("Suite %s is not cacheable: %s", suite.name, e)
+        return None
+    payload = {
+        "version": __semver__,
+        "suite": f"{type(suite).__module__}.{type(suite).__qualname__}",
+        "parameters": parameters,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class QcResultCache:
+    """Persistent cache of QC suite results, keyed by `suite_key`.
+
+    Results are pickled into one file per suite under `root`, so a single cache directory can be
+    shared by many sessions. Only use cache directories you trust, since loading a cached result
+    unpickles it.
+
+    Args:
+        root: Directory where results are stored. Created if it does not exist.
+        validate_hash: Fingerprint input files by their contents instead of their path and
+            modification time. Slower, but results are reused across copies of the same data.
+    """
+
+    def __init__(self, root: os.PathLike, *, validate_hash: bool = False) -> None:
+        self.root = Path(root)
+        self.validate_hash = validate_hash
+
+    def keys(self, suites: t.Iterable[Suite]) -> t.List[t.Optional[str]]:
+        """Cache keys of several suites. Files shared by the suites are only fingerprinted once."""
+        memo: _FileFingerprints = {}
+        return [suite_key(suite, with_hash=self.validate_hash, memo=memo) for suite in suites]
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.pkl"
+
+    def get(self, key: t.Optional[str]) -> t.Optional[t.List[Result]]:
+        """Cached results for a key, or None on a miss."""
+        if key is None or not (path := self._path(key)).exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning("Ignoring unreadable cached result %s: %s", path, e)
+            return None
+
+    def put(self, key: t.Optional[str], results: t.List[Result]) -> None:
+        """Stores the results of a suite. Results that cannot be pickled are not cached."""
+        if key is None:
+            return
+        try:
+            payload = pickle.dumps(results)
+        except Exception as e:
+            logger.debug("Results for %s are not cacheable: %s", key, e)
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with atomic_write_path(path) as tmp_path:
+                tmp_path.write_bytes(payload)
+        except OSError as e:
+            logger.warning("Could not write cached result %s: %s", path, e)
@@ -1,37 +1,356 @@
+import abc
+import dataclasses
+import functools
+import os
 import typing as t
 
+import cv2
 import matplotlib
 import matplotlib.figure
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from aind_physiology_fip import profiling
+from aind_physiology_fip.rig import Circle
 
 channel_colors = {"green": "green", "iso": "purple", "red": "red"}
 
 
-def plot_sensor_floor(
-    background_ch: t.Union[pd.Series, np.ndarray], channel: str
-) -> t.Tuple[matplotlib.figure.Figure, float]:
+class PlotSpec(abc.ABC):
+    """Lightweight, picklable description of a QC figure.
+
+    Tests record a spec with the data needed to draw a figure, and the figure is only rendered
+    if the asset is exported.
     """
-    Plot histograms for sensor floor values of three channels.
+
+    @abc.abstractmethod
+    def render(self) -> matplotlib.figure.Figure:
+        """Draws the figure."""
+
+
+def save_plot(spec: PlotSpec, path: os.PathLike) -> None:
+    """Renders a plot spec with the Agg backend and saves it, releasing the figure right after."""
+    with profiling.span(type(spec).__name__, "render"):
+        fig = spec.render()
+        FigureCanvasAgg(fig)
+    try:
+        with profiling.span(type(spec).__name__, "write_asset", path=str(path)):
+            fig.savefig(path)
+    finally:
+        fig.clear()
+
+
+SENSOR_FLOOR_RANGE = (255.0, 270.0)
+SENSOR_FLOOR_BINS = 100
+# Bins of the summary counts over all data, which double in width as needed to stay within this budget
+_MAX_SUMMARY_BINS = 2**16
+
+
+def _bin_factor(first: int, last: int) -> int:
+    """Smallest power of two by which bins `first` to `last` are merged to fit in `_MAX_SUMMARY_BINS`."""
+    factor = 1
+    while last // factor - first // factor >= _MAX_SUMMARY_BINS:
+        factor *= 2
+    return factor
+
+
+@dataclasses.dataclass(frozen=True)
+class SensorFloorSummary:
+    """Mergeable summary of the background values of a channel.
+
+    Everything the sensor floor QC needs is computed in a single pass over the values: count, mean
+    and variance (merged with Chan's parallel update), extrema, fixed-bin counts over the sensor
+    floor range and fixed-width counts over all the data. Summaries of chunks or epochs are combined
+    with `merge`, and percentiles are interpolated from the counts, so they are exact to within
+    `bin_width`. Non-finite values are counted but otherwise ignored.
+
+    The counts over all the data never exceed `_MAX_SUMMARY_BINS` bins: if the values span more,
+    e.g. because of a single outlier, `bin_width` is doubled until they fit. Summaries whose bin
+    widths differ by a power of two are merged at the wider one.
     """
 
-    fig, ax = plt.subplots(2, 1, figsize=(10, 8))
+    count: int = 0
+    nan_count: int = 0
+    mean: float = float("nan")
+    m2: float = 0.0
+    minimum: float = float("inf")
+    maximum: float = float("-inf")
+    floor_counts: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(SENSOR_FLOOR_BINS, dtype=np.int64))
+    floor_edges: np.ndarray = dataclasses.field(
+        default_factory=lambda: np.linspace(*SENSOR_FLOOR_RANGE, SENSOR_FLOOR_BINS + 1)
+    )
+    counts: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    offset: int = 0
+    bin_width: float = 0.1
+
+    @classmethod
+    def from_values(
+        cls,
+        values: t.Union[pd.Series, np.ndarray],
+        *,
+        bin_width: float = 0.1,
+        floor_range: t.Tuple[float, float] = SENSOR_FLOOR_RANGE,
+        floor_bins: int = SENSOR_FLOOR_BINS,
+    ) -> "SensorFloorSummary":
+        """Summarizes a block of values.
+
+        Args:
+            values: Background values.
+            bin_width: Width of the bins counting all the data, doubled as needed to fit the values
+                in `_MAX_SUMMARY_BINS` bins. Also the resolution of `percentile`.
+            floor_range: Range of the sensor floor histogram.
+            floor_bins: Number of bins of the sensor floor histogram.
+        """
+        data = np.asarray(values, dtype=float).ravel()
+        finite = data[np.isfinite(data)]
+        floor_edges = np.linspace(*floor_range, floor_bins + 1)
+        floor_counts, _ = np.histogram(finite, bins=floor_edges)
+        if finite.size == 0:
+            return cls(
+                nan_count=data.size,
+                floor_counts=floor_counts,
+                floor_edges=floor_edges,
+                bin_width=bin_width,
+            )
+        index = np.floor(finite / bin_width).astype(np.int64)
+        factor = _bin_factor(int(index.min()), int(index.max()))
+        if factor > 1:
+            # Floor division of the fine index is exact, so merged summaries bin values the same way
+            index //= factor
+        offset = int(index.min())
+        mean = float(finite.mean())
+        return cls(
+            count=finite.size,
+            nan_count=data.size - finite.size,
+            mean=mean,
+            m2=float(np.sum((finite - mean) ** 2)),
+            minimum=float(finite.min()),
+            maximum=float(finite.max()),
+            floor_counts=floor_counts,
+            floor_edges=floor_edges,
+            counts=np.bincount(index - offset),
+            offset=offset,
+            bin_width=bin_width * factor,
+        )
+
+    @classmethod
+    def from_chunks(cls, chunks: t.Iterable[t.Union[pd.Series, np.ndarray]], **kwargs: t.Any) -> "SensorFloorSummary":
+        """Summarizes values streamed in chunks, e.g. from `pd.read_csv(..., chunksize=...)`.
+
+        Keyword arguments are passed to `from_values`.
+        """
+        empty = cls.from_values(np.empty(0), **kwargs)
+        return functools.reduce(cls.merge, (cls.from_values(chunk, **kwargs) for chunk in chunks), empty)
+
+    def merge(self, other: "SensorFloorSummary") -> "SensorFloorSummary":
+        """Combines two summaries as if their values had been summarized together."""
+        ratio = max(self.bin_width, other.bin_width) / min(self.bin_width, other.bin_width)
+        if ratio != 2 ** round(np.log2(ratio)) or not np.array_equal(self.floor_edges, other.floor_edges):
+            raise ValueError("Only summaries with the same bins, up to a power of two width, can be merged.")
+        count = self.count + other.count
+        if self.count == 0 or other.count == 0:
+            base = other if self.count == 0 else self
+            return dataclasses.replace(
+                base, nan_count=self.nan_count + other.nan_count, floor_counts=self.floor_counts + other.floor_counts
+            )
+        delta = other.mean - self.mean
+        bin_width = max(self.bin_width, other.bin_width)
+        left, right = (summary._coarsened(round(bin_width / summary.bin_width)) for summary in (self, other))
+        offset = min(left.offset, right.offset)
+        counts = np.zeros(max(left.offset + left.counts.size, right.offset + right.counts.size) - offset, np.int64)
+        for summary in (left, right):
+            counts[summary.offset - offset : summary.offset - offset + summary.counts.size] += summary.counts
+        merged = dataclasses.replace(
+            self,
+            count=count,
+            nan_count=self.nan_count + other.nan_count,
+            mean=self.mean + delta * other.count / count,
+            m2=self.m2 + other.m2 + delta**2 * self.count * other.count / count,
+            minimum=min(self.minimum, other.minimum),
+            maximum=max(self.maximum, other.maximum),
+            floor_counts=self.floor_counts + other.floor_counts,
+            counts=counts,
+            offset=offset,
+            bin_width=bin_width,
+        )
+        return merged._coarsened(_bin_factor(offset, offset + counts.size - 1))
+
+    def _coarsened(self, factor: int) -> "SensorFloorSummary":
+        """The same summary with `factor` times wider bins."""
+        if factor == 1:
+            return self
+        index = (self.offset + np.arange(self.counts.size)) // factor
+        offset = int(index[0]) if index.size > 0 else self.offset // factor
+        counts = np.zeros(int(index[-1]) - offset + 1 if index.size > 0 else 0, dtype=np.int64)
+        np.add.at(counts, index - offset, self.counts)
+        return dataclasses.replace(self, counts=counts, offset=offset, bin_width=self.bin_width * factor)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count > 0 else float("nan")
+
+    @property
+    def edges(self) -> np.ndarray:
+        """Edges of `counts`."""
+        return (self.offset + np.arange(self.counts.size + 1)) * self.bin_width
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (0-100), interpolated linearly within the bins of `counts`."""
+        if self.count == 0:
+            return float("nan")
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * self.count
+        i = min(int(np.searchsorted(cumulative, target)), self.counts.size - 1)
+        before = cumulative[i] - self.counts[i]
+        value = self.edges[i] + (target - before) / self.counts[i] * self.bin_width
+        return float(np.clip(value, self.minimum, self.maximum))
 
-    floor_mean = np.mean(background_ch).astype(float)
+    def histogram(self, bins: int = 100) -> t.Tuple[np.ndarray, np.ndarray]:
+        """Counts over all data regrouped into at most `bins` bins, and their edges."""
+        factor = max(1, -(-self.counts.size // bins))
+        counts = np.pad(self.counts, (0, -self.counts.size % factor)).reshape(-1, factor).sum(axis=1)
+        return counts, (self.offset + factor * np.arange(counts.size + 1)) * self.bin_width
 
-    def _make_hist(data, ax1, ax2, color, ch_name):
-        ax1.hist(data, bins=100, range=(255, 270), color=color, alpha=0.7)
-        ax1.set_xlim(255, 270)
-        ax1.set_title(f"{ch_name} floor average: {floor_mean:.2f}")
+    def metrics(self) -> t.Dict[str, float]:
+        """Summary statistics, for use as QC metrics."""
+        return {
+            "count": self.count,
+            "nan_count": self.nan_count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.minimum if self.count else float("nan"),
+            "max": self.maximum if self.count else float("nan"),
+            "p5": self.percentile(5),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+@dataclasses.dataclass(frozen=True)
+class SensorFloorPlotSpec(PlotSpec):
+    """Histograms of the background ROI of a channel, around the sensor floor and over all data."""
+
+    channel: str
+    floor_mean: float
+    floor_counts: np.ndarray
+    floor_edges: np.ndarray
+    counts: np.ndarray
+    edges: np.ndarray
+
+    @classmethod
+    def from_summary(cls, summary: SensorFloorSummary, channel: str) -> "SensorFloorPlotSpec":
+        counts, edges = summary.histogram()
+        return cls(
+            channel=channel,
+            floor_mean=summary.mean,
+            floor_counts=summary.floor_counts,
+            floor_edges=summary.floor_edges,
+            counts=counts,
+            edges=edges,
+        )
+
+    @classmethod
+    def from_background(cls, background_ch: t.Union[pd.Series, np.ndarray], channel: str) -> "SensorFloorPlotSpec":
+        return cls.from_summary(SensorFloorSummary.from_values(background_ch), channel)
+
+    def render(self) -> matplotlib.figure.Figure:
+        # Figures are built without pyplot so they can be created from worker threads
+        fig = matplotlib.figure.Figure(figsize=(10, 8))
+        ax1, ax2 = fig.subplots(2, 1)
+        color = channel_colors.get(self.channel, "black")
+        ch_name = f"{self.channel.capitalize()} Channel"
+
+        ax1.hist(self.floor_edges[:-1], bins=self.floor_edges, weights=self.floor_counts, color=color, alpha=0.7)
+        ax1.set_xlim(*SENSOR_FLOOR_RANGE)
+        ax1.set_title(f"{ch_name} floor average: {self.floor_mean:.2f}")
         ax1.set_xlabel("CMOS pixel value")
         ax1.set_ylabel("Counts")
 
-        ax2.hist(data, bins=100, color=color, alpha=0.7)
+        ax2.hist(self.edges[:-1], bins=self.edges, weights=self.counts, color=color, alpha=0.7)
         ax2.set_title(f"{ch_name} - All data")
         ax2.set_xlabel("CMOS pixel value")
         ax2.set_ylabel("Counts")
+        return fig
+
+
+def plot_sensor_floor(
+    background_ch: t.Union[pd.Series, np.ndarray], channel: str
+) -> t.Tuple[matplotlib.figure.Figure, float]:
+    """
+    Plot histograms for sensor floor values of three channels.
+    """
+    spec = SensorFloorPlotSpec.from_background(background_ch, channel)
+    return (spec.render(), spec.floor_mean)
+
+
+def render_roi(
+    image: np.ndarray, circle: Circle, text: str, color: t.Tuple[int, int, int] = (255, 0, 0), thickness: int = 1
+) -> np.ndarray:
+    """Render a circle on the image."""
+    image = cv2.circle(image, (int(circle.center.x), int(circle.center.y)), int(circle.radius), color, thickness)
+    image = cv2.putText(
+        image,
+        text,
+        (int(circle.center.x + circle.radius), int(circle.center.y + circle.radius)),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.5,
+        (255, 255, 255),
+        2,
+    )
+    return image
+
+
+@dataclasses.dataclass(frozen=True)
+class RoiSelectionPlotSpec(PlotSpec):
+    """A reference frame with the background and fiber ROIs drawn over it."""
+
+    color_name: str
+    reference_image: np.ndarray
+    background_region: Circle
+    regions: t.List[Circle]
+
+    def render(self) -> matplotlib.figure.Figure:
+        render_image = self.reference_image.copy()
+
+        # Normalize to maximum intensity
+        if render_image.max() > 0:
+            render_image = (render_image / render_image.max() * 255).astype(np.uint8)
+        else:
+            render_image = render_image.astype(np.uint8)
+        render_image = cv2.cvtColor(render_image, cv2.COLOR_GRAY2RGB)
+
+        render_image = render_roi(render_image, self.background_region, "B")
+        for i, r in enumerate(self.regions):
+            render_image = render_roi(render_image, r, f"{i}")
+
+        fig = matplotlib.figure.Figure(figsize=(10, 10))
+        ax = fig.subplots()
+        ax.imshow(render_image)
+        ax.set_title(f"ROI Selection for {self.color_name} Channel")
+        ax.axis("off")
+        return fig
+
+
+@dataclasses.dataclass(frozen=True)
+class RoiTemporalPlotSpec(PlotSpec):
+    """Mean intensity and coefficient of variation of each ROI over the sampled frames."""
 
-    _make_hist(background_ch, ax[0], ax[1], channel_colors.get(channel, "black"), f"{channel.capitalize()} Channel")
+    color_name: str
+    time: np.ndarray
+    mean: np.ndarray
+    cv: np.ndarray
+    labels: t.List[str]
 
-    return (fig, floor_mean)
+    def render(self) -> matplotlib.figure.Figure:
+        fig = matplotlib.figure.Figure(figsize=(10, 8))
+        ax1, ax2 = fig.subplots(2, 1, sharex=True)
+        for j, label in enumerate(self.labels):
+            ax1.plot(self.time, self.mean[:, j], label=label)
+            ax2.plot(self.time, self.cv[:, j], label=label)
+        ax1.set_title(f"ROI stability for {self.color_name} Channel")
+        ax1.set_ylabel("Mean pixel value")
+        ax1.legend(loc="upper right")
+        ax2.set_xlabel("Time (s)")
+        ax2.set_ylabel("Coefficient of variation")
+        return fig
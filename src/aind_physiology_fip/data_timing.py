@@ -0,0 +1,333 @@
+import dataclasses
+import os
+import typing as t
+from pathlib import Path
+
+import contraqctor.contract as contract
+import numpy as np
+import pandas as pd
+
+from aind_physiology_fip.data_contract import CachedCsv
+
+# One row per discontinuity in the camera frame counter, located by the index, counter value and
+# reference time of the first frame after it
+GAP_DTYPE = np.dtype(
+    [
+        ("index", np.int64),
+        ("frame_number", np.int64),
+        ("frame_step", np.int64),
+        ("dropped_frames", np.int64),
+        ("reference_time", np.float64),
+        ("duration_s", np.float64),
+    ]
+)
+
+# One row per frame interval where the camera clock advanced more than the reference clock allows,
+# located by the index and reference time of the frame that ends the interval
+JITTER_DTYPE = np.dtype([("index", np.int64), ("reference_time", np.float64), ("jitter_s", np.float64)])
+
+JITTER_PERCENTILES = (50, 95, 99)
+
+
+@dataclasses.dataclass(frozen=True)
+class FrameTimingReport:
+    """Dropped frames and clock jitter of a camera, as returned by `analyze_frame_timing`.
+
+    Attributes:
+        n_frames: Number of frames analyzed.
+        frame_stride: Expected increment of the camera frame counter between frames.
+        clock_jitter_s: Largest allowed excess of the camera frame interval over the reference one.
+        gaps: Structured array (`GAP_DTYPE`) of every frame interval whose counter step is not
+            `frame_stride`.
+        jitter_violations: Structured array (`JITTER_DTYPE`) of every frame interval whose jitter is
+            at least `clock_jitter_s`.
+        jitter_percentiles: Percentiles of the absolute jitter, in seconds, keyed as "p50", "p95", ...
+        max_jitter_s: Largest absolute jitter, in seconds.
+    """
+
+    n_frames: int
+    frame_stride: int
+    clock_jitter_s: float
+    gaps: np.ndarray
+    jitter_violations: np.ndarray
+    jitter_percentiles: t.Dict[str, float]
+    max_jitter_s: float
+
+    @property
+    def dropped(self) -> np.ndarray:
+        """Gaps where the frame counter skipped ahead."""
+        return self.gaps[self.gaps["frame_step"] > self.frame_stride]
+
+    @property
+    def dropped_frames(self) -> int:
+        return int(self.dropped["dropped_frames"].sum())
+
+    def metrics(self) -> t.Dict[str, t.Any]:
+        """Summary of the report, for use as QC metrics."""
+        return {
+            "n_frames": self.n_frames,
+            "n_gaps": len(self.gaps),
+            "dropped_frames": self.dropped_frames,
+            "n_jitter_violations": len(self.jitter_violations),
+            "max_jitter_s": self.max_jitter_s,
+            **{f"jitter_{k}_s": v for k, v in self.jitter_percentiles.items()},
+        }
+
+    def gaps_frame(self) -> pd.DataFrame:
+        """The gaps as a DataFrame, e.g. to export them."""
+        return pd.DataFrame(self.gaps)
+
+    def write_csv(self, prefix: os.PathLike) -> t.List[Path]:
+        """Writes the gaps and jitter violations to `<prefix>_gaps.csv` and `<prefix>_jitter_violations.csv`."""
+        paths = []
+        for name, rows in (("gaps", self.gaps), ("jitter_violations", self.jitter_violations)):
+            path = Path(f"{prefix}_{name}.csv")
+            pd.DataFrame(rows).to_csv(path, index=False)
+            paths.append(path)
+        return paths
+
+
+def analyze_frame_timing(
+    frame_numbers: np.ndarray,
+    camera_times_ns: np.ndarray,
+    reference_times: np.ndarray,
+    *,
+    frame_stride: int = 1,
+    clock_jitter_s: float = 1e-4,
+) -> FrameTimingReport:
+    """Finds every gap in the camera frame counter and every clock jitter violation in one pass.
+
+    The inputs are read as-is (e.g. the column arrays of a metadata table); only the frame-to-frame
+    differences are allocated. Intervals with a missing (NaN) value on either side are ignored.
+
+    Args:
+        frame_numbers: `CameraFrameNumber` of every frame.
+        camera_times_ns: `CameraFrameTime` of every frame, in nanoseconds.
+        reference_times: `ReferenceTime` of every frame, in seconds.
+        frame_stride: Expected increment of the frame counter between consecutive frames.
+        clock_jitter_s: Largest allowed excess of the camera frame interval over the reference one.
+    """
+    frame_numbers = np.asarray(frame_numbers)
+    camera_times_ns = np.asarray(camera_times_ns)
+    reference_times = np.asarray(reference_times, dtype=np.float64)
+    if not (len(frame_numbers) == len(camera_times_ns) == len(reference_times)):
+        raise ValueError("frame_numbers, camera_times_ns and reference_times must have the same length.")
+
+    frame_step = np.diff(frame_numbers)
+    reference_dt = np.diff(reference_times)
+    # Computed in place, reusing a single buffer, since these arrays can hold millions of frames
+    jitter = np.diff(camera_times_ns).astype(np.float64, copy=False)
+    jitter *= 1e-9
+    jitter -= reference_dt
+
+    step_valid = ~np.isnan(frame_step) if frame_step.dtype.kind == "f" else np.ones(len(frame_step), dtype=bool)
+    gap_at = np.flatnonzero(step_valid & (frame_step != frame_stride))
+    gaps = np.empty(len(gap_at), dtype=GAP_DTYPE)
+    steps = frame_step[gap_at].astype(np.int64)
+    gaps["index"] = gap_at + 1
+    gaps["frame_number"] = frame_numbers[gap_at + 1]
+    gaps["frame_step"] = steps
+    gaps["dropped_frames"] = np.maximum(steps // frame_stride - 1, 0)
+    gaps["reference_time"] = reference_times[gap_at + 1]
+    gaps["duration_s"] = reference_dt[gap_at]
+
+    # NaN never compares greater or equal, so missing values are not reported as violations
+    violation_at = np.flatnonzero(jitter >= clock_jitter_s)
+    violations = np.empty(len(violation_at), dtype=JITTER_DTYPE)
+    violations["index"] = violation_at + 1
+    violations["reference_time"] = reference_times[violation_at + 1]
+    violations["jitter_s"] = jitter[violation_at]
+
+    abs_jitter = np.abs(jitter, out=jitter)
+    if np.isnan(abs_jitter.max(initial=0.0)):
+        abs_jitter = abs_jitter[~np.isnan(abs_jitter)]
+    if abs_jitter.size > 0:
+        max_jitter = float(abs_jitter.max())
+        percentiles = np.percentile(abs_jitter, JITTER_PERCENTILES, overwrite_input=True)
+    else:
+        percentiles = np.full(len(JITTER_PERCENTILES), np.nan)
+        max_jitter = float("nan")
+
+    return FrameTimingReport(
+        n_frames=len(frame_numbers),
+        frame_stride=frame_stride,
+        clock_jitter_s=clock_jitter_s,
+        gaps=gaps,
+        jitter_violations=violations,
+        jitter_percentiles={f"p{q}": float(v) for q, v in zip(JITTER_PERCENTILES, percentiles)},
+        max_jitter_s=max_jitter,
+    )
+
+
+UNMATCHED = -1
+
+AlignDirection = t.Literal["nearest", "backward", "forward"]
+
+
+@dataclasses.dataclass(frozen=True)
+class AlignmentIndex:
+    """Maps every sample of a reference stream to a sample of each other stream on the `ReferenceTime` timeline.
+
+    Attributes:
+        reference: Name of the stream whose samples define the rows of the index.
+        streams: Names of all aligned streams, reference first.
+        times: `ReferenceTime` of the reference samples.
+        indices: Array of shape (len(times), len(streams)) with the position of the matching sample
+            in each stream, or `UNMATCHED`.
+        unmatched: Positions of the samples of each stream that no reference sample maps to.
+        tolerance_s: Largest time difference between matched samples.
+        direction: How samples were matched, as in `pandas.merge_asof`.
+    """
+
+    reference: str
+    streams: t.Tuple[str, ...]
+    times: np.ndarray
+    indices: np.ndarray
+    unmatched: t.Dict[str, np.ndarray]
+    tolerance_s: float
+    direction: AlignDirection
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def positions(self, stream: str) -> np.ndarray:
+        """Position of the matching sample of `stream` for every reference sample, or `UNMATCHED`."""
+        return self.indices[:, self.streams.index(stream)]
+
+    @property
+    def matched(self) -> np.ndarray:
+        """Mask of the reference samples matched in every stream."""
+        return np.all(self.indices != UNMATCHED, axis=1)
+
+    def take(self, stream: str, values: t.Union[np.ndarray, pd.Series, pd.DataFrame], fill_value: t.Any = np.nan):
+        """Values of `stream` aligned to the reference samples, with `fill_value` where unmatched.
+
+        Args:
+            stream: Name of the stream `values` belong to.
+            values: Per-sample values of the stream, in the order it was aligned in. DataFrames and
+                Series are re-indexed by the reference `ReferenceTime`.
+        """
+        positions = self.positions(stream)
+        missing = positions == UNMATCHED
+        take_at = np.where(missing, 0, positions)
+        if isinstance(values, (pd.Series, pd.DataFrame)):
+            taken = values.iloc[take_at].set_axis(pd.Index(self.times, name="ReferenceTime"))
+            if missing.any():
+                keep = ~missing if taken.ndim == 1 else np.repeat(~missing[:, None], taken.shape[1], axis=1)
+                taken = taken.where(keep, fill_value)
+            return taken
+        taken = np.asarray(values)[take_at]
+        if missing.any():
+            taken = np.where(missing.reshape((-1,) + (1,) * (taken.ndim - 1)), fill_value, taken)
+        return taken
+
+    def metrics(self) -> t.Dict[str, t.Any]:
+        return {
+            "n_samples": len(self),
+            "n_matched_all": int(self.matched.sum()),
+            **{f"{name}_n_unmatched": int(len(self.unmatched[name])) for name in self.streams},
+        }
+
+
+def _match_times(
+    reference_times: np.ndarray, times: np.ndarray, direction: AlignDirection, tolerance_s: float
+) -> np.ndarray:
+    """Position in `times` of the sample matching each reference time, or `UNMATCHED`."""
+    order = None
+    if len(times) > 1 and not np.all(times[1:] >= times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+    if len(times) == 0:
+        return np.full(len(reference_times), UNMATCHED, dtype=np.int64)
+
+    if direction == "backward":
+        candidate = np.searchsorted(times, reference_times, side="right") - 1
+    elif direction == "forward":
+        candidate = np.searchsorted(times, reference_times, side="left")
+    else:
+        right = np.searchsorted(times, reference_times, side="left")
+        left = right - 1
+        left_distance = reference_times - times[np.clip(left, 0, len(times) - 1)]
+        right_distance = times[np.clip(right, 0, len(times) - 1)] - reference_times
+        # Ties go to the earlier sample
+        use_right = (left < 0) | ((right < len(times)) & (right_distance < left_distance))
+        candidate = np.where(use_right, right, left)
+
+    in_bounds = (candidate >= 0) & (candidate < len(times))
+    clipped = np.clip(candidate, 0, len(times) - 1)
+    valid = in_bounds & (np.abs(times[clipped] - reference_times) <= tolerance_s)
+    if order is not None:
+        clipped = order[clipped]
+    return np.where(valid, clipped, UNMATCHED)
+
+
+def align_times(
+    times: t.Mapping[str, np.ndarray],
+    *,
+    reference: t.Optional[str] = None,
+    tolerance_s: t.Optional[float] = None,
+    direction: AlignDirection = "nearest",
+) -> AlignmentIndex:
+    """Builds an `AlignmentIndex` from the `ReferenceTime` of several streams.
+
+    Every reference sample is matched to one sample of each other stream with a binary search over
+    its sorted times, so the cost is O(n log n) and no table is merged.
+
+    Args:
+        times: `ReferenceTime` of every sample of each stream, keyed by stream name.
+        reference: Stream whose samples define the rows of the index. Defaults to the first one.
+        tolerance_s: Largest time difference between matched samples. Defaults to half the median
+            sample period of the reference stream.
+        direction: Match the nearest sample, the last one at or before ("backward") or the first
+            one at or after ("forward") each reference sample. With time-multiplexed channels,
+            "forward" from the first channel of an acquisition cycle pairs the samples of that cycle.
+    """
+    if not times:
+        raise ValueError("At least one stream is required.")
+    reference = next(iter(times)) if reference is None else reference
+    if reference not in times:
+        raise KeyError(f"Reference stream {reference} is not among the aligned streams.")
+    streams = (reference, *[name for name in times if name != reference])
+    reference_times = np.asarray(times[reference], dtype=np.float64)
+    if tolerance_s is None:
+        period = np.diff(reference_times)
+        tolerance_s = float(np.nanmedian(period)) / 2 if period.size > 0 else 0.0
+
+    indices = np.empty((len(reference_times), len(streams)), dtype=np.int64)
+    indices[:, 0] = np.arange(len(reference_times))
+    unmatched: t.Dict[str, np.ndarray] = {reference: np.empty(0, dtype=np.int64)}
+    for j, name in enumerate(streams[1:], 1):
+        stream_times = np.asarray(times[name], dtype=np.float64)
+        indices[:, j] = _match_times(reference_times, stream_times, direction, tolerance_s)
+        used = np.zeros(len(stream_times), dtype=bool)
+        used[indices[indices[:, j] != UNMATCHED, j]] = True
+        unmatched[name] = np.flatnonzero(~used)
+
+    return AlignmentIndex(
+        reference=reference,
+        streams=streams,
+        times=reference_times,
+        indices=indices,
+        unmatched=unmatched,
+        tolerance_s=tolerance_s,
+        direction=direction,
+    )
+
+
+def align_streams(
+    fip_dataset: contract.Dataset,
+    streams: t.Sequence[str] = ("green", "iso", "red"),
+    **kwargs: t.Any,
+) -> AlignmentIndex:
+    """Aligns csv streams of a dataset (e.g. the channel tables or the camera metadata) by `ReferenceTime`.
+
+    Only the `ReferenceTime` index of each stream is parsed, unless other columns were already
+    declared. Keyword arguments are passed to `align_times`.
+    """
+    times = {}
+    for name in streams:
+        stream = fip_dataset[name]
+        if isinstance(stream, CachedCsv):
+            stream.require_columns([])
+        times[name] = t.cast(pd.DataFrame, stream.data).index.to_numpy()
+    return align_times(times, **kwargs)
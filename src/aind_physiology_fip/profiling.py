@@ -0,0 +1,299 @@
+"""Opt-in timing instrumentation of the data pipeline.
+
+Stream loads, frame reads, ROI reductions, QC suites and tests, asset writes and metadata mapping are
+wrapped in `span`s. Spans are only recorded while a `Profiler` is active (see `profile`); otherwise
+`span` returns a shared no-op context manager, so instrumented code pays a single global lookup.
+
+Every span records its wall time, the CPU time of the thread that ran it, the bytes the process
+read through read calls while it was open and the peak resident memory of the process when it
+closed. Bytes read and peak memory are process-wide, so spans that overlap on other threads share
+them. Work submitted to process pools with `submit` is profiled in the worker and merged back into
+the active profiler.
+
+Example:
+    >>> with profile() as profiler:
+    ...     _run_tests(dataset(path))
+    >>> profiler.write_report("profile.json")
+    >>> profiler.write_chrome_trace("trace.json")  # open in chrome://tracing or ui.perfetto.dev
+"""
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+from aind_physiology_fip import __semver__
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T")
+
+
+def peak_rss_bytes() -> t.Optional[int]:
+    """Peak resident memory of the current process, or None if it cannot be measured on this platform."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil  # type: ignore[import-not-found]
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def read_bytes() -> t.Optional[int]:
+    """Bytes read by the current process through read calls, including those served from the page cache.
+
+    Pages touched through memory maps are not included. Returns None if it cannot be measured on
+    this platform.
+    """
+    try:
+        with open("/proc/self/io", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return int(psutil.Process().io_counters().read_bytes)
+
+
+@dataclasses.dataclass
+class Span:
+    """A timed region of code.
+
+    `start_ns` is a `time.perf_counter_ns` timestamp, which is system-wide on the supported
+    platforms, so spans recorded in worker processes share the time base of the parent.
+    """
+
+    name: str
+    category: str
+    start_ns: int
+    duration_ns: int
+    cpu_time_ns: int
+    read_bytes: t.Optional[int]
+    peak_rss_bytes: t.Optional[int]
+    pid: int
+    tid: int
+    args: t.Dict[str, t.Any] = dataclasses.field(default_factory=dict)
+
+
+class Profiler:
+    """Thread-safe collector of spans."""
+
+    def __init__(self) -> None:
+        self.start_ns = time.perf_counter_ns()
+        self.created = datetime.datetime.now(datetime.timezone.utc)
+        self._spans: t.List[Span] = []
+        self._lock = threading.Lock()
+
+    @property
+    def spans(self) -> t.List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def merge(self, spans: t.Iterable[Span]) -> None:
+        """Adds spans recorded elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self._spans.extend(spans)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args: t.Any) -> t.Iterator[None]:
+        read_before = read_bytes()
+        cpu_before = time.thread_time_ns()
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration_ns = time.perf_counter_ns() - start_ns
+            cpu_time_ns = time.thread_time_ns() - cpu_before
+            read_after = read_bytes()
+            recorded = Span(
+                name=name,
+                category=category,
+                start_ns=start_ns,
+                duration_ns=duration_ns,
+                cpu_time_ns=cpu_time_ns,
+                read_bytes=None if read_before is None or read_after is None else read_after - read_before,
+                peak_rss_bytes=peak_rss_bytes(),
+                pid=os.getpid(),
+                tid=threading.get_ident(),
+                args=args,
+            )
+            with self._lock:
+                self._spans.append(recorded)
+
+    def summary(self) -> t.List[t.Dict[str, t.Any]]:
+        """Totals of the spans grouped by category and name, slowest first."""
+        groups: t.Dict[t.Tuple[str, str], t.Dict[str, t.Any]] = {}
+        for span in self.spans:
+            group = groups.setdefault(
+                (span.category, span.name),
+                {
+                    "category": span.category,
+                    "name": span.name,
+                    "count": 0,
+                    "wall_time_s": 0.0,
+                    "cpu_time_s": 0.0,
+                    "read_bytes": None,
+                    "peak_rss_bytes": None,
+                },
+            )
+            group["count"] += 1
+            group["wall_time_s"] += span.duration_ns / 1e9
+            group["cpu_time_s"] += span.cpu_time_ns / 1e9
+            if span.read_bytes is not None:
+                group["read_bytes"] = (group["read_bytes"] or 0) + span.read_bytes
+            if span.peak_rss_bytes is not None:
+                group["peak_rss_bytes"] = max(group["peak_rss_bytes"] or 0, span.peak_rss_bytes)
+        return sorted(groups.values(), key=lambda group: group["wall_time_s"], reverse=True)
+
+    def report(self) -> t.Dict[str, t.Any]:
+        """Json-serializable timing report with the per-name summary and every span."""
+        return {
+            "version": __semver__,
+            "created": self.created.isoformat(),
+            "wall_time_s": (time.perf_counter_ns() - self.start_ns) / 1e9,
+            "summary": self.summary(),
+            "spans": [
+                {
+                    **dataclasses.asdict(span),
+                    "start_s": (span.start_ns - self.start_ns) / 1e9,
+                    "wall_time_s": span.duration_ns / 1e9,
+                    "cpu_time_s": span.cpu_time_ns / 1e9,
+                }
+                for span in sorted(self.spans, key=lambda span: span.start_ns)
+            ],
+        }
+
+    def write_report(self, path: os.PathLike) -> Path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        return Path(path)
+
+    def write_chrome_trace(self, path: os.PathLike) -> Path:
+        """Writes the spans in the Chrome trace-event format, viewable in chrome://tracing or Perfetto."""
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start_ns - self.start_ns) / 1e3,
+                "dur": span.duration_ns / 1e3,
+                "pid": span.pid,
+                "tid": span.tid,
+                "args": {
+                    "cpu_time_ms": span.cpu_time_ns / 1e6,
+                    "read_bytes": span.read_bytes,
+                    "peak_rss_bytes": span.peak_rss_bytes,
+                    **span.args,
+                },
+            }
+            for span in self.spans
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+        return Path(path)
+
+
+_active: t.Optional[Profiler] = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+def active() -> t.Optional[Profiler]:
+    """The profiler that records spans, if any."""
+    return _active
+
+
+@contextlib.contextmanager
+def profile(profiler: t.Optional[Profiler] = None) -> t.Iterator[Profiler]:
+    """Records the spans of every thread of the process into `profiler` (a new one by default)."""
+    global _active
+    previous, _active = _active, profiler or Profiler()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+def span(name: str, category: str, **args: t.Any) -> t.ContextManager[None]:
+    """Times a region of code if a profiler is active.
+
+    Args:
+        name: Name of the region, e.g. a stream or test name.
+        category: Kind of region, e.g. "load", "io", "suite" or "test". Spans are summarized per
+            category and name.
+        **args: Json-serializable details attached to the span.
+    """
+    profiler = _active
+    if profiler is None:
+        return _NO_SPAN
+    return profiler.span(name, category, **args)
+
+
+def _call_profiled(fn: t.Callable[..., T], *args: t.Any, **kwargs: t.Any) -> t.Tuple[T, t.List[Span]]:
+    with profile() as profiler:
+        result = fn(*args, **kwargs)
+    return result, profiler.spans
+
+
+def submit(executor: concurrent.futures.Executor, fn: t.Callable[..., T], *args: t.Any, **kwargs: t.Any):
+    """Submits `fn` to a process pool, profiling it in the worker if a profiler is active here.
+
+    Returns a future of the result of `fn`. The spans recorded by the worker are merged into the
+    active profiler when the call completes.
+    """
+    profiler = _active
+    if profiler is None:
+        return executor.submit(fn, *args, **kwargs)
+    inner = executor.submit(_call_profiled, fn, *args, **kwargs)
+    outer: concurrent.futures.Future = concurrent.futures.Future()
+
+    def _unwrap(done: concurrent.futures.Future) -> None:
+        if done.cancelled():
+            outer.cancel()
+            outer.set_running_or_notify_cancel()
+        elif done.exception() is not None:
+            outer.set_exception(done.exception())
+        else:
+            result, spans = done.result()
+            profiler.merge(spans)
+            outer.set_result(result)
+
+    inner.add_done_callback(_unwrap)
+    return outer
+
+
+@contextlib.contextmanager
+def profile_to(
+    report_path: t.Optional[os.PathLike] = None, trace_path: t.Optional[os.PathLike] = None
+) -> t.Iterator[t.Optional[Profiler]]:
+    """Profiles the enclosed code if either path is given, writing the report and trace on exit.
+
+    The files are written even if the enclosed code raises, so that slow or failing runs can be inspected.
+    """
+    if report_path is None and trace_path is None:
+        yield None
+        return
+    with profile() as profiler:
+        try:
+            yield profiler
+        finally:
+            if report_path is not None:
+                logger.info("Timing report written to %s", profiler.write_report(report_path))
+            if trace_path is not None:
+                logger.info("Chrome trace written to %s", profiler.write_chrome_trace(trace_path))
@@ -0,0 +1,298 @@
+import dataclasses
+import datetime
+import json
+import logging
+import math
+import os
+import typing as t
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from aind_behavior_services.rig.harp import HarpCuttlefishfip
+from aind_behavior_services.session import Session
+
+from aind_physiology_fip.data_integration import RoiPixelIndex, get_channel_rois
+from aind_physiology_fip.rig import (
+    AindPhysioFipRig,
+    Circle,
+    FipCamera,
+    FipTask,
+    LightSource,
+    LightSourceCalibration,
+    Networking,
+    Point2f,
+    Ports,
+    RoiSettings,
+)
+
+logger = logging.getLogger(__name__)
+
+ChannelName = t.Literal["green", "iso", "red"]
+
+# Order in which the LEDs fire within each acquisition cycle
+_CHANNEL_PHASE: t.Dict[str, int] = {"green": 0, "iso": 1, "red": 2}
+
+# Counts above the camera offset that every fiber adds to each channel, relative to the isosbestic signal
+_CHANNEL_GAIN: t.Dict[str, float] = {"green": 1.5, "iso": 1.0, "red": 0.8}
+
+_SENSOR_FLOOR = 260.0
+_NOISE_BANK_SIZE = 61
+_DEFAULT_START = datetime.datetime(2025, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+@dataclasses.dataclass(frozen=True)
+class SyntheticSessionSpec:
+    """Shape of a synthetic FIP session.
+
+    Args:
+        duration_s: Total recording time, split evenly across epochs.
+        n_fibers: Number of fiber ROIs on each camera.
+        n_epochs: Number of `fip_*` acquisition epochs.
+        fps: Frame rate of each color channel.
+        frame_shape: (height, width) of the raw frames.
+        seed: Seed of the random number generator.
+        background_frames: Number of frames of the background recording of each channel.
+        start_time: Start of the first epoch.
+        epoch_gap_s: Time between the end of an epoch and the start of the next.
+    """
+
+    duration_s: float = 60.0
+    n_fibers: int = 4
+    n_epochs: int = 1
+    fps: float = 20.0
+    frame_shape: t.Tuple[int, int] = (200, 200)
+    seed: int = 0
+    background_frames: int = 100
+    start_time: datetime.datetime = _DEFAULT_START
+    epoch_gap_s: float = 10.0
+
+    @property
+    def frames_per_epoch(self) -> int:
+        return int(round(self.duration_s / self.n_epochs * self.fps))
+
+    def metadata(self) -> t.Dict[str, t.Any]:
+        """Json-serializable description of the spec."""
+        return {
+            **dataclasses.asdict(self),
+            "frame_shape": list(self.frame_shape),
+            "start_time": self.start_time.isoformat(),
+        }
+
+
+def make_roi_settings(n_fibers: int, frame_shape: t.Tuple[int, int] = (200, 200)) -> RoiSettings:
+    """ROI settings with `n_fibers` circles laid out on a grid, clear of the background circle."""
+    height, width = frame_shape
+    n_cols = max(1, math.ceil(math.sqrt(n_fibers)))
+    n_rows = max(1, math.ceil(n_fibers / n_cols))
+    margin = 20
+    step_x, step_y = (width - margin) / n_cols, (height - margin) / n_rows
+    radius = max(1.0, min(20.0, 0.4 * min(step_x, step_y)))
+    rois = [
+        Circle(
+            center=Point2f(x=margin + (i % n_cols + 0.5) * step_x, y=margin + (i // n_cols + 0.5) * step_y),
+            radius=radius,
+        )
+        for i in range(n_fibers)
+    ]
+    return RoiSettings(camera_green_iso_roi=rois, camera_red_roi=list(rois))
+
+
+def make_session(date: datetime.datetime = _DEFAULT_START) -> Session:
+    return Session(
+        date=date,
+        experiment="AindPhysioFip",
+        subject="synthetic",
+        notes="Synthetic session",
+        allow_dirty_repo=True,
+        skip_hardware_validation=True,
+        experimenter=["synthetic"],
+    )
+
+
+def make_rig(roi_settings: t.Optional[RoiSettings] = None) -> AindPhysioFipRig:
+    calibration = LightSourceCalibration(power_lut={0: 0, 0.1: 10, 0.2: 20})
+    return AindPhysioFipRig(
+        data_directory=r"C:/data",
+        rig_name="synthetic_rig",
+        computer_name="synthetic_computer",
+        camera_green_iso=FipCamera(serial_number="000000"),
+        camera_red=FipCamera(serial_number="000001"),
+        light_source_blue=LightSource(
+            power=10, calibration=calibration, task=FipTask(camera_port=Ports.IO0, light_source_port=Ports.IO2)
+        ),
+        light_source_lime=LightSource(
+            power=20, calibration=calibration, task=FipTask(camera_port=Ports.IO1, light_source_port=Ports.IO4)
+        ),
+        light_source_uv=LightSource(
+            power=0.1, calibration=None, task=FipTask(camera_port=Ports.IO0, light_source_port=Ports.IO3)
+        ),
+        roi_settings=roi_settings or RoiSettings(),
+        networking=Networking(),
+        cuttlefish_fip=HarpCuttlefishfip(port_name="COM1"),
+    )
+
+
+def _fiber_intensities(rng: np.random.Generator, times: np.ndarray, n_fibers: int) -> t.Dict[str, np.ndarray]:
+    """Counts above the sensor floor added by each fiber, per channel, as (n_frames, n_fibers) arrays.
+
+    Every fiber sees a bleaching, slowly drifting artifact shared by all channels. Green and red add
+    their own sparse, exponentially decaying transients on top of it.
+    """
+    n = len(times)
+    amplitude = rng.uniform(200, 400, size=n_fibers)
+    drift = np.cumsum(rng.normal(0, 2e-4, size=(n, n_fibers)), axis=0)
+    artifact = amplitude * (1 + 0.2 * np.exp(-(times - times[0]) / 600))[:, None] * (1 + drift)
+    out = {}
+    for channel, gain in _CHANNEL_GAIN.items():
+        signal = gain * artifact
+        if channel != "iso":
+            onsets = rng.random((n, n_fibers)) < 0.002
+            kernel = np.exp(-np.arange(min(n, 40)) / 8)
+            transients = np.apply_along_axis(lambda x: np.convolve(x, kernel)[:n], 0, onsets.astype(float))
+            signal = signal * (1 + 0.05 * transients)
+        out[channel] = signal
+    return out
+
+
+def _write_epoch(epoch: Path, spec: SyntheticSessionSpec, start: datetime.datetime, t0: float, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    height, width = spec.frame_shape
+    n = spec.frames_per_epoch
+    cycles = t0 + np.arange(n) / spec.fps
+    roi_settings = make_roi_settings(spec.n_fibers, spec.frame_shape)
+
+    epoch.mkdir(parents=True, exist_ok=True)
+    (epoch / "Logs").mkdir(exist_ok=True)
+    (epoch / "regions.json").write_text(roi_settings.model_dump_json(indent=2), encoding="utf-8")
+    (epoch / "Logs/session_input.json").write_text(make_session(start).model_dump_json(indent=2), encoding="utf-8")
+    (epoch / "Logs/rig_input.json").write_text(make_rig(roi_settings).model_dump_json(indent=2), encoding="utf-8")
+
+    intensities = _fiber_intensities(rng, cycles, spec.n_fibers)
+    # Camera noise is drawn once and cycled with a prime period, so generation is dominated by writing
+    noise = rng.normal(0, 2.0, size=(_NOISE_BANK_SIZE, width, height)).astype(np.float32)
+    floor = _SENSOR_FLOOR + rng.normal(0, 1.0, size=(width, height)).astype(np.float32)
+    times = {channel: cycles + phase / (3 * spec.fps) for channel, phase in _CHANNEL_PHASE.items()}
+
+    for channel in _CHANNEL_PHASE:
+        background, regions = get_channel_rois(roi_settings, channel)
+        index = RoiPixelIndex.from_circles([background, *regions], spec.frame_shape)
+        # Frames are written in the column-major layout of the acquisition software, so the masks are
+        # built in (width, height) storage order
+        masks = np.zeros((len(regions), width, height), dtype=np.float32)
+        for j in range(len(regions)):
+            lo = index.offsets[j + 1]
+            hi = lo + index.counts[j + 1]
+            masks[j, index.cols[lo:hi], index.rows[lo:hi]] = 1.0
+        with open(epoch / f"{channel}_metadata.json", "w", encoding="utf-8") as f:
+            json.dump({"Width": width, "Height": height, "Channels": 1, "Layout": 1, "Depth": "U16"}, f)
+
+        # The background recording is acquired with the LEDs off, before the session starts
+        n_background = spec.background_frames
+        background_times = times[channel][0] - 1.0 - np.arange(n_background, 0, -1) / spec.fps
+        recordings = [
+            (channel, intensities[channel], times[channel], _frame_numbers(channel, n)),
+            (
+                f"background_{channel}",
+                np.zeros((n_background, len(regions))),
+                background_times,
+                _frame_numbers(channel, n_background),
+            ),
+        ]
+        for name, intensity, reference_time, frame_number in recordings:
+            integrated = _write_frames(epoch / f"{name}.bin", intensity, masks, floor, noise, index)
+            table = pd.DataFrame(
+                {
+                    "ReferenceTime": reference_time,
+                    "CameraFrameNumber": frame_number,
+                    "CameraFrameTime": _camera_frame_time(reference_time, t0),
+                    "Background": integrated[:, 0],
+                }
+            )
+            for j in range(len(regions)):
+                table[f"Fiber_{j}"] = integrated[:, j + 1]
+            table.to_csv(epoch / f"{name}.csv", index=False)
+
+    green_iso = np.concatenate([times["green"], times["iso"]])
+    order = np.argsort(green_iso, kind="stable")
+    cameras = {
+        "camera_green_iso_metadata": (
+            green_iso[order],
+            np.concatenate([_frame_numbers("green", n), _frame_numbers("iso", n)])[order],
+        ),
+        "camera_red_metadata": (times["red"], _frame_numbers("red", n)),
+    }
+    for name, (reference_time, frame_number) in cameras.items():
+        cpu_time = pd.Timestamp(start) + pd.to_timedelta(reference_time - t0, unit="s")
+        pd.DataFrame(
+            {
+                "ReferenceTime": reference_time,
+                "CameraFrameNumber": frame_number,
+                "CameraFrameTime": _camera_frame_time(reference_time, t0),
+                "CpuTime": [stamp.isoformat() for stamp in cpu_time.round("us")],
+            }
+        ).to_csv(epoch / f"{name}.csv", index=False)
+
+
+def _write_frames(
+    path: Path, intensity: np.ndarray, masks: np.ndarray, floor: np.ndarray, noise: np.ndarray, index: RoiPixelIndex
+) -> np.ndarray:
+    """Writes `floor + intensity * masks + noise` frames in blocks and returns their integrated ROIs."""
+    n = len(intensity)
+    integrated = np.empty((n, index.n_rois))
+    chunk_size = max(1, 2**22 // floor.size)
+    with open(path, "wb") as f:
+        for lo in range(0, n, chunk_size):
+            hi = min(lo + chunk_size, n)
+            frames = np.tensordot(intensity[lo:hi].astype(np.float32), masks, axes=1)
+            frames += floor
+            frames += noise[np.arange(lo, hi) % len(noise)]
+            storage = np.clip(np.rint(frames), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+            storage.tofile(f)
+            integrated[lo:hi] = index.integrate(storage.transpose(0, 2, 1))
+    return integrated
+
+
+def _frame_numbers(channel: str, n: int) -> np.ndarray:
+    # Green and iso share a camera, so their frames interleave on a single counter
+    if channel == "red":
+        return np.arange(n, dtype=np.int64)
+    return 2 * np.arange(n, dtype=np.int64) + _CHANNEL_PHASE[channel]
+
+
+def _camera_frame_time(reference_time: np.ndarray, t0: float) -> np.ndarray:
+    # The camera clock is offset from the harp clock, but runs at the same rate
+    return np.rint((reference_time - t0 + 1000.0) * 1e9).astype(np.int64)
+
+
+def generate_session(root: os.PathLike, spec: t.Optional[SyntheticSessionSpec] = None) -> t.List[Path]:
+    """Writes a synthetic FIP session with the directory layout of the acquisition software.
+
+    Each epoch is written to `<root>/fib/fip_<start time>/` with the raw frames and their metadata,
+    the channel, background and camera metadata csv files, `regions.json` and the session and rig inputs under
+    `Logs/`. The channel csv files are integrated from the generated frames, so they agree with the
+    raw data to the same precision as files written during acquisition.
+
+    Frames are generated and written in blocks, so memory does not grow with the session duration.
+
+    Args:
+        root: Session root directory.
+        spec: Shape of the session. Defaults to `SyntheticSessionSpec()`.
+
+    Returns:
+        The epoch directories, in acquisition order.
+    """
+    spec = spec or SyntheticSessionSpec()
+    if spec.n_epochs < 1 or spec.frames_per_epoch < 1:
+        raise ValueError("A synthetic session needs at least one epoch with one frame.")
+    epochs = []
+    epoch_duration_s = spec.frames_per_epoch / spec.fps
+    seeds = np.random.SeedSequence(spec.seed).generate_state(spec.n_epochs)
+    for k in range(spec.n_epochs):
+        offset_s = k * (epoch_duration_s + spec.epoch_gap_s)
+        start = spec.start_time + datetime.timedelta(seconds=offset_s)
+        epoch = Path(root) / "fib" / f"fip_{start.strftime('%Y-%m-%dT%H%M%S')}"
+        logger.info("Writing synthetic epoch %s with %d frames per channel.", epoch, spec.frames_per_epoch)
+        _write_epoch(epoch, spec, start, t0=100.0 + offset_s, seed=int(seeds[k]))
+        epochs.append(epoch)
+    return epochs
@@ -0,0 +1,50 @@
+"""Helpers shared by the data pipeline modules."""
+
+import contextlib
+import os
+import shutil
+import threading
+import typing as t
+from pathlib import Path
+
+
+def import_pyarrow(feature: str):
+    """Imports pyarrow, with the modules the pipeline uses, or explains how to install it.
+
+    Args:
+        feature: Name of the feature that needs pyarrow, used in the error message.
+
+    Raises:
+        ImportError: If pyarrow, which is only installed with the `cache` extra, is missing.
+    """
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError(f"{feature} requires pyarrow. Install it with 'aind-physiology-fip[cache]'.") from e
+    return pyarrow
+
+
+@contextlib.contextmanager
+def atomic_write_path(path: os.PathLike) -> t.Iterator[Path]:
+    """Yields a temporary path next to `path` that replaces it once the block exits without error.
+
+    The temporary path is unique to the process and thread, and is removed if the block fails, so
+    readers never see a partially written file. It may be written as a file or as a directory; an
+    existing directory at `path` must be removed inside the block, since it cannot be replaced.
+
+    Example:
+        >>> with atomic_write_path("fip.json") as tmp_path:
+        ...     tmp_path.write_text("{}")
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.is_dir():
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        else:
+            tmp_path.unlink(missing_ok=True)
@@ -1,14 +1,32 @@
+import os
 import sys
+import tempfile
 import unittest
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Any
 
 import pandas as pd
 from contraqctor.contract import DataStream
 
-from aind_physiology_fip.data_mappers import ProtoAcquisitionMapper
+from aind_physiology_fip.data_mappers import ProtoAcquisitionMapper, find_sessions, map_sessions, read_manifest
+from aind_physiology_fip.data_mappers._batch import is_up_to_date
 
 sys.path.append(".")
+from tests import EXAMPLES_DIR  # isort:skip # pylint: disable=wrong-import-position
+
+
+def _write_epoch(epoch: Path, start: datetime, with_inputs: bool) -> None:
+    epoch.mkdir(parents=True)
+    cpu_time = [(start + timedelta(seconds=i)).isoformat() for i in range(3)]
+    for name in ("camera_green_iso_metadata", "camera_red_metadata"):
+        pd.DataFrame({"ReferenceTime": range(3), "CpuTime": cpu_time}).to_csv(epoch / f"{name}.csv", index=False)
+    if with_inputs:
+        (epoch / "Logs").mkdir()
+        for name, example in (("session_input", "Session"), ("rig_input", "AindPhysioFipRig")):
+            (epoch / "Logs" / f"{name}.json").write_text(
+                (EXAMPLES_DIR / f"{example}.json").read_text(encoding="utf-8"), encoding="utf-8"
+            )
 
 
 class MockCsv(DataStream[pd.DataFrame, Any]):
@@ -40,6 +58,104 @@ class TestAcquisitionMapper(unittest.TestCase):
         self.assertEqual(start_utc, datetime.fromisoformat("2025-07-18T19:03:19Z"))
         self.assertEqual(end_utc, datetime.fromisoformat("2025-07-18T19:03:21+00:00"))
 
+    def test_time_extraction_from_csv(self):
+        start = datetime.fromisoformat("2025-07-18T19:03:19+00:00")
+        cpu_time = [(start + timedelta(seconds=i / 60)).isoformat() for i in range(5000)]
+        df = pd.DataFrame({"ReferenceTime": range(5000), "CpuTime": cpu_time, "CameraFrameNumber": range(5000)})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "camera_green_iso_metadata.csv"
+            df.to_csv(path, index=False)
+            self.assertEqual(
+                ProtoAcquisitionMapper._extract_from_csv(path), ProtoAcquisitionMapper._extract_from_df(df)
+            )
+
+            # An interrupted write leaves an incomplete last row, which is skipped
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("5000,2025-07-18T19:")
+            self.assertEqual(ProtoAcquisitionMapper._extract_from_csv(path)[1], datetime.fromisoformat(cpu_time[-1]))
+
+            df.iloc[:1].to_csv(path, index=False)
+            self.assertEqual(ProtoAcquisitionMapper._extract_from_csv(path), (start, start))
+
+            df.iloc[:0].to_csv(path, index=False)
+            with self.assertRaises(ValueError):
+                ProtoAcquisitionMapper._extract_from_csv(path)
+
+    def test_map_epochs(self):
+        start = datetime.fromisoformat("2025-07-18T19:03:19+00:00")
+        with tempfile.TemporaryDirectory() as tmp:
+            fib = Path(tmp) / "fib"
+            _write_epoch(fib / "fip_2", start + timedelta(hours=1), with_inputs=True)
+            _write_epoch(fib / "fip_1", start, with_inputs=False)
+            (fib / "fip_3").mkdir()
+
+            mapper = ProtoAcquisitionMapper(tmp, max_workers=4)
+            acquisition = mapper.map()
+            self.assertIs(mapper.mapped, acquisition)
+            self.assertEqual([s.id for s in acquisition.data_stream_metadata], ["fip_1", "fip_1", "fip_2", "fip_2"])
+            self.assertEqual(acquisition.data_stream_metadata[0].start_time, start)
+            self.assertEqual(acquisition, ProtoAcquisitionMapper(tmp, max_workers=1).map())
+
+            for path in (fib / "fip_2" / "Logs").iterdir():
+                path.unlink()
+            with self.assertRaises(ValueError):
+                ProtoAcquisitionMapper(tmp).map()
+
+
+class TestBatchMapper(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        start = datetime.fromisoformat("2025-07-18T19:03:19+00:00")
+        for name in ("subject_a/session_1", "subject_a/session_2", "subject_b/session_1"):
+            _write_epoch(self.root / name / "fib" / "fip_1", start, with_inputs=True)
+        # A session without inputs, which fails to map
+        _write_epoch(self.root / "subject_b" / "session_2" / "fib" / "fip_1", start, with_inputs=False)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_find_sessions_and_manifest(self):
+        sessions = find_sessions(self.root)
+        self.assertEqual(
+            [s.relative_to(self.root).as_posix() for s in sessions][:2], ["subject_a/session_1", "subject_a/session_2"]
+        )
+        self.assertEqual(len(sessions), 4)
+        self.assertEqual(find_sessions(sessions[0]), [sessions[0]])
+
+        manifest = self.root / "manifest.txt"
+        manifest.write_text("# backfill\nsubject_b/session_1\n\nsubject_a/session_2\n", encoding="utf-8")
+        self.assertEqual(
+            read_manifest(manifest), [self.root / "subject_b/session_1", self.root / "subject_a/session_2"]
+        )
+
+    def test_map_sessions(self):
+        sessions = find_sessions(self.root)
+        summary = map_sessions(sessions, workers=2)
+        self.assertEqual((summary.mapped, summary.skipped, summary.failed), (3, 0, 1))
+        self.assertEqual([r.session for r in summary.sessions], [str(s) for s in sessions])
+        self.assertEqual(summary.sessions[-1].status, "failed")
+        self.assertIn("session_input", summary.sessions[-1].error)
+        self.assertTrue((sessions[0] / "fip.json").exists())
+
+        summary = map_sessions(sessions)
+        self.assertEqual((summary.mapped, summary.skipped, summary.failed), (0, 3, 1))
+
+        csv_path = sessions[0] / "fib" / "fip_1" / "camera_red_metadata.csv"
+        mapped_at = (sessions[0] / "fip.json").stat().st_mtime_ns
+        os.utime(csv_path, ns=(mapped_at + 10**9, mapped_at + 10**9))
+        self.assertEqual([r.status for r in map_sessions(sessions[:2]).sessions], ["mapped", "skipped"])
+        self.assertEqual(map_sessions(sessions[:2], force=True).mapped, 2)
+
+    def test_missing_fib_directory(self):
+        session = self.root / "subject_c" / "session_1"
+        session.mkdir(parents=True)
+        (session / "fip.json").write_text("{}", encoding="utf-8")
+        self.assertFalse(is_up_to_date(session))
+        summary = map_sessions([session, *find_sessions(self.root / "subject_a")])
+        self.assertEqual((summary.mapped, summary.failed), (2, 1))
+        self.assertEqual(summary.sessions[0].status, "failed")
+
 
 if __name__ == "__main__":
     unittest.main()
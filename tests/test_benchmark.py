@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aind_physiology_fip.benchmark import BenchmarkReport, compare_reports, run_benchmark
+from aind_physiology_fip.data_contract import dataset
+from aind_physiology_fip.data_integration import reintegrate_channel
+from aind_physiology_fip.data_mappers import ProtoAcquisitionMapper
+from aind_physiology_fip.rig import RoiSettings
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+
+class TestSyntheticSession(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        cls.spec = SyntheticSessionSpec(duration_s=10, n_fibers=3, n_epochs=2, frame_shape=(64, 80))
+        cls.epochs = generate_session(cls.root, cls.spec)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_layout(self):
+        self.assertEqual([epoch.name for epoch in self.epochs], ["fip_2025-01-01T120000", "fip_2025-01-01T120015"])
+        fip_dataset = dataset(self.epochs[0])
+        self.assertEqual(fip_dataset.load_all().collect_errors(), [])
+        self.assertIsInstance(fip_dataset["regions"].data, RoiSettings)
+        self.assertEqual(len(fip_dataset["regions"].data.camera_red_roi), 3)
+        for channel in ("green", "iso", "red"):
+            table = fip_dataset[channel].data
+            self.assertEqual(len(table), self.spec.frames_per_epoch)
+            self.assertEqual(fip_dataset[f"raw_{channel}"].data.number_of_frames, len(table))
+            self.assertEqual(list(table.columns)[-1], "Fiber_2")
+            # Channel csv files agree with their raw frames
+            pd.testing.assert_frame_equal(reintegrate_channel(fip_dataset, channel), table)
+        green_iso = fip_dataset["camera_green_iso_metadata"].data
+        np.testing.assert_array_equal(green_iso["CameraFrameNumber"], np.arange(2 * self.spec.frames_per_epoch))
+
+    def test_mapper(self):
+        mapped = ProtoAcquisitionMapper(self.root).map()
+        self.assertEqual(len(mapped.data_stream_metadata), 4)
+        self.assertEqual(mapped.data_stream_metadata[-1].id, self.epochs[-1].name)
+
+    def test_benchmark(self):
+        report = run_benchmark(self.root, repeat=2, isolate=False)
+        self.assertEqual(
+            [stage.name for stage in report.stages], ["frame_reader", "dataset_load", "data_qc", "data_mappers"]
+        )
+        frame_reader = report.stage("frame_reader")
+        self.assertEqual(len(frame_reader.runs), 2)
+        self.assertGreater(frame_reader.wall_time_s, 0)
+
+        roundtrip = BenchmarkReport.model_validate_json(report.model_dump_json())
+        self.assertEqual(compare_reports(roundtrip, report), [])
+        slower = roundtrip.model_copy(deep=True)
+        for run in slower.stage("data_qc").runs:
+            run.wall_time_s *= 2
+        regressions = compare_reports(slower, report, max_regression=0.5)
+        self.assertEqual([(r.stage, r.metric) for r in regressions], [("data_qc", "wall_time_s")])
+        with self.assertRaises(ValueError):
+            run_benchmark(self.root, stages=["unknown"])
+
+
+if __name__ == "__main__":
+    unittest.main()
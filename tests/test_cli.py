@@ -0,0 +1,69 @@
+import json
+import re
+import subprocess
+import sys
+import unittest
+
+# Modules that only the subcommands that need them should import
+HEAVY_MODULES = ["contraqctor", "cv2", "matplotlib", "numpy", "pandas", "scipy"]
+
+_PROBE = """
+import json, sys
+from pydantic_settings import CliApp
+from aind_physiology_fip.cli import FipCli
+CliApp().run(FipCli, cli_args=sys.argv[1:])
+print(json.dumps(sorted(m for m in {heavy} if m in sys.modules)))
+"""
+
+
+def _imported_heavy_modules(*cli_args: str) -> list:
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY_MODULES), *cli_args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class CliImportTests(unittest.TestCase):
+    """Import-time regression checks for the `fip` entry point."""
+
+    def test_light_subcommands_do_not_import_heavy_modules(self):
+        self.assertEqual(_imported_heavy_modules("version"), [])
+
+    def test_import_time(self):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import aind_physiology_fip.cli"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        imported = {
+            match.group(2): int(match.group(1))
+            for match in re.finditer(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)", completed.stderr)
+        }
+        self.assertEqual([m for m in HEAVY_MODULES if m in imported], [])
+        # Generous budget, meant to catch a heavy import sneaking back in rather than to benchmark
+        self.assertLess(imported["aind_physiology_fip.cli"], 1_500_000, "Cumulative import time (us) too high.")
+
+    def test_cli_classes_importable_from_previous_modules(self):
+        from aind_physiology_fip import cli
+        from aind_physiology_fip.data_mappers import DataMapperCli
+        from aind_physiology_fip.data_qc import DataQcCli
+
+        self.assertIs(DataQcCli, cli.DataQcCli)
+        self.assertIs(DataMapperCli, cli.DataMapperCli)
+
+    def test_data_mapper_requires_data_path(self):
+        from pydantic import ValidationError
+
+        from aind_physiology_fip.cli import DataMapperCli
+
+        with self.assertRaisesRegex(ValidationError, "data-path is required"):
+            DataMapperCli()
+        self.assertIsNone(DataMapperCli(manifest="sessions.txt").data_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
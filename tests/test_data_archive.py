@@ -0,0 +1,128 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from aind_physiology_fip.data_archive import (
+    FrameArchive,
+    FrameArchiveWriter,
+    archive_frame_file,
+    archive_frame_files,
+    extract_frame_file,
+)
+from aind_physiology_fip.data_contract import FipRawFrame, dataset, frame_archive_path
+from aind_physiology_fip.data_integrity import verify_frame_index, write_frame_index
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+from tests.test_data_contract import _write_frames
+
+
+class TestFrameArchive(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_roundtrip(self):
+        data = np.random.default_rng(0).integers(0, 2**12, size=5003, dtype=np.uint16).tobytes() + b"\x07"
+        path = self.root / "frames.fipz"
+        with FrameArchiveWriter(path, block_size_bytes=1000, itemsize=2, threads=2, metadata={"width": 4}) as writer:
+            # Writes need not be aligned with blocks
+            for lo in range(0, len(data), 777):
+                writer.write(data[lo : lo + 777])
+        archive = FrameArchive(path)
+        self.assertEqual(archive.size_bytes, len(data))
+        self.assertEqual(archive.n_blocks, 11)
+        self.assertEqual(archive.metadata, {"width": 4})
+        self.assertLess(archive.compressed_size_bytes, len(data))
+        self.assertEqual(archive.verify(), [])
+        for offset, length in [(0, len(data)), (999, 2), (4321, 3000), (len(data) - 1, 10)]:
+            out = bytearray(length)
+            n = archive.readinto(offset, out)
+            self.assertEqual(bytes(out[:n]), data[offset : offset + length])
+        with archive.open() as f:
+            f.seek(2500)
+            self.assertEqual(f.read(100), data[2500:2600])
+
+    def test_detects_corruption(self):
+        path = self.root / "frames.fipz"
+        with FrameArchiveWriter(path, block_size_bytes=4096, itemsize=2, codec="lz4") as writer:
+            writer.write(np.arange(8192, dtype=np.uint16).tobytes())
+        archive = FrameArchive(path)
+        with open(path, "r+b") as f:
+            f.seek(int(archive.offsets[2]) + 10)
+            byte = f.read(1)
+            f.seek(-1, 1)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        self.assertEqual(archive.verify(), [2])
+        with self.assertRaises(IOError):
+            archive.readinto(2 * 4096, bytearray(10))
+
+
+class TestArchivedFrames(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.expected = np.random.default_rng(3).integers(0, 2**16, size=(25, 12, 16), dtype=np.uint16)
+        self.path = self.root / "green.bin"
+        _write_frames(self.path, self.expected)
+        self.stream = FipRawFrame("raw_green", reader_params=FipRawFrame.make_params(path=self.path))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_transparent_read(self):
+        source = self.path.read_bytes()
+        write_frame_index(self.stream.read())
+        archive_frame_file(self.stream.read(), frames_per_block=4, threads=2, delete_source=True)
+        self.assertFalse(self.path.exists())
+        self.assertTrue(frame_archive_path(self.path).exists())
+
+        reader = self.stream.read()
+        self.assertIsNotNone(reader.archive)
+        self.assertEqual(reader.number_of_frames, 25)
+        np.testing.assert_array_equal(reader.read_frames(slice(None)), self.expected)
+        np.testing.assert_array_equal(reader.read_frames([24, 3, 3, 9]), self.expected[[24, 3, 3, 9]])
+        chunks = list(reader.iter_chunks(7, prefetch=2))
+        np.testing.assert_array_equal(np.concatenate([frames for _, frames in chunks]), self.expected)
+        np.testing.assert_array_equal(reader.get_frames([5])[0], self.expected[5])
+        with self.assertRaises(ValueError):
+            reader.frames
+        # The frame index covers the uncompressed bytes, so it still applies
+        self.assertTrue(verify_frame_index(reader).ok)
+
+        extract_frame_file(reader, delete_archive=True)
+        self.assertEqual(self.path.read_bytes(), source)
+        self.assertFalse(frame_archive_path(self.path).exists())
+        self.assertIsNone(self.stream.read().archive)
+
+    def test_checks_frame_index(self):
+        write_frame_index(self.stream.read())
+        # Corrupt the source after it was indexed
+        with open(self.path, "r+b") as f:
+            f.seek(100)
+            f.write(b"\xff\xff")
+        with self.assertRaisesRegex(IOError, "frame index"):
+            archive_frame_file(self.stream.read(), frames_per_block=4, delete_source=True)
+        self.assertTrue(self.path.exists())
+        self.assertFalse(frame_archive_path(self.path).exists())
+
+    def test_archive_session(self):
+        spec = SyntheticSessionSpec(duration_s=3, n_fibers=2, frame_shape=(32, 40))
+        epoch = generate_session(self.root / "session", spec)[0]
+        expected = dataset(epoch)["raw_red"].data.read_frames(slice(None))
+        written = archive_frame_files(self.root / "session", workers=2)
+        self.assertEqual(len(written), 6)
+        self.assertEqual(archive_frame_files(self.root / "session"), [])
+        # Raw frame files are only deleted on request, and are read while they exist
+        self.assertEqual(len(list(epoch.glob("*.bin"))), 6)
+        self.assertIsNone(dataset(epoch)["raw_red"].data.archive)
+        for path in epoch.glob("*.bin"):
+            path.unlink()
+        np.testing.assert_array_equal(dataset(epoch)["raw_red"].data.read_frames(slice(None)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
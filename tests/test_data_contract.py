@@ -0,0 +1,207 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aind_physiology_fip.data_cache import build_columnar_caches
+from aind_physiology_fip.data_contract import (
+    CachedCsv,
+    FipFrameReader,
+    FipRawFrame,
+    StreamCache,
+    _FipFrameReaderParams,
+    columnar_cache_path,
+    dataset,
+    is_columnar_cache_fresh,
+)
+
+
+def _write_frames(path: Path, frames: np.ndarray) -> None:
+    # Frames are (n, height, width); the acquisition writes them column-major
+    np.ascontiguousarray(frames.transpose(0, 2, 1)).tofile(path)
+    with open(str(path).replace(".bin", "_metadata.json"), "w", encoding="utf-8") as f:
+        json.dump({"Width": frames.shape[2], "Height": frames.shape[1], "Channels": 1, "Layout": 1, "Depth": "U16"}, f)
+
+
+class TestFipFrameReader(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        rng = np.random.default_rng(42)
+        self.expected = rng.integers(0, 2**16, size=(25, 12, 16), dtype=np.uint16)
+        self.path = self.root / "green.bin"
+        _write_frames(self.path, self.expected)
+        self.reader = FipRawFrame("raw_green", reader_params=FipRawFrame.make_params(path=self.path)).read()
+
+    def tearDown(self):
+        self.reader.close()
+        self._tmp.cleanup()
+
+    def test_frames_view(self):
+        frames = self.reader.frames
+        self.assertEqual(frames.shape, self.expected.shape)
+        np.testing.assert_array_equal(frames, self.expected)
+        np.testing.assert_array_equal(frames[3:9:2], self.expected[3:9:2])
+        np.testing.assert_array_equal(frames[[7, 1, 20]], self.expected[[7, 1, 20]])
+
+    def test_get_frames(self):
+        frames = self.reader.get_frames([0, 24, 5])
+        for frame, idx in zip(frames, [0, 24, 5]):
+            np.testing.assert_array_equal(frame, self.expected[idx])
+        # Frames are copies that can be modified without touching the file
+        frames[0][:] = 0
+        np.testing.assert_array_equal(frames[1], self.expected[24])
+        # The file is not left memory-mapped
+        self.assertIsNone(self.reader._memmap)
+        self.assertFalse(np.shares_memory(frames[1], self.reader.frames))
+        np.testing.assert_array_equal(self.reader.frames[0], self.expected[0])
+
+    def test_read_frames_slices_and_ranges(self):
+        np.testing.assert_array_equal(self.reader.read_frames(slice(None)), self.expected)
+        np.testing.assert_array_equal(self.reader.read_frames(slice(2, None, 5)), self.expected[2::5])
+        np.testing.assert_array_equal(self.reader.read_frames(range(10, 20)), self.expected[10:20])
+        np.testing.assert_array_equal(self.reader.read_frames(slice(-3, None)), self.expected[-3:])
+
+    def test_read_frames_indices(self):
+        indices = [20, 3, 4, 5, 3, 24, -1, 0]
+        np.testing.assert_array_equal(self.reader.read_frames(indices), self.expected[indices])
+        for max_gap in (1, 4, 100):
+            np.testing.assert_array_equal(self.reader.read_frames(indices, max_gap=max_gap), self.expected[indices])
+        self.assertEqual(self.reader.read_frames([]).shape, (0, 12, 16))
+        with self.assertRaises(IndexError):
+            self.reader.read_frames([25])
+
+    def test_iter_chunks(self):
+        for prefetch in (0, 2):
+            chunks = list(self.reader.iter_chunks(7, prefetch=prefetch))
+            self.assertEqual([first for first, _ in chunks], [0, 7, 14, 21])
+            np.testing.assert_array_equal(np.concatenate([frames for _, frames in chunks]), self.expected)
+
+        chunks = list(self.reader.iter_chunks(100, start=5, stop=-5, max_memory_bytes=4 * self.reader.frame_size_bytes))
+        self.assertTrue(all(len(frames) <= 4 for _, frames in chunks))
+        np.testing.assert_array_equal(np.concatenate([frames for _, frames in chunks]), self.expected[5:-5])
+
+    def test_iter_chunks_invalid_arguments(self):
+        # Rejected by the call itself, before anything is iterated
+        for kwargs in (
+            {"chunk_size": 0},
+            {"prefetch": -1},
+            {"max_memory_bytes": self.reader.frame_size_bytes, "prefetch": 1},
+        ):
+            with self.subTest(**kwargs), self.assertRaises(ValueError):
+                self.reader.iter_chunks(**kwargs)
+
+    def test_iter_chunks_early_exit(self):
+        iterator = self.reader.iter_chunks(1, prefetch=1)
+        first, frames = next(iterator)
+        self.assertEqual(first, 0)
+        iterator.close()
+
+    def test_row_major(self):
+        path = self.root / "row_major.bin"
+        self.expected.tofile(path)
+        reader = FipFrameReader(
+            _FipFrameReaderParams(path=path, layout="row_major", bit_depth=np.uint16, width=16, height=12)
+        )
+        np.testing.assert_array_equal(reader.frames, self.expected)
+        reader.close()
+
+    def test_truncated_and_empty_files(self):
+        with open(self.path, "ab") as f:
+            f.write(b"\x00" * 10)
+        self.reader.close()
+        self.assertEqual(self.reader.number_of_frames, 25)
+        np.testing.assert_array_equal(self.reader.frames[-1], self.expected[-1])
+
+        empty = self.root / "empty.bin"
+        empty.touch()
+        reader = FipFrameReader(_FipFrameReaderParams(path=empty, width=16, height=12))
+        self.assertEqual(reader.frames.shape, (0, 12, 16))
+
+
+class TestCachedCsv(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        for name in ("green", "iso", "red"):
+            pd.DataFrame(
+                {"ReferenceTime": np.arange(100) / 20, "CameraFrameNumber": np.arange(100), "Fiber_0": 1.0}
+            ).to_csv(self.root / f"{name}.csv", index=False)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_column_projection(self):
+        stream = dataset(self.root)["green"]
+        self.assertIsInstance(stream, CachedCsv)
+        stream.require_columns(["CameraFrameNumber"]).require_columns([])
+        self.assertEqual(list(stream.data.columns), ["CameraFrameNumber"])
+        self.assertEqual(stream.data.index.name, "ReferenceTime")
+        first = stream.data
+        self.assertIs(stream.data, first)
+
+        stream.require_columns(["Fiber_0"])
+        self.assertEqual(list(stream.data.columns), ["CameraFrameNumber", "Fiber_0"])
+        stream.require_columns(None)
+        stream.require_columns(["CameraFrameNumber"])
+        self.assertEqual(list(stream.data.columns), ["CameraFrameNumber", "Fiber_0"])
+
+    def test_memory_budget(self):
+        cache = StreamCache(max_bytes=4000)
+        fip_dataset = dataset(self.root, cache=cache)
+        green, iso = fip_dataset["green"], fip_dataset["iso"]
+        green_data = green.data
+        iso.load()
+        self.assertLessEqual(cache.nbytes, 4000)
+        self.assertTrue(green.has_data)
+        pd.testing.assert_frame_equal(green.data, green_data)
+
+        cache.invalidate()
+        self.assertEqual(cache.nbytes, 0)
+        self.assertFalse(green.has_data)
+        # Invalidating streams that are not cached does nothing
+        cache.invalidate("green")
+        cache.invalidate("not_a_stream")
+
+    def test_columnar_cache(self):
+        csv_path = self.root / "green.csv"
+        expected = dataset(self.root)["green"].data
+        stream = dataset(self.root, columnar_cache=True)["green"]
+        pd.testing.assert_frame_equal(stream.data, expected)
+        cache_path = columnar_cache_path(csv_path)
+        self.assertTrue(cache_path.exists())
+        self.assertTrue(is_columnar_cache_fresh(stream.reader_params))
+
+        written = cache_path.stat().st_mtime_ns
+        stream = dataset(self.root, columnar_cache=True)["green"]
+        stream.require_columns(["Fiber_0"])
+        self.assertEqual(list(stream.data.columns), ["Fiber_0"])
+        self.assertEqual(stream.data.index.name, "ReferenceTime")
+        self.assertEqual(cache_path.stat().st_mtime_ns, written)
+
+        pd.DataFrame({"ReferenceTime": [0.0], "CameraFrameNumber": [7], "Fiber_0": [2.0]}).to_csv(csv_path, index=False)
+        self.assertFalse(is_columnar_cache_fresh(stream.reader_params))
+        stream = dataset(self.root, columnar_cache=True)["green"]
+        self.assertEqual(stream.data["CameraFrameNumber"].tolist(), [7])
+        self.assertTrue(is_columnar_cache_fresh(stream.reader_params))
+
+    def test_build_columnar_caches(self):
+        session = self.root / "session"
+        session.mkdir()
+        (self.root / "red.csv").rename(session / "red.csv")
+        written = build_columnar_caches(self.root)
+        self.assertEqual(
+            sorted(written),
+            sorted(
+                columnar_cache_path(p) for p in [self.root / "green.csv", self.root / "iso.csv", session / "red.csv"]
+            ),
+        )
+        self.assertEqual(build_columnar_caches(self.root), [])
+        self.assertEqual(len(build_columnar_caches(self.root, force=True)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import zarr
+
+from aind_physiology_fip.data_archive import archive_frame_files
+from aind_physiology_fip.data_contract import dataset
+from aind_physiology_fip.data_export import export_zarr, frame_chunks
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+
+class TestFrameChunks(unittest.TestCase):
+    def test_shapes(self):
+        chunks, shards = frame_chunks((200, 200), 2)
+        self.assertEqual(chunks, (64, 32, 32))
+        # Shards hold whole frames and a whole number of chunks
+        self.assertEqual(shards[1:], (224, 224))
+        self.assertEqual(shards[0] % chunks[0], 0)
+        self.assertEqual(frame_chunks((20, 8), 1, tile=32, chunk_bytes=1600), ((10, 20, 8), (419430, 20, 8)))
+
+
+class TestZarrExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        spec = SyntheticSessionSpec(duration_s=4, n_fibers=2, frame_shape=(48, 40))
+        cls.epoch = generate_session(cls.root, spec)[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_export(self):
+        fip_dataset = dataset(self.epoch)
+        output = export_zarr(self.epoch, self.root / "frames.zarr", chunk_bytes=2**12, workers=2)
+        store = zarr.open_group(output, mode="r")
+        self.assertEqual(
+            sorted(store.group_keys()),
+            ["background_green", "background_iso", "background_red", "green", "iso", "red"],
+        )
+        self.assertEqual(len(store.attrs["roi_settings"]["camera_red_roi"]), 2)
+
+        green = store["green"]
+        frames = green["frames"]
+        self.assertEqual(frames.metadata.dimension_names, ("time", "y", "x"))
+        self.assertEqual(frames.chunks, (2, 32, 32))
+        np.testing.assert_array_equal(frames[:], fip_dataset["raw_green"].data.read_frames(slice(None)))
+        np.testing.assert_array_equal(green["reference_time"][:], fip_dataset["green"].data.index.to_numpy())
+        self.assertEqual(green.attrs["camera_metadata"]["Width"], 40)
+        self.assertEqual(len(green.attrs["roi"]), 2)
+        self.assertIn("camera", green.attrs)
+
+        with self.assertRaises(FileExistsError):
+            export_zarr(self.epoch, output)
+
+    def test_export_archived(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spec = SyntheticSessionSpec(duration_s=2, n_fibers=1, frame_shape=(32, 32), seed=1)
+            epoch = generate_session(tmp, spec)[0]
+            expected = dataset(epoch)["raw_iso"].data.read_frames(slice(None))
+            archive_frame_files(tmp, delete_source=True)
+            output = export_zarr(epoch, channels=["iso"])
+            self.assertEqual(output, epoch / "frames.zarr")
+            store = zarr.open_group(output, mode="r")
+            self.assertEqual(list(store.group_keys()), ["iso"])
+            np.testing.assert_array_equal(store["iso/frames"][:], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
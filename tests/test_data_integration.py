@@ -0,0 +1,174 @@
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from aind_behavior_services.common import Circle, Point2f
+from contraqctor.qc import Status
+
+from aind_physiology_fip.data_contract import dataset
+from aind_physiology_fip.data_integration import RoiPixelIndex, reintegrate_channel, sample_roi_statistics
+from aind_physiology_fip.data_qc import FipRawImageTestSuite
+from aind_physiology_fip.rig import RoiSettings
+
+from .test_data_contract import _write_frames
+
+
+def _naive_mean(frame: np.ndarray, circle: Circle) -> float:
+    h, w = frame.shape
+    y, x = np.ogrid[:h, :w]
+    mask = (x - circle.center.x) ** 2 + (y - circle.center.y) ** 2 <= circle.radius**2
+    return frame[mask].mean() if mask.any() else np.nan
+
+
+class TestRoiPixelIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.frames = rng.integers(0, 4096, size=(9, 30, 40), dtype=np.uint16)
+        self.circles = [
+            Circle(center=Point2f(x=5, y=5), radius=5),
+            Circle(center=Point2f(x=20.5, y=14.2), radius=7.3),
+            Circle(center=Point2f(x=39, y=29), radius=4),  # clipped by the frame edge
+            Circle(center=Point2f(x=-50, y=-50), radius=2),  # outside the frame
+        ]
+
+    def test_integrate_matches_full_frame_mask(self):
+        index = RoiPixelIndex.from_circles(self.circles, self.frames.shape[1:])
+        expected = np.array([[_naive_mean(frame, c) for c in self.circles] for frame in self.frames])
+        np.testing.assert_allclose(index.integrate(self.frames), expected)
+        # Column-major storage is gathered without copying back to row-major
+        column_major = np.ascontiguousarray(self.frames.transpose(0, 2, 1)).transpose(0, 2, 1)
+        np.testing.assert_allclose(index.integrate(column_major), expected)
+
+    def test_statistics(self):
+        index = RoiPixelIndex.from_circles(self.circles, self.frames.shape[1:])
+        mean, std = index.statistics(self.frames)
+        np.testing.assert_allclose(mean, index.integrate(self.frames))
+        for j in range(3):
+            np.testing.assert_allclose(std[:, j], [np.std(index.pixels(frame, j)) for frame in self.frames])
+        self.assertTrue(np.isnan(std[:, 3]).all())
+
+    def test_cached_index(self):
+        index = RoiPixelIndex.from_circles(self.circles, self.frames.shape[1:])
+        same = RoiPixelIndex.from_circles([c.model_copy(deep=True) for c in self.circles], (30, 40))
+        self.assertIs(index, same)
+        self.assertEqual(len({index, RoiPixelIndex._build(index.key)}), 1)
+        self.assertNotEqual(index, RoiPixelIndex.from_circles(self.circles, (40, 30)))
+        with self.assertRaises(ValueError):
+            index.rows[0] = 0
+
+        np.testing.assert_array_equal(
+            index.bounding_boxes, [[0, 11, 0, 11], [7, 22, 14, 28], [25, 30, 35, 40], [0, 0, 0, 0]]
+        )
+
+        settings = RoiSettings(camera_green_iso_background=self.circles[0], camera_green_iso_roi=self.circles[1:])
+        self.assertIs(RoiPixelIndex.from_settings(settings, "iso", (30, 40)), index)
+
+    def test_shape_mismatch(self):
+        index = RoiPixelIndex.from_circles(self.circles, (10, 10))
+        with self.assertRaises(ValueError):
+            index.integrate(self.frames)
+
+
+class TestReintegrateChannel(unittest.TestCase):
+    def test_reintegrate_channel(self):
+        rng = np.random.default_rng(1)
+        frames = rng.integers(0, 4096, size=(50, 64, 48), dtype=np.uint16)
+        settings = RoiSettings(
+            camera_green_iso_background=Circle(center=Point2f(x=5, y=5), radius=4),
+            camera_green_iso_roi=[
+                Circle(center=Point2f(x=20, y=20), radius=6),
+                Circle(center=Point2f(x=30, y=50), radius=8),
+            ],
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write_frames(root / "green.bin", frames)
+            pd.DataFrame(
+                {
+                    "ReferenceTime": np.arange(50) / 20,
+                    "CameraFrameNumber": np.arange(50) * 2,
+                    "CameraFrameTime": np.arange(50) * 10**8,
+                    "Background": 0.0,
+                    "Fiber_0": 0.0,
+                    "Fiber_1": 0.0,
+                }
+            ).to_csv(root / "green.csv", index=False)
+            (root / "regions.json").write_text(settings.model_dump_json(), encoding="utf-8")
+
+            table = reintegrate_channel(dataset(root), "green", chunk_size=16)
+
+        circles = [settings.camera_green_iso_background, *settings.camera_green_iso_roi]
+        expected = np.array([[_naive_mean(frame, c) for c in circles] for frame in frames])
+        self.assertEqual(
+            list(table.columns), ["CameraFrameNumber", "CameraFrameTime", "Background", "Fiber_0", "Fiber_1"]
+        )
+        self.assertEqual(table.index.name, "ReferenceTime")
+        np.testing.assert_allclose(table[["Background", "Fiber_0", "Fiber_1"]].values, expected)
+
+
+class TestRoiTemporalStability(unittest.TestCase):
+    def test_bleaching(self):
+        n = 600
+        rng = np.random.default_rng(2)
+        decay = np.exp(-np.arange(n) / 400)
+        frames = (1000 + 1000 * decay[:, None, None] + rng.normal(0, 5, size=(n, 40, 40))).astype(np.uint16)
+        background = Circle(center=Point2f(x=5, y=5), radius=4)
+        regions = [Circle(center=Point2f(x=20, y=20), radius=6)]
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write_frames(root / "green.bin", frames)
+            pd.DataFrame({"ReferenceTime": np.arange(n) / 20, "Background": 0.0, "Fiber_0": 0.0}).to_csv(
+                root / "green.csv", index=False
+            )
+            fip_dataset = dataset(root)
+
+            sampled, _ = sample_roi_statistics(fip_dataset["raw_green"].data, [background, *regions], [0, 10, 599])
+            np.testing.assert_allclose(sampled[:, 1], [_naive_mean(frames[i], regions[0]) for i in (0, 10, 599)])
+
+            suite = FipRawImageTestSuite(fip_dataset["raw_green"], fip_dataset["green"], background, regions)
+            self.assertEqual(suite.test_roi_temporal_stability().status, Status.SKIPPED)
+            suite.sample_period_s = 1.0
+            result = suite.test_roi_temporal_stability()
+            self.assertEqual(result.status, Status.PASSED)
+            # One frame per second over 30 s
+            self.assertEqual(result.context["metrics"]["n_samples"], 31)
+            self.assertGreater(result.context["metrics"]["roi_0_bleaching"], 0.3)
+            self.assertLess(result.context["metrics"]["roi_0_drift_per_hour"], 0)
+
+            suite.max_bleaching = 0.1
+            self.assertEqual(suite.test_roi_temporal_stability().status, Status.FAILED)
+            suite.sample_period_s = None
+            self.assertEqual(suite.test_roi_temporal_stability().status, Status.SKIPPED)
+
+    def test_dark_regions(self):
+        n = 100
+        rng = np.random.default_rng(3)
+        frames = np.full((n, 40, 40), 1000, dtype=np.uint16)
+        # Noisy dark background and a region that never receives light
+        frames[:, :10, :10] = rng.integers(0, 20, size=(n, 10, 10))
+        frames[:, 30:, 30:] = 0
+        background = Circle(center=Point2f(x=5, y=5), radius=4)
+        regions = [Circle(center=Point2f(x=20, y=20), radius=6), Circle(center=Point2f(x=35, y=35), radius=4)]
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _write_frames(root / "green.bin", frames)
+            pd.DataFrame({"ReferenceTime": np.arange(n) / 20, "Background": 0.0, "Fiber_0": 0.0}).to_csv(
+                root / "green.csv", index=False
+            )
+            fip_dataset = dataset(root)
+            suite = FipRawImageTestSuite(
+                fip_dataset["raw_green"], fip_dataset["green"], background, regions, sample_period_s=0.5
+            )
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", RuntimeWarning)
+                result = suite.test_roi_temporal_stability()
+            self.assertEqual(result.status, Status.PASSED)
+            self.assertGreater(result.context["metrics"]["background_cv_median"], suite.cv_threshold)
+            self.assertEqual(result.context["metrics"]["roi_1_cv_max"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from aind_physiology_fip.data_contract import FipRawFrame, dataset
+from aind_physiology_fip.data_integrity import (
+    FrameIndex,
+    build_frame_index,
+    check_frame_stats,
+    frame_index_path,
+    load_frame_index,
+    verify_frame_index,
+    verify_frame_indexes,
+    write_frame_index,
+    write_frame_indexes,
+)
+from aind_physiology_fip.data_qc import FipRawImageTestSuite
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+from tests.test_data_contract import _write_frames
+
+
+class TestFrameIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        rng = np.random.default_rng(7)
+        self.frames = rng.integers(0, 2**16, size=(25, 12, 16), dtype=np.uint16)
+        self.path = self.root / "green.bin"
+        _write_frames(self.path, self.frames)
+        self.reader = FipRawFrame("raw_green", reader_params=FipRawFrame.make_params(path=self.path)).read()
+
+    def tearDown(self):
+        self.reader.close()
+        self._tmp.cleanup()
+
+    def _corrupt(self, frame: int) -> None:
+        with open(self.path, "r+b") as f:
+            f.seek(frame * self.reader.frame_size_bytes + 5)
+            byte = f.read(1)
+            f.seek(-1, 1)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+    def test_build_and_roundtrip(self):
+        index = build_frame_index(self.reader, frames_per_block=4)
+        self.assertEqual(index.n_frames, 25)
+        self.assertEqual(index.n_blocks, 7)
+        self.assertEqual(index.block_frames(6), (24, 25))
+        np.testing.assert_array_equal(index.frame_min, self.frames.reshape(25, -1).min(axis=1))
+        np.testing.assert_array_equal(index.frame_max, self.frames.reshape(25, -1).max(axis=1))
+        np.testing.assert_allclose(index.frame_mean, self.frames.reshape(25, -1).mean(axis=1))
+
+        loaded = FrameIndex.load(index.save(frame_index_path(self.path)))
+        np.testing.assert_array_equal(loaded.block_checksums, index.block_checksums)
+        self.assertEqual(loaded.file_size, index.file_size)
+        self.assertTrue(verify_frame_index(self.reader, loaded).ok)
+
+    def test_detects_corruption(self):
+        index = build_frame_index(self.reader, frames_per_block=4)
+        self._corrupt(10)
+        report = verify_frame_index(self.reader, index)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.bad_blocks.tolist(), [2])
+        self.assertEqual(report.bad_frames(), [(8, 12)])
+        # Incremental verification only reads the requested blocks
+        partial = verify_frame_index(self.reader, index, blocks=range(3, 7))
+        self.assertTrue(partial.ok)
+        self.assertEqual(partial.checked_blocks, 4)
+        # Frames that are read anyway can be checked against their statistics
+        sample = np.array([0, 10, 20])
+        self.assertEqual(check_frame_stats(index, sample, self.reader.read_frames(sample)).tolist(), [10])
+
+    def test_detects_truncation(self):
+        index = build_frame_index(self.reader, frames_per_block=4)
+        with open(self.path, "r+b") as f:
+            f.truncate(index.file_size - self.reader.frame_size_bytes * 6 - 3)
+        report = verify_frame_index(self.reader, index)
+        self.assertEqual(report.missing_bytes, self.reader.frame_size_bytes * 6 + 3)
+        self.assertEqual(report.bad_blocks.tolist(), [4, 5, 6])
+
+    def test_extends_appended_frames(self):
+        self.assertIsNotNone(write_frame_index(self.reader))
+        self.assertIsNone(write_frame_index(self.reader))
+        index = load_frame_index(self.path)
+        extra = np.ones((3, 12, 16), dtype=np.uint16)
+        with open(self.path, "ab") as f:
+            np.ascontiguousarray(extra.transpose(0, 2, 1)).tofile(f)
+        report = verify_frame_index(self.reader, index)
+        self.assertFalse(report.ok)
+        self.assertEqual(report.appended_bytes, extra.nbytes)
+        self.assertEqual(len(report.bad_blocks), 0)
+
+        write_frame_index(self.reader)
+        extended = load_frame_index(self.path)
+        self.assertEqual(extended.n_frames, 28)
+        np.testing.assert_array_equal(extended.frame_max[25:], [1, 1, 1])
+        rebuilt = build_frame_index(self.reader)
+        np.testing.assert_array_equal(extended.block_checksums, rebuilt.block_checksums)
+        self.assertTrue(verify_frame_index(self.reader).ok)
+
+
+class TestFrameIntegritySuite(unittest.TestCase):
+    def test_session(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            spec = SyntheticSessionSpec(duration_s=5, n_fibers=2, frame_shape=(32, 40))
+            epoch = generate_session(root, spec)[0]
+            self.assertEqual(verify_frame_indexes(root), [])
+            written = write_frame_indexes(root, workers=2)
+            # Color and background frames of every channel
+            self.assertEqual(len(written), 6)
+            self.assertTrue(all(report.ok for report in verify_frame_indexes(root)))
+
+            fip_dataset = dataset(epoch)
+            roi = fip_dataset["regions"].data
+            suite = FipRawImageTestSuite(
+                fip_dataset["raw_green"],
+                fip_dataset["green"],
+                roi.camera_green_iso_background,
+                roi.camera_green_iso_roi,
+            )
+            result = next(suite.run_test(suite.test_frame_integrity))
+            self.assertEqual(result.status.name, "PASSED", result.message)
+
+            with open(epoch / "green.bin", "ab") as f:
+                f.write(b"\0" * 7)
+            result = next(suite.run_test(suite.test_frame_integrity))
+            self.assertEqual(result.status.name, "FAILED")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather
+
+from aind_physiology_fip.data_contract import dataset
+from aind_physiology_fip.data_processing import DFF_METADATA_KEY, DffStage, IsosbesticFit, process_channel
+
+
+def _channel(times: np.ndarray, fibers: np.ndarray, background: float = 260.0) -> pd.DataFrame:
+    table = pd.DataFrame(
+        {"CameraFrameNumber": np.arange(len(times)), "CameraFrameTime": (times * 1e9).astype(np.int64)},
+        index=pd.Index(times, name="ReferenceTime"),
+    )
+    table["Background"] = background
+    for j in range(fibers.shape[1]):
+        table[f"Fiber_{j}"] = fibers[:, j] + background
+    return table
+
+
+class TestDffStage(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 1000
+        self.times = np.arange(n) / 20
+        # Shared motion/bleaching artifact seen by both channels, plus a transient in the signal only
+        artifact = 500 + 100 * np.exp(-self.times / 20)[:, None] + rng.normal(0, 5, size=(n, 2))
+        self.slope, self.intercept = np.array([1.5, 0.8]), np.array([100.0, 300.0])
+        self.transient = np.zeros((n, 2))
+        self.transient[400:420] = 50.0
+        expected = artifact * self.slope + self.intercept
+        self.iso = _channel(self.times + 1 / 60, artifact)
+        self.signal = _channel(self.times, expected + self.transient)
+        self.expected = expected
+
+    def test_isosbestic(self):
+        stage = DffStage(chunk_size=128)
+        fibers, fit, _ = stage.blocks(self.signal, self.iso)
+        self.assertEqual(fibers, ["Fiber_0", "Fiber_1"])
+        np.testing.assert_allclose(fit.slope, self.slope, rtol=0.02)
+        dff = stage.run(self.signal, self.iso)
+        self.assertEqual(list(dff.columns), fibers)
+        np.testing.assert_array_equal(dff.index.values, self.times)
+        np.testing.assert_allclose(dff.values[400:420], (self.transient / self.expected)[400:420], atol=0.01)
+        self.assertLess(np.abs(dff.values[:400]).max(), 0.01)
+
+        # Chunked fits merge to the single-block fit
+        single = IsosbesticFit.from_values(self.iso[fibers].values - 260, self.signal[fibers].values - 260)
+        np.testing.assert_allclose(fit.slope, single.slope)
+        np.testing.assert_allclose(fit.intercept, single.intercept)
+
+    def test_unmatched_isosbestic(self):
+        dff = DffStage().run(self.signal, self.iso.drop(self.iso.index[10]))
+        self.assertTrue(dff.iloc[10].isna().all())
+        self.assertEqual(dff.isna().sum().sum(), 2)
+
+    def test_rolling(self):
+        dff = DffStage(baseline="rolling", baseline_window_s=5.0).run(self.signal)
+        self.assertGreater(dff.values[405:415].min(), 0.03)
+        self.assertLess(np.abs(np.median(dff.values, axis=0)).max(), 0.01)
+        with self.assertRaises(ValueError):
+            DffStage().run(self.signal)
+
+    def test_process_channel(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.signal.to_csv(root / "green.csv")
+            self.iso.to_csv(root / "iso.csv")
+            path = process_channel(dataset(root), "green", root, chunk_size=100)
+            self.assertEqual(path.name, "green_dff.arrow")
+            written = pd.read_feather(path).set_index("ReferenceTime")
+            metadata = json.loads(pyarrow.feather.read_table(path).schema.metadata[DFF_METADATA_KEY])
+        pd.testing.assert_frame_equal(written, DffStage().run(self.signal, self.iso))
+        self.assertEqual(metadata["baseline"], "isosbestic")
+        self.assertAlmostEqual(metadata["fit"]["Fiber_0"]["slope"], 1.5, delta=0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_physiology_fip.data_contract import StreamCache, dataset
+from aind_physiology_fip.data_qc import _run_tests
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+
+def _summary(results):
+    return [
+        (group, [(r.suite_name, r.test_name, r.status.name) for r in group_results])
+        for group, group_results in results.items()
+    ]
+
+
+class TestRunTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        cls.epoch = generate_session(cls.root, SyntheticSessionSpec(duration_s=5, n_fibers=2, frame_shape=(48, 48)))[0]
+        cls.serial = cls._run()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    @classmethod
+    def _run(cls, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return _run_tests(dataset(cls.epoch), **kwargs)
+
+    def test_declared_columns(self):
+        fip_dataset = dataset(self.epoch, cache=StreamCache())
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = _run_tests(fip_dataset)
+        self.assertEqual(_summary(results), _summary(self.serial))
+        # Streams only read by the csv suites are parsed without their columns
+        for name in ("background_green", "camera_green_iso_metadata"):
+            self.assertEqual(list(fip_dataset[name].data.columns), [])
+            self.assertEqual(fip_dataset[name].data.index.name, "ReferenceTime")
+        self.assertIn("Fiber_0", fip_dataset["green"].data.columns)
+
+    def test_sensor_floor_context(self):
+        results = [r for group in self.serial.values() for r in group if r.test_name == "test_sensor_floor"]
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertEqual(set(result.context), {"asset", "metrics"})
+            self.assertLessEqual(result.context["asset"].asset.counts.size, 100)
+
+    def test_channel_workers(self):
+        parallel = self._run(data_path=self.epoch, channel_workers=2)
+        self.assertEqual(_summary(parallel), _summary(self.serial))
+
+    def test_jobs(self):
+        concurrent = self._run(jobs=4)
+        self.assertEqual(_summary(concurrent), _summary(self.serial))
+        self.assertEqual(_summary(self._run(jobs=4, data_path=self.epoch, channel_workers=3)), _summary(self.serial))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import tempfile
+import typing as t
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from contraqctor.qc import Suite
+
+from aind_physiology_fip import data_qc_cache
+from aind_physiology_fip.data_contract import FipRawFrame, dataset
+from aind_physiology_fip.data_integrity import write_frame_index
+from aind_physiology_fip.data_qc import (
+    FipChannelSignalTestSuite,
+    FipRawImageTestSuite,
+    _save_assets,
+    _SuiteScheduler,
+    get_channel_rois,
+)
+from aind_physiology_fip.data_qc_cache import QcResultCache, suite_key
+from aind_physiology_fip.data_qc_helpers import SensorFloorPlotSpec
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+
+class _CountingSuite(Suite):
+    runs = 0
+
+    def __init__(self, stream, threshold: float = 1.0) -> None:
+        self.stream = stream
+        self.threshold = threshold
+
+    def test_threshold(self):
+        type(self).runs += 1
+        if self.stream.data["Fiber_0"].max() > self.threshold:
+            return self.fail_test(None, "Above threshold.", context={"metrics": {"max": 2.0}})
+        return self.pass_test(None, "Below threshold.")
+
+
+class TestQcResultCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.session = self.root / "session"
+        self.session.mkdir()
+        for name in ("green", "iso", "red"):
+            self._write_channel(self.session / f"{name}.csv", 1.0)
+        _CountingSuite.runs = 0
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    @staticmethod
+    def _write_channel(path: Path, value: float) -> None:
+        pd.DataFrame({"ReferenceTime": np.arange(10) / 20, "Background": 1.0, "Fiber_0": value}).to_csv(
+            path, index=False
+        )
+
+    def test_suite_key(self):
+        green = dataset(self.session)["green"]
+        key = suite_key(_CountingSuite(green))
+        self.assertEqual(key, suite_key(_CountingSuite(dataset(self.session)["green"])))
+        self.assertNotEqual(key, suite_key(_CountingSuite(green, threshold=2.0)))
+        self.assertNotEqual(key, suite_key(_CountingSuite(dataset(self.session)["iso"])))
+        with mock.patch.object(data_qc_cache, "__semver__", "0.0.0"):
+            self.assertNotEqual(key, suite_key(_CountingSuite(green)))
+
+        mtime = (self.session / "green.csv").stat().st_mtime_ns + 10**9
+        os.utime(self.session / "green.csv", ns=(mtime, mtime))
+        self.assertNotEqual(key, suite_key(_CountingSuite(green)))
+
+        # Content addressed keys are shared by identical copies of a session
+        copy = self.root / "copy"
+        copy.mkdir()
+        for name in ("green", "iso", "red"):
+            self._write_channel(copy / f"{name}.csv", 1.0)
+        self.assertEqual(
+            suite_key(_CountingSuite(green), with_hash=True),
+            suite_key(_CountingSuite(dataset(copy)["green"]), with_hash=True),
+        )
+
+    def test_uncacheable_suite(self):
+        suite = _CountingSuite(dataset(self.session)["green"])
+        suite.threshold = object()
+        self.assertIsNone(suite_key(suite))
+
+    def test_replay(self):
+        cache = QcResultCache(self.root / "cache")
+
+        def run():
+            runner = _SuiteScheduler(1, result_cache=cache)
+            runner.add_suite(_CountingSuite(dataset(self.session)["green"]), "green")
+            runner.add_suite(FipChannelSignalTestSuite(dataset(self.session)["iso"]), "iso")
+            all_cached = runner.lookup_cached_results()
+            return all_cached, runner.run_all()
+
+        all_cached, results = run()
+        self.assertFalse(all_cached)
+        self.assertEqual(_CountingSuite.runs, 1)
+
+        all_cached, replayed = run()
+        self.assertTrue(all_cached)
+        self.assertEqual(_CountingSuite.runs, 1)
+        self.assertEqual(
+            [(r.suite_name, r.test_name, r.status, r.message) for group in replayed.values() for r in group],
+            [(r.suite_name, r.test_name, r.status, r.message) for group in results.values() for r in group],
+        )
+
+        self._write_channel(self.session / "green.csv", 30.0)
+        all_cached, results = run()
+        self.assertFalse(all_cached)
+        self.assertEqual(_CountingSuite.runs, 2)
+        self.assertEqual(results["green"][0].context["metrics"], {"max": 2.0})
+
+    def test_replayed_assets(self):
+        cache = QcResultCache(self.root / "cache")
+        for _ in range(2):
+            runner = _SuiteScheduler(1, result_cache=cache)
+            runner.add_suite(FipChannelSignalTestSuite(dataset(self.session)["iso"]), "iso")
+            runner.lookup_cached_results()
+            results = runner.run_all()
+        (floor,) = [r for r in results["iso"] if r.test_name == "test_sensor_floor"]
+        # Figures are recorded as specs and only rendered on export
+        self.assertIsInstance(floor.context["asset"].asset, SensorFloorPlotSpec)
+        _save_assets(results, self.root / "assets")
+        self.assertEqual(len(list((self.root / "assets").glob("FipChannelSignalTestSuite_test_sensor_floor_*.png"))), 1)
+
+    def test_raw_frame_sidecars(self):
+        epoch = generate_session(self.root, SyntheticSessionSpec(duration_s=2, n_fibers=1, frame_shape=(32, 32)))[0]
+        cache = QcResultCache(self.root / "cache")
+
+        def run():
+            fip_dataset = dataset(epoch)
+            raw_green = t.cast(FipRawFrame, fip_dataset["raw_green"])
+            background, regions = get_channel_rois(fip_dataset["regions"].data, "green")
+            runner = _SuiteScheduler(1, result_cache=cache)
+            runner.add_suite(FipRawImageTestSuite(raw_green, fip_dataset["green"], background, regions), "green")
+            all_cached = runner.lookup_cached_results()
+            (integrity,) = [r for r in runner.run_all()["green"] if r.test_name == "test_frame_integrity"]
+            return all_cached, integrity.status.name, raw_green
+
+        self.assertEqual(run()[:2], (False, "SKIPPED"))
+        all_cached, _, raw_green = run()
+        self.assertTrue(all_cached)
+
+        # Building the frame index invalidates the cached result
+        write_frame_index(raw_green.data)
+        raw_green.data.close()
+        self.assertEqual(run()[:2], (False, "PASSED"))
+        self.assertTrue(run()[0])
+
+        metadata = FipRawFrame.metadata_path(raw_green.reader_params)
+        mtime = metadata.stat().st_mtime_ns + 10**9
+        os.utime(metadata, ns=(mtime, mtime))
+        self.assertFalse(run()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from aind_physiology_fip.data_qc_helpers import SensorFloorPlotSpec, SensorFloorSummary
+
+
+class TestSensorFloorSummary(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.values = np.concatenate([rng.normal(262, 2, 5000), rng.normal(900, 50, 500)])
+
+    def test_from_values(self):
+        summary = SensorFloorSummary.from_values(self.values)
+        self.assertEqual(summary.count, self.values.size)
+        self.assertAlmostEqual(summary.mean, np.mean(self.values))
+        self.assertAlmostEqual(summary.std, np.std(self.values))
+        self.assertEqual(summary.minimum, self.values.min())
+        self.assertEqual(summary.maximum, self.values.max())
+        np.testing.assert_array_equal(summary.floor_counts, np.histogram(self.values, bins=100, range=(255, 270))[0])
+        self.assertEqual(summary.counts.sum(), self.values.size)
+        for q in (1, 5, 50, 95, 99):
+            self.assertAlmostEqual(summary.percentile(q), np.percentile(self.values, q), delta=summary.bin_width)
+
+    def test_merge(self):
+        whole = SensorFloorSummary.from_values(self.values)
+        merged = SensorFloorSummary.from_chunks(np.array_split(self.values[::-1], 7))
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.std, whole.std)
+        self.assertEqual((merged.minimum, merged.maximum), (whole.minimum, whole.maximum))
+        np.testing.assert_array_equal(merged.floor_counts, whole.floor_counts)
+        np.testing.assert_array_equal(merged.edges, whole.edges)
+        np.testing.assert_array_equal(merged.counts, whole.counts)
+
+        with self.assertRaises(ValueError):
+            whole.merge(SensorFloorSummary.from_values(self.values, bin_width=1.0))
+
+    def test_outliers(self):
+        # A single corrupt sample spans far more bins of the default width than the budget allows
+        values = np.append(self.values, 1e7)
+        summary = SensorFloorSummary.from_values(values)
+        self.assertGreater(summary.bin_width, 0.1)
+        self.assertLessEqual(summary.counts.size, 2**16)
+        self.assertEqual(summary.counts.sum(), values.size)
+        self.assertEqual(summary.maximum, 1e7)
+        self.assertAlmostEqual(summary.percentile(50), np.percentile(values, 50), delta=summary.bin_width)
+
+        # Chunks widened by different factors merge to the same counts as the whole
+        merged = SensorFloorSummary.from_chunks(np.array_split(values, 7))
+        self.assertEqual(merged.bin_width, summary.bin_width)
+        np.testing.assert_array_equal(merged.edges, summary.edges)
+        np.testing.assert_array_equal(merged.counts, summary.counts)
+
+        spec = SensorFloorPlotSpec.from_summary(summary, "green")
+        self.assertLessEqual(spec.counts.size, 100)
+
+    def test_non_finite_values(self):
+        summary = SensorFloorSummary.from_chunks([np.array([np.nan, np.nan]), np.array([260.0, np.inf, 262.0])])
+        self.assertEqual((summary.count, summary.nan_count), (2, 3))
+        self.assertEqual(summary.mean, 261.0)
+        self.assertTrue(np.isnan(SensorFloorSummary.from_values([np.nan]).metrics()["p50"]))
+
+    def test_plot_spec(self):
+        spec = SensorFloorPlotSpec.from_background(self.values, "green")
+        self.assertLessEqual(spec.counts.size, 100)
+        self.assertEqual(spec.counts.sum(), self.values.size)
+        self.assertEqual(spec.edges.size, spec.counts.size + 1)
+        self.assertEqual(len(spec.render().axes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
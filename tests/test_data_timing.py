@@ -0,0 +1,139 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from contraqctor.qc import Status
+
+from aind_physiology_fip.data_qc import FipChannelMetadataTestSuite
+from aind_physiology_fip.data_timing import GAP_DTYPE, UNMATCHED, align_times, analyze_frame_timing
+
+
+def _metadata(n: int = 200, stride: int = 2) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "CameraFrameNumber": np.arange(n) * stride,
+            "CameraFrameTime": np.arange(n) * 50_000_000,
+        },
+        index=pd.Index(np.arange(n) / 20, name="ReferenceTime"),
+    )
+
+
+class TestAnalyzeFrameTiming(unittest.TestCase):
+    def _analyze(self, metadata: pd.DataFrame, **kwargs):
+        return analyze_frame_timing(
+            metadata["CameraFrameNumber"].to_numpy(),
+            metadata["CameraFrameTime"].to_numpy(),
+            metadata.index.to_numpy(),
+            **kwargs,
+        )
+
+    def test_clean(self):
+        report = self._analyze(_metadata(), frame_stride=2)
+        self.assertEqual(len(report.gaps), 0)
+        self.assertEqual(len(report.jitter_violations), 0)
+        self.assertLess(report.max_jitter_s, 1e-9)
+
+    def test_gaps_and_jitter(self):
+        metadata = _metadata()
+        # Three frames dropped after row 50, a counter reset at row 120 and a late frame at row 80
+        metadata.iloc[50:, 0] += 6
+        metadata.iloc[120:, 0] -= 500
+        metadata.iloc[80:, 1] += 300_000
+        report = self._analyze(metadata, frame_stride=2, clock_jitter_s=1e-4)
+
+        self.assertEqual(report.gaps.dtype, GAP_DTYPE)
+        np.testing.assert_array_equal(report.gaps["index"], [50, 120])
+        np.testing.assert_array_equal(report.gaps["frame_number"], metadata["CameraFrameNumber"].to_numpy()[[50, 120]])
+        np.testing.assert_array_equal(report.gaps["frame_step"], [8, -498])
+        np.testing.assert_array_equal(report.gaps["dropped_frames"], [3, 0])
+        np.testing.assert_allclose(report.gaps["reference_time"], [50 / 20, 120 / 20])
+        self.assertEqual(report.dropped_frames, 3)
+        self.assertEqual(len(report.dropped), 1)
+
+        np.testing.assert_array_equal(report.jitter_violations["index"], [80])
+        np.testing.assert_allclose(report.jitter_violations["jitter_s"], [3e-4])
+        np.testing.assert_allclose(report.jitter_violations["reference_time"], [80 / 20])
+        self.assertAlmostEqual(report.max_jitter_s, 3e-4)
+        self.assertEqual(report.metrics()["n_gaps"], 2)
+        self.assertEqual(list(report.gaps_frame().columns), list(GAP_DTYPE.names))
+
+    def test_missing_values(self):
+        metadata = _metadata().astype(float)
+        metadata.iloc[10, :] = np.nan
+        report = self._analyze(metadata, frame_stride=2)
+        self.assertEqual(len(report.gaps), 0)
+        self.assertEqual(len(report.jitter_violations), 0)
+        self.assertFalse(np.isnan(report.jitter_percentiles["p99"]))
+
+    def test_suite(self):
+        metadata = _metadata()
+        metadata.iloc[50:, 0] += 6
+        suite = FipChannelMetadataTestSuite(mock.Mock(data=metadata), frame_stride=2)
+        result = suite.test_check_dropped_frames()
+        self.assertEqual(result.status, Status.FAILED)
+        self.assertEqual(result.context["metrics"]["dropped_frames"], 3)
+        np.testing.assert_array_equal(result.context["gaps"]["index"], [50])
+        self.assertNotIn("asset", result.context)
+
+    def test_suite_context_is_bounded(self):
+        metadata = _metadata(n=1000)
+        # A counter that skips every other frame from row 100 on
+        metadata.iloc[100::2, 0] += 2
+        suite = FipChannelMetadataTestSuite(mock.Mock(data=metadata), frame_stride=2)
+        result = suite.test_check_dropped_frames()
+        n_gaps = result.context["metrics"]["n_gaps"]
+        self.assertGreater(n_gaps, 10)
+        self.assertEqual(len(result.context["gaps"]), 10)
+        report = result.context["asset"].asset
+        self.assertEqual(len(report.gaps), n_gaps)
+        with tempfile.TemporaryDirectory() as tmp:
+            gaps_path, _ = report.write_csv(Path(tmp) / "timing")
+            self.assertEqual(len(pd.read_csv(gaps_path)), n_gaps)
+
+
+class TestAlignTimes(unittest.TestCase):
+    def setUp(self):
+        # Time-multiplexed channels: green, iso and red are acquired 1/60 s apart in every 50 ms cycle
+        cycles = np.arange(100) * 0.05
+        self.times = {"green": cycles, "iso": np.delete(cycles + 1 / 60, 10), "red": cycles + 2 / 60}
+
+    def test_forward(self):
+        index = align_times(self.times, direction="forward", tolerance_s=0.04)
+        self.assertEqual(index.streams, ("green", "iso", "red"))
+        np.testing.assert_array_equal(index.positions("green"), np.arange(100))
+        np.testing.assert_array_equal(index.positions("red"), np.arange(100))
+        iso = index.positions("iso")
+        self.assertEqual(iso[10], UNMATCHED)
+        np.testing.assert_array_equal(np.delete(iso, 10), np.arange(99))
+        self.assertEqual(index.matched.sum(), 99)
+        self.assertEqual(index.metrics()["iso_n_unmatched"], 0)
+
+    def test_nearest(self):
+        # Red is closer to the next green sample than to its own cycle's
+        index = align_times(self.times, reference="red")
+        self.assertEqual(index.streams[0], "red")
+        np.testing.assert_array_equal(index.positions("green")[:-1], np.arange(1, 100))
+        self.assertEqual(index.positions("green")[-1], UNMATCHED)
+        np.testing.assert_array_equal(index.unmatched["green"], [0])
+
+    def test_unsorted(self):
+        order = np.random.default_rng(0).permutation(100)
+        shuffled = dict(self.times, red=self.times["red"][order])
+        index = align_times(shuffled, direction="forward", tolerance_s=0.04)
+        np.testing.assert_array_equal(shuffled["red"][index.positions("red")], self.times["red"])
+
+    def test_take(self):
+        index = align_times(self.times, direction="forward", tolerance_s=0.04)
+        iso = pd.DataFrame({"Fiber_0": np.arange(99)}, index=pd.Index(self.times["iso"], name="ReferenceTime"))
+        aligned = index.take("iso", iso)
+        np.testing.assert_array_equal(aligned.index.values, self.times["green"])
+        self.assertTrue(np.isnan(aligned["Fiber_0"].iloc[10]))
+        self.assertEqual(aligned["Fiber_0"].iloc[11], 10)
+        np.testing.assert_array_equal(index.take("iso", np.arange(99), fill_value=-1)[9:12], [9, -1, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
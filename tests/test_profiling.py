@@ -0,0 +1,83 @@
+import concurrent.futures
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_physiology_fip import profiling
+from aind_physiology_fip.data_contract import dataset
+from aind_physiology_fip.data_mappers import map_sessions
+from aind_physiology_fip.data_qc import _run_tests
+from aind_physiology_fip.synthetic import SyntheticSessionSpec, generate_session
+
+
+def _traced(n: int) -> int:
+    with profiling.span("square", "compute", n=n):
+        return n * n
+
+
+class TestProfiling(unittest.TestCase):
+    def test_disabled(self):
+        self.assertIsNone(profiling.active())
+        with profiling.span("noop", "compute"):
+            pass
+        with profiling.profile() as profiler:
+            self.assertIs(profiling.active(), profiler)
+        self.assertIsNone(profiling.active())
+        self.assertEqual(profiler.spans, [])
+
+    def test_process_pool(self):
+        with profiling.profile() as profiler:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+                futures = [profiling.submit(executor, _traced, n) for n in range(4)]
+                self.assertEqual([future.result() for future in futures], [0, 1, 4, 9])
+        self.assertEqual(sorted(span.args["n"] for span in profiler.spans), [0, 1, 2, 3])
+        summary = profiler.summary()
+        self.assertEqual((summary[0]["category"], summary[0]["count"]), ("compute", 4))
+
+
+class TestPipelineProfiling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        cls.epoch = generate_session(cls.root, SyntheticSessionSpec(duration_s=5, n_fibers=2, frame_shape=(64, 64)))[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_data_qc(self):
+        report_path, trace_path = self.root / "profile.json", self.root / "trace.json"
+        with profiling.profile_to(report_path, trace_path), contextlib.redirect_stdout(io.StringIO()):
+            _run_tests(dataset(self.epoch), roi_sample_period_s=1.0)
+        with open(report_path, encoding="utf-8") as f:
+            report = json.load(f)
+        names = {(entry["category"], entry["name"]) for entry in report["summary"]}
+        for expected in [
+            ("load", "fip::green"),
+            ("load", "fip::regions"),
+            ("io", "read_frames"),
+            ("compute", "roi_statistics"),
+            ("suite", "FipRawImageTestSuite"),
+            ("test", "FipRawImageTestSuite.test_frame_count"),
+        ]:
+            self.assertIn(expected, names)
+        self.assertTrue(all(span["wall_time_s"] >= 0 for span in report["spans"]))
+        with open(trace_path, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(len(events), len(report["spans"]))
+        self.assertEqual({event["ph"] for event in events}, {"X"})
+
+    def test_data_mappers(self):
+        with profiling.profile() as profiler:
+            summary = map_sessions([self.root], force=True)
+        self.assertEqual(summary.mapped, 1)
+        categories = {span.category for span in profiler.spans}
+        self.assertLessEqual({"session", "mapper", "load", "write_asset"}, categories)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from aind_physiology_fip.utils import atomic_write_path
+
+
+class TestAtomicWritePath(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_replace(self):
+        path = self.root / "out.json"
+        path.write_text("old")
+        with atomic_write_path(path) as tmp_path:
+            tmp_path.write_text("new")
+            self.assertEqual(path.read_text(), "old")
+        self.assertEqual(path.read_text(), "new")
+        self.assertEqual(list(self.root.iterdir()), [path])
+
+    def test_failure(self):
+        path = self.root / "out.json"
+        path.write_text("old")
+        with self.assertRaises(RuntimeError), atomic_write_path(path) as tmp_path:
+            tmp_path.write_text("partial")
+            raise RuntimeError
+        self.assertEqual(path.read_text(), "old")
+        self.assertEqual(list(self.root.iterdir()), [path])
+
+    def test_directory(self):
+        path = self.root / "out.zarr"
+        with self.assertRaises(RuntimeError), atomic_write_path(path) as tmp_path:
+            (tmp_path / "group").mkdir(parents=True)
+            raise RuntimeError
+        self.assertEqual(list(self.root.iterdir()), [])
+        with atomic_write_path(path) as tmp_path:
+            (tmp_path / "group").mkdir(parents=True)
+        self.assertTrue((path / "group").is_dir())
+
+
+if __name__ == "__main__":
+    unittest.main()